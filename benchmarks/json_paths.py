@@ -0,0 +1,124 @@
+"""Compares the generic and fast JSON paths for assessment artifacts.
+
+Run from the repository root:
+
+    python -m benchmarks.json_paths --files 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import pathlib
+import tempfile
+import timeit
+
+import pydantic
+
+from src.lib import artifacts
+from src.lib.llm_tools import TranslationAssessment, TranslationImprovement, type_adapter
+
+
+def make_assessment(improvements: int) -> TranslationAssessment:
+    return TranslationAssessment(
+        quality_assessments=["The translation is accurate", "Terminology is consistent"],
+        improvements=[
+            TranslationImprovement(
+                excerpt=f"excerpt número {i} de la traducción",
+                replacement=f"reemplazo número {i}",
+                severity="MAJOR" if i % 4 == 0 else "MINOR",
+                rationale="The replacement reads more naturally in Mexican Spanish. " * 2,
+                confidence=1 + i % 10,
+            )
+            for i in range(improvements)
+        ],
+    )
+
+
+def report(name: str, baseline: float, fast: float) -> None:
+    print(f"{name:<34} {baseline * 1000:>10.1f} ms {fast * 1000:>10.1f} ms {baseline / fast:>6.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--improvements", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    assessment = make_assessment(args.improvements)
+    pretty = assessment.model_dump_json(indent=2).encode("utf-8")
+    items = [i.model_dump() for i in assessment.improvements]
+    n = args.files
+
+    def best(fn) -> float:
+        return min(timeit.repeat(fn, number=1, repeat=args.repeat))
+
+    print(f"{'':<34} {'baseline':>13} {'fast':>13} {'speedup':>7}")
+    report(
+        f"validate {n} documents",
+        best(lambda: [TranslationAssessment.model_validate(json.loads(pretty)) for _ in range(n)]),
+        best(lambda: [TranslationAssessment.model_validate_json(pretty) for _ in range(n)]),
+    )
+
+    def salvage(adapter_for) -> None:
+        # one adapter per salvaged tool response, as in _salvage_tool_input
+        for _ in range(n):
+            adapter = adapter_for(TranslationImprovement)
+            for item in items:
+                adapter.validate_python(item)
+
+    report(
+        f"salvage {n} tool responses",
+        best(lambda: salvage(pydantic.TypeAdapter)),
+        best(lambda: salvage(type_adapter)),
+    )
+    report(
+        f"serialize {n} documents",
+        best(lambda: [assessment.model_dump_json(indent=2) for _ in range(n)]),
+        best(lambda: [assessment.model_dump_json() for _ in range(n)]),
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = pathlib.Path(tmp)
+        for i in range(n):
+            run_dir = root.joinpath(f"doc-{i // 10}", "es", f"assessment-{i % 10}")
+            run_dir.mkdir(parents=True)
+            artifacts.write_assessment(run_dir.joinpath(artifacts.ASSESSMENT_FILENAME), assessment)
+
+        def load_generic() -> list[TranslationAssessment]:
+            loaded = []
+            for path in root.rglob(artifacts.ASSESSMENT_FILENAME):
+                with open(path) as fh:
+                    loaded.append(TranslationAssessment.model_validate(json.load(fh)))
+            return loaded
+
+        report(
+            f"scan {n} assessment.json files",
+            best(load_generic),
+            best(lambda: list(artifacts.scan_assessments(root))),
+        )
+
+        log = root.joinpath("assessments.ndjson")
+        artifacts.append_assessment_records(
+            log,
+            (
+                artifacts.AssessmentRecord(
+                    document=f"doc-{i}",
+                    source_language="en",
+                    target_language="es",
+                    created_at="2024-01-01T00:00:00Z",
+                    assessment=assessment,
+                )
+                for i in range(n)
+            ),
+        )
+        report(
+            f"scan {n} files vs one NDJSON log",
+            best(load_generic),
+            best(lambda: list(artifacts.iter_assessment_records(log))),
+        )
+
+
+if __name__ == "__main__":
+    main()
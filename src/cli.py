@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import collections
 import datetime
+import itertools
 import json
 import os
 import pathlib
@@ -9,19 +11,253 @@ import typing
 import boto3
 import typer
 
+from src.lib import artifacts, structured_documents
 from src.lib.llm_tools import Tool
-from src.tasks import translate
+from src.lib.profiling import Profiler
+from src.tasks import evaluate, packing, simulate, translate, verify
+from src.translation_services import ensemble, providers
+from src.translation_services.amazon_bedrock import DEFAULT_MODEL_ID, CountingClient
 from src.translation_services.amazon_translate import validate_supported_languages
+from src.translation_services.bedrock_regions import BedrockRegionRouter
+from src.translation_services.hedging import HedgingPolicy
+from src.translation_services.model_tiers import TieredModelPolicy
+from src.translation_services.token_budget import TokenEstimator
 
 app = typer.Typer()
 
+BedrockRegionsOption = typing.Annotated[
+    typing.Optional[list[str]],
+    typer.Option(
+        "--bedrock-region",
+        help=(
+            "Route Bedrock requests across this region. May be given multiple times. "
+            "Use REGION=PROFILE_ID to send requests for the profile's model in that region to an "
+            "inference profile; separate several profiles with commas."
+        ),
+    ),
+]
+
+
+ProfileOption = typing.Annotated[
+    typing.Optional[pathlib.Path],
+    typer.Option(
+        "--profile",
+        help=(
+            "Profile each pipeline stage and write cProfile stats, collapsed stacks "
+            "(for flamegraphs) and tracemalloc reports to this directory."
+        ),
+        file_okay=False,
+    ),
+]
+
+
+AdaptiveMaxTokensOption = typing.Annotated[
+    bool,
+    typer.Option(
+        help=(
+            "Set maxTokens per assessment request from the estimated size of the document and "
+            "its expected output, and split documents too large for one request."
+        ),
+    ),
+]
+
+
+TokenHistoryOption = typing.Annotated[
+    typing.Optional[pathlib.Path],
+    typer.Option(
+        "--token-history",
+        help=(
+            "JSONL file of token usage that adaptive request sizing learns from and appends to. "
+            "Implies --adaptive-max-tokens."
+        ),
+        dir_okay=False,
+    ),
+]
+
+
+HedgePercentileOption = typing.Annotated[
+    typing.Optional[float],
+    typer.Option(
+        help="Send a duplicate assessment request once a request exceeds this latency percentile (e.g. 95).",
+        min=1,
+        max=99,
+    ),
+]
+
+
+HedgeBudgetOption = typing.Annotated[
+    float,
+    typer.Option(help="Maximum ratio of duplicate (hedged) requests to assessment requests.", min=0),
+]
+
+
+def _hedging_policy(percentile: typing.Optional[float], budget: float) -> HedgingPolicy | None:
+    if percentile is None:
+        return None
+    return HedgingPolicy(percentile=percentile, budget=budget)
+
+
+def _print_hedging_stats(hedging: HedgingPolicy | None) -> None:
+    if hedging is not None:
+        print(f"Hedging stats: {hedging.stats().model_dump_json(indent=2)}")
+
+
+def _token_estimator(
+    adaptive_max_tokens: bool, token_history: typing.Optional[pathlib.Path]
+) -> TokenEstimator | None:
+    if not adaptive_max_tokens and token_history is None:
+        return None
+    return TokenEstimator(history_path=token_history)
+
+
+def _print_token_stats(token_estimator: TokenEstimator | None) -> None:
+    if token_estimator is not None:
+        for stats in token_estimator.stats():
+            print(f"Token usage stats: {stats.model_dump_json()}")
+
+
+def _bedrock_client(regions: typing.Optional[list[str]]):
+    """Returns a Bedrock client, or region router, that counts every request it sends."""
+    if not regions:
+        return CountingClient(boto3.client("bedrock-runtime"))
+    return BedrockRegionRouter.from_specs(regions)
+
+
+def _print_region_stats(client) -> None:
+    if isinstance(client, BedrockRegionRouter):
+        for stats in client.stats():
+            print(f"Bedrock region stats: {stats.model_dump_json()}")
+
+
+PROVIDER_NAMES = ("amazon", "azure", "gemini")
+
+
+def _build_provider(
+    names: list[str],
+    translate_client,
+    bedrock_client,
+    model_policy: typing.Optional[TieredModelPolicy],
+    token_estimator: typing.Optional[TokenEstimator],
+    race_deadline: float,
+    hedging: typing.Optional[HedgingPolicy] = None,
+) -> providers.TranslationProvider:
+    """Creates the named providers, racing them against each other if there are several."""
+    built: list[providers.TranslationProvider] = []
+    for name in dict.fromkeys(n.lower() for n in names):
+        if name == "amazon":
+            built.append(
+                providers.AmazonProvider(
+                    translate_client=translate_client,
+                    bedrock_client=bedrock_client,
+                    model_policy=model_policy,
+                    token_estimator=token_estimator,
+                    hedging=hedging,
+                )
+            )
+        elif name in ("azure", "gemini"):
+            provider_cls = (
+                providers.AzureOpenAIProvider if name == "azure" else providers.GeminiProvider
+            )
+            try:
+                built.append(provider_cls.from_env())
+            except providers.ProviderNotConfigured as e:
+                raise typer.BadParameter(f"{name} provider: {e}")
+        else:
+            raise typer.BadParameter(
+                f"unknown provider {name!r}, expected one of {', '.join(PROVIDER_NAMES)}"
+            )
+    if len(built) == 1:
+        return built[0]
+    return providers.RacingProvider(built, deadline_s=race_deadline)
+
+
+def _build_ensemble(
+    provider: providers.TranslationProvider,
+    size: int,
+    model_ids: typing.Optional[list[str]],
+    temperatures: typing.Optional[list[float]],
+    min_votes: typing.Optional[int],
+    bedrock_client,
+    token_estimator: typing.Optional[TokenEstimator],
+    hedging: typing.Optional[HedgingPolicy] = None,
+) -> ensemble.EnsembleProvider:
+    """Assesses with ``size`` Bedrock runs, cycling through the models and temperatures."""
+    model_ids = model_ids or [DEFAULT_MODEL_ID]
+    temperatures = temperatures or [0.5]
+    if min_votes is not None and not 1 <= min_votes <= size:
+        raise typer.BadParameter("--ensemble-min-votes must be between 1 and --ensemble-size")
+    members: list[providers.TranslationProvider] = []
+    for i in range(size):
+        model_id = model_ids[i % len(model_ids)]
+        temperature = temperatures[i % len(temperatures)]
+        members.append(
+            providers.AmazonProvider(
+                bedrock_client=bedrock_client,
+                model_id=model_id,
+                token_estimator=token_estimator,
+                hedging=hedging,
+                temperature=temperature,
+                name=f"amazon-{i + 1}:{model_id}@{temperature}",
+            )
+        )
+    return ensemble.EnsembleProvider(members, translator=provider, min_votes=min_votes)
+
+
+def _print_provider_stats(provider: providers.TranslationProvider) -> None:
+    if isinstance(provider, ensemble.EnsembleProvider):
+        for member in provider.members:
+            print(f"Provider stats: {member.stats().model_dump_json()}")
+        print(f"Ensemble stats: {provider.ensemble_stats().model_dump_json()}")
+        provider.shutdown()
+        provider = provider.translator
+    if isinstance(provider, providers.RacingProvider):
+        for raced in provider.providers:
+            print(f"Provider stats: {raced.stats().model_dump_json()}")
+        print(f"Provider race stats: {provider.race_stats().model_dump_json()}")
+        provider.shutdown()
+    else:
+        print(f"Provider stats: {provider.stats().model_dump_json()}")
+
+
+def _count_provider_requests(provider: providers.TranslationProvider) -> collections.Counter[str]:
+    """Returns the number of calls made per service by the providers that call services."""
+    if isinstance(provider, ensemble.EnsembleProvider):
+        members = [*provider.members]
+        if provider.translator not in provider.members:
+            members.append(provider.translator)
+        return sum((_count_provider_requests(m) for m in members), collections.Counter())
+    if isinstance(provider, providers.RacingProvider):
+        return sum((_count_provider_requests(p) for p in provider.providers), collections.Counter())
+    return collections.Counter(provider.stats().requests_by_service)
+
+
+def _count_requests(
+    provider: providers.TranslationProvider, bedrock_client: CountingClient | BedrockRegionRouter
+) -> collections.Counter[str]:
+    """Returns the number of requests made per service.
+
+    One assessment can send several Bedrock requests (escalations, repairs,
+    hedged duplicates, region retries), so Bedrock requests are counted by the client.
+    """
+    counts = _count_provider_requests(provider)
+    counts[simulate.BEDROCK] = bedrock_client.requests
+    return counts
+
+
+def _find_source_file(source_dir: pathlib.Path) -> pathlib.Path:
+    """Returns the source document in a directory, preferring source.txt."""
+    for extension in structured_documents.MIME_TYPES_BY_EXTENSION:
+        if (path := source_dir.joinpath(f"source{extension}")).is_file():
+            return path
+    return source_dir.joinpath("source.txt")
+
 
 @app.command(name="translate")
 def translate_cmd(
     source_dir: typing.Annotated[
         pathlib.Path,
         typer.Argument(
-            help="Path to a directory containing a source.txt document.",
+            help="Path to a directory containing a source.txt, source.html or source.md document.",
             file_okay=False,
             dir_okay=True,
             exists=True,
@@ -29,13 +265,139 @@ def translate_cmd(
     ],
     source_language: typing.Annotated[
         str,
-        typer.Argument(help="language code of the source.txt document"),
+        typer.Argument(help="language code of the source document"),
     ],
     target_language: typing.Annotated[
         str,
         typer.Argument(help="language code of the target translation"),
     ],
+    bedrock_regions: BedrockRegionsOption = None,
+    escalation_model: typing.Annotated[
+        typing.Optional[str],
+        typer.Option(
+            help=(
+                "Assess with the default model first, and re-assess with this (stronger) model "
+                "only when the first pass reports MAJOR issues, low confidence, or malformed output."
+            ),
+        ),
+    ] = None,
+    content_type: typing.Annotated[
+        typing.Optional[str],
+        typer.Option(help="Type of content in the source document, e.g. 'eligibility notice'."),
+    ] = None,
+    escalate_content_types: typing.Annotated[
+        typing.Optional[list[str]],
+        typer.Option(
+            "--escalate-content-type",
+            help="Content type that is always assessed with the escalation model. May be given multiple times.",
+        ),
+    ] = None,
+    provider_names: typing.Annotated[
+        typing.Optional[list[str]],
+        typer.Option(
+            "--provider",
+            help=(
+                f"Translation provider ({', '.join(PROVIDER_NAMES)}). May be given multiple times "
+                "to race providers and keep the first valid result. Azure and Gemini are "
+                "configured with the same environment variables as the Apps Script translator "
+                "(AZURE_API_KEY, AZURE_RESOURCE_NAME, AZURE_DEPLOYMENT_NAME, AZURE_API_VERSION; "
+                "GEMINI_API_KEY, GEMINI_VERSION)."
+            ),
+        ),
+    ] = None,
+    race_deadline: typing.Annotated[
+        float,
+        typer.Option(help="Seconds to wait for a valid result when racing providers."),
+    ] = 60,
+    ensemble_size: typing.Annotated[
+        int,
+        typer.Option(
+            help=(
+                "Run this many Bedrock assessments concurrently and keep only the improvements "
+                "that enough runs agree on, with their confidence averaged."
+            ),
+            min=1,
+        ),
+    ] = 1,
+    ensemble_models: typing.Annotated[
+        typing.Optional[list[str]],
+        typer.Option(
+            "--ensemble-model",
+            help="Bedrock model ID for ensemble runs, used in turn. May be given multiple times.",
+        ),
+    ] = None,
+    ensemble_temperatures: typing.Annotated[
+        typing.Optional[list[float]],
+        typer.Option(
+            "--ensemble-temperature",
+            help="Sampling temperature for ensemble runs, used in turn. May be given multiple times.",
+            min=0,
+            max=1,
+        ),
+    ] = None,
+    ensemble_min_votes: typing.Annotated[
+        typing.Optional[int],
+        typer.Option(
+            help="Ensemble runs that must suggest an improvement for it to be kept. Defaults to a majority.",
+            min=1,
+        ),
+    ] = None,
+    hedge_percentile: HedgePercentileOption = None,
+    hedge_budget: HedgeBudgetOption = 0.1,
+    adaptive_max_tokens: AdaptiveMaxTokensOption = False,
+    token_history: TokenHistoryOption = None,
+    profile_dir: ProfileOption = None,
+    assessments_ndjson: typing.Annotated[
+        typing.Optional[pathlib.Path],
+        typer.Option(
+            help=(
+                "Also append the assessment as one compact line to this newline-delimited "
+                "JSON log, for fast batch reporting with summarize-assessments."
+            ),
+            dir_okay=False,
+        ),
+    ] = None,
+    record_timings: typing.Annotated[
+        typing.Optional[pathlib.Path],
+        typer.Option(
+            help=(
+                "Append the wall-clock time and service requests of each pipeline stage to this "
+                "JSONL file, for capacity planning with the simulate command."
+            ),
+            dir_okay=False,
+        ),
+    ] = None,
+    verify_improved: typing.Annotated[
+        bool,
+        typer.Option(
+            "--verify",
+            help=(
+                "Back-translate the segments changed by the improvements and flag those "
+                "whose meaning no longer matches the source document."
+            ),
+        ),
+    ] = False,
+    verify_threshold: typing.Annotated[
+        float,
+        typer.Option(help="Flag segments whose back-translation scores below this chrF (0-1).", min=0, max=1),
+    ] = verify.DEFAULT_THRESHOLD,
+    reassess_flagged: typing.Annotated[
+        bool,
+        typer.Option(
+            help="Re-assess flagged segments, keeping the result when its back-translation scores higher. Implies --verify.",
+        ),
+    ] = False,
+    stream: typing.Annotated[
+        bool,
+        typer.Option(
+            help=(
+                "Keep documents on disk and process them in chunks, writing outputs incrementally. "
+                "Keeps memory use flat for very large plain text documents."
+            ),
+        ),
+    ] = False,
 ) -> None:
+    profiler = Profiler(profile_dir)
     translate_client = boto3.client("translate")
     source_language, target_language = validate_supported_languages(
         translate_client, source_language.strip(), target_language.strip()
@@ -43,62 +405,598 @@ def translate_cmd(
     print(f"Resolved source language code: {source_language}")
     print(f"Resolved target language code: {target_language}")
 
-    print("Getting source text...")
-    source_text_filename = os.path.join(source_dir, "source.txt")
+    bedrock_client = _bedrock_client(bedrock_regions)
+    model_policy = (
+        TieredModelPolicy(
+            escalation_model_id=escalation_model,
+            escalate_content_types=escalate_content_types or (),
+        )
+        if escalation_model
+        else None
+    )
+    token_estimator = _token_estimator(adaptive_max_tokens, token_history)
+    hedging = _hedging_policy(hedge_percentile, hedge_budget)
+    provider = _build_provider(
+        provider_names or ["amazon"],
+        translate_client=translate_client,
+        bedrock_client=bedrock_client,
+        model_policy=model_policy,
+        token_estimator=token_estimator,
+        race_deadline=race_deadline,
+        hedging=hedging,
+    )
+    if ensemble_size > 1:
+        if model_policy is not None:
+            raise typer.BadParameter("--ensemble-size cannot be combined with --escalation-model")
+        provider = _build_ensemble(
+            provider,
+            size=ensemble_size,
+            model_ids=ensemble_models,
+            temperatures=ensemble_temperatures,
+            min_votes=ensemble_min_votes,
+            bedrock_client=bedrock_client,
+            token_estimator=token_estimator,
+            hedging=hedging,
+        )
+
+    recorder = simulate.TimingRecorder(
+        profiler, request_counter=lambda: _count_requests(provider, bedrock_client)
+    )
+
+    back_translator: typing.Optional[verify.BackTranslator] = None
     try:
-        with open(source_text_filename) as fh:
-            source_text = fh.read()
-            source_document = translate.Document(
-                content=source_text, language=source_language
+        print("Getting source text...")
+        source_text_filename = _find_source_file(source_dir)
+        mime_type = structured_documents.MIME_TYPES_BY_EXTENSION[source_text_filename.suffix]
+        if stream and mime_type != structured_documents.PLAIN_TEXT:
+            print("ERROR: --stream only supports plain text (source.txt) documents")
+            exit(1)
+        verify_improved = verify_improved or reassess_flagged
+        if stream and verify_improved:
+            print("ERROR: --verify cannot be combined with --stream")
+            exit(1)
+        try:
+            if stream:
+                if not source_text_filename.is_file():
+                    raise FileNotFoundError(source_text_filename)
+                source_document = translate.FileDocument(
+                    source_text_filename, language=source_language
+                )
+            else:
+                with open(source_text_filename) as fh:
+                    source_text = fh.read()
+                    source_document = translate.Document(
+                        content=source_text, language=source_language, mime_type=mime_type
+                    )
+            print(f"Found existing source document file {source_text_filename}")
+        except FileNotFoundError:
+            print(f"ERROR: Could not read source text from file {source_text_filename}")
+            exit(1)
+
+        print("Getting initial target language translation...")
+        extension = structured_documents.EXTENSIONS_BY_MIME_TYPE[mime_type]
+        target_language_dir = source_dir.joinpath(target_language)
+        nmt_text_filename = target_language_dir.joinpath(f"translation{extension}")
+        try:
+            if isinstance(source_document, translate.FileDocument):
+                if not nmt_text_filename.is_file():
+                    raise FileNotFoundError(nmt_text_filename)
+                nmt_document = translate.FileDocument(
+                    nmt_text_filename,
+                    language=target_language,
+                    translation_source=source_document,
+                )
+            else:
+                with open(nmt_text_filename) as fh:
+                    nmt_text = fh.read()
+                    nmt_document = translate.Document(
+                        content=nmt_text,
+                        language=target_language,
+                        translation_source=source_document,
+                        mime_type=mime_type,
+                    )
+            print(f"Found existing translation in file {nmt_text_filename}")
+        except FileNotFoundError:
+            print(f"No target language translation file {nmt_text_filename} currently exists")
+            print("Translating source document contents with NMT...")
+            if isinstance(source_document, translate.FileDocument):
+                print(f"Streaming NMT result to {nmt_text_filename}")
+                with recorder.stage("nmt"):
+                    nmt_document = source_document.translate_to_file(
+                        provider, target_language, nmt_text_filename
+                    )
+            else:
+                with recorder.stage("nmt"):
+                    nmt_document = source_document.translate(provider, target_language)
+                print(f"Saving NMT result to {nmt_text_filename}")
+                os.makedirs(target_language_dir, exist_ok=True)
+                with open(nmt_text_filename, "w+") as fh:
+                    fh.write(nmt_document.content)
+
+        print("Getting translation assessment...")
+        assessment_dir = target_language_dir.joinpath(
+            f"assessment-{datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H.%M.%SZ')}"
+        )
+        os.makedirs(assessment_dir)
+        # segments changed by each assessed chunk are back-translated while the next is assessed
+        if verify_improved:
+            back_translator = verify.BackTranslator(provider, nmt_document)
+        with recorder.stage("assessment"):
+            assessment = nmt_document.get_assessment(
+                provider,
+                content_type=content_type,
+                on_assessed=back_translator.submit_changes if back_translator is not None else None,
+            )
+        assessment_fname = os.path.join(assessment_dir, artifacts.ASSESSMENT_FILENAME)
+        print(f"Saving JSON assessment of the initial translation to {assessment_fname}")
+        with recorder.stage("serialize_assessment"):
+            artifacts.write_assessment(assessment_fname, assessment)
+            if assessments_ndjson is not None:
+                artifacts.append_assessment_records(
+                    assessments_ndjson,
+                    [
+                        artifacts.AssessmentRecord(
+                            document=str(source_text_filename),
+                            source_language=source_language,
+                            target_language=target_language,
+                            created_at=datetime.datetime.now(datetime.timezone.utc),
+                            assessment=assessment,
+                        )
+                    ],
+                )
+        if assessments_ndjson is not None:
+            print(f"Appended assessment to {assessments_ndjson}")
+
+        print("Improving initial translation...")
+        improved_translation_fname = os.path.join(assessment_dir, f"applied{extension}")
+        if isinstance(nmt_document, translate.FileDocument):
+            print(
+                f"Streaming improved version of the initial translation to {improved_translation_fname}"
             )
-        print(f"Found existing source document file {source_text_filename}")
-    except FileNotFoundError:
-        print(f"ERROR: Could not read source text from file {source_text_filename}")
+            with recorder.stage("apply_improvements"):
+                nmt_document.apply_improvements_to_file(assessment, improved_translation_fname)
+        else:
+            with recorder.stage("apply_improvements"):
+                improved_translation_content = nmt_document.get_improved_content_from_assessment(
+                    assessment
+                )
+            if verify_improved:
+                print("Verifying improved translation by back-translation...")
+                with recorder.stage("verify"):
+                    improved_document, verification = verify.verify_translation(
+                        nmt_document,
+                        translate.Document(
+                            content=improved_translation_content,
+                            language=target_language,
+                            translation_source=source_document,
+                            mime_type=mime_type,
+                        ),
+                        provider,
+                        assessor=provider if reassess_flagged else None,
+                        threshold=verify_threshold,
+                        back_translator=back_translator,
+                    )
+                improved_translation_content = improved_document.content
+                verification_fname = os.path.join(assessment_dir, "verification.json")
+                with open(verification_fname, "w+") as fh:
+                    print(f"Saving back-translation verification to {verification_fname}")
+                    fh.write(verification.model_dump_json(indent=2))
+                print(
+                    f"Verified {verification.verified} changed segments: {verification.flagged} flagged, "
+                    f"{verification.replaced} replaced after re-assessment, {verification.errors} errors"
+                )
+            with open(improved_translation_fname, "w+") as fh:
+                print(
+                    f"Saving improved version of the initial translation to {improved_translation_fname}"
+                )
+                fh.write(improved_translation_content)
+
+        if record_timings is not None:
+            simulate.append_timings(
+                record_timings,
+                [
+                    recorder.timing(
+                        document=str(source_text_filename),
+                        mime_type=mime_type,
+                        source_chars=(
+                            sum(len(chunk) for chunk in source_document.iter_chunks())
+                            if isinstance(source_document, translate.FileDocument)
+                            else len(source_document.content)
+                        ),
+                    )
+                ],
+            )
+            print(f"Appended pipeline timings to {record_timings}")
+    finally:
+        if back_translator is not None:
+            back_translator.shutdown()
+        if hedging is not None:
+            hedging.shutdown()
+
+    _print_provider_stats(provider)
+    _print_hedging_stats(hedging)
+    _print_token_stats(token_estimator)
+    if model_policy is not None:
+        print(f"Model tier stats: {model_policy.stats().model_dump_json()}")
+    _print_region_stats(bedrock_client)
+    if summary_path := profiler.write_summary():
+        print(f"Saved profiling results to {summary_path.parent}")
+
+
+@app.command(name="eval")
+def eval_cmd(
+    corpus_dir: typing.Annotated[
+        pathlib.Path,
+        typer.Argument(
+            help="Path to a directory containing one subdirectory (with a source.txt document) per corpus item.",
+            file_okay=False,
+            dir_okay=True,
+            exists=True,
+        ),
+    ],
+    source_language: typing.Annotated[
+        str,
+        typer.Argument(help="language code of the source.txt documents"),
+    ],
+    target_language: typing.Annotated[
+        str,
+        typer.Argument(help="language code of the target translations"),
+    ],
+    models: typing.Annotated[
+        typing.Optional[list[str]],
+        typer.Option(
+            "--model",
+            help="Bedrock model ID to evaluate. May be given multiple times.",
+        ),
+    ] = None,
+    prompts: typing.Annotated[
+        typing.Optional[list[pathlib.Path]],
+        typer.Option(
+            "--prompt",
+            help="Path to a prompt template file to evaluate. May be given multiple times.",
+            dir_okay=False,
+            exists=True,
+        ),
+    ] = None,
+    baseline_prompt: typing.Annotated[
+        bool,
+        typer.Option(help="Also evaluate the built-in assessment prompt."),
+    ] = True,
+    concurrency: typing.Annotated[
+        int,
+        typer.Option(help="Maximum number of concurrent service requests.", min=1),
+    ] = 4,
+    cache_dir: typing.Annotated[
+        typing.Optional[pathlib.Path],
+        typer.Option(help="Directory for cached service responses. Defaults to CORPUS_DIR/.eval-cache"),
+    ] = None,
+    output_dir: typing.Annotated[
+        typing.Optional[pathlib.Path],
+        typer.Option(help="Directory for evaluation results. Defaults to CORPUS_DIR/eval-DATETIME"),
+    ] = None,
+    hedge_percentile: HedgePercentileOption = None,
+    hedge_budget: HedgeBudgetOption = 0.1,
+    bedrock_regions: BedrockRegionsOption = None,
+    adaptive_max_tokens: AdaptiveMaxTokensOption = False,
+    token_history: TokenHistoryOption = None,
+    profile_dir: ProfileOption = None,
+) -> None:
+    profiler = Profiler(profile_dir)
+    translate_client = boto3.client("translate")
+    source_language, target_language = validate_supported_languages(
+        translate_client, source_language.strip(), target_language.strip()
+    )
+    try:
+        prompt_variants = [evaluate.PromptVariant.from_file(p) for p in prompts or []]
+    except evaluate.InvalidPromptTemplate as e:
+        raise typer.BadParameter(str(e))
+    if baseline_prompt:
+        prompt_variants.insert(0, evaluate.DEFAULT_PROMPT_VARIANT)
+    if not prompt_variants:
+        print("ERROR: No prompts to evaluate")
+        exit(1)
+    cache = evaluate.ResponseCache(cache_dir or corpus_dir.joinpath(".eval-cache"))
+
+    items = evaluate.load_corpus(corpus_dir, source_language, target_language)
+    if not items:
+        print(f"ERROR: No corpus items with a source.txt document found in {corpus_dir}")
         exit(1)
+    print(f"Found {len(items)} corpus items")
+
+    print("Getting initial target language translations...")
+    with profiler.stage("nmt"):
+        evaluate.prepare_translations(
+            items, translate_client, target_language, cache, concurrency=concurrency
+        )
 
-    print("Getting initial target language translation...")
-    target_language_dir = source_dir.joinpath(target_language)
-    nmt_text_filename = target_language_dir.joinpath("translation.txt")
+    hedging = _hedging_policy(hedge_percentile, hedge_budget)
+    print("Getting translation assessments...")
+    bedrock_client = _bedrock_client(bedrock_regions)
+    token_estimator = _token_estimator(adaptive_max_tokens, token_history)
     try:
-        with open(nmt_text_filename) as fh:
-            nmt_text = fh.read()
-            nmt_document = translate.Document(
-                content=nmt_text,
-                language=target_language,
-                translation_source=source_document,
+        with profiler.stage("assessment"):
+            records = evaluate.run_evaluation(
+                items,
+                bedrock_client,
+                model_ids=models or [DEFAULT_MODEL_ID],
+                prompts=prompt_variants,
+                cache=cache,
+                concurrency=concurrency,
+                hedging=hedging,
+                token_estimator=token_estimator,
             )
-        print(f"Found existing translation in file {nmt_text_filename}")
-    except FileNotFoundError:
-        print(f"No target language translation file {nmt_text_filename} currently exists")
-        print("Translating source document contents with NMT...")
-        nmt_document = source_document.translate(translate_client, target_language)
-        print(f"Saving NMT result to {nmt_text_filename}")
-        os.makedirs(target_language_dir, exist_ok=True)
-        with open(nmt_text_filename, "w+") as fh:
-            fh.write(nmt_document.content)
-
-    print("Getting translation assessment...")
-    assessment_dir = target_language_dir.joinpath(
-        f"assessment-{datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H.%M.%SZ')}"
+    finally:
+        if hedging is not None:
+            _print_hedging_stats(hedging)
+            hedging.shutdown()
+    _print_region_stats(bedrock_client)
+    _print_token_stats(token_estimator)
+    with profiler.stage("summarize"):
+        summaries = evaluate.summarize(records)
+
+    output_dir = output_dir or corpus_dir.joinpath(
+        f"eval-{datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H.%M.%SZ')}"
     )
-    os.makedirs(assessment_dir)
-    assessment = nmt_document.get_assessment(boto3.client("bedrock-runtime"))
-    serialized_assessment = assessment.model_dump_json(indent=2)
-    assessment_fname = os.path.join(assessment_dir, "assessment.json")
-    with open(assessment_fname, "w+") as fh:
-        print(f"Saving JSON assessment of the initial translation to {assessment_fname}")
-        fh.write(serialized_assessment)
+    evaluate.write_results(output_dir, records, summaries)
+    print(f"Saved evaluation results to {output_dir}")
+    print(evaluate.format_comparison_table(summaries))
+    if summary_path := profiler.write_summary():
+        print(f"Saved profiling results to {summary_path.parent}")
+
+
+@app.command(name="translate-messages")
+def translate_messages_cmd(
+    messages_file: typing.Annotated[
+        pathlib.Path,
+        typer.Argument(
+            help='JSONL file of short messages, one {"id": ..., "text": ...} object per line.',
+            dir_okay=False,
+            exists=True,
+        ),
+    ],
+    source_language: typing.Annotated[
+        str,
+        typer.Argument(help="language code of the messages"),
+    ],
+    target_language: typing.Annotated[
+        str,
+        typer.Argument(help="language code of the target translations"),
+    ],
+    output_file: typing.Annotated[
+        typing.Optional[pathlib.Path],
+        typer.Option(
+            help="JSONL file for translations, assessments and improved translations. "
+            "Defaults to MESSAGES_FILE with a .TARGET_LANGUAGE.jsonl suffix.",
+            dir_okay=False,
+        ),
+    ] = None,
+    pack: typing.Annotated[
+        bool,
+        typer.Option(help="Combine short messages into shared translation and assessment requests."),
+    ] = True,
+    max_pack_items: typing.Annotated[
+        int,
+        typer.Option(help="Maximum number of messages in one shared request.", min=2),
+    ] = 50,
+    concurrency: typing.Annotated[
+        int,
+        typer.Option(help="Maximum number of concurrent service requests.", min=1),
+    ] = 4,
+    bedrock_regions: BedrockRegionsOption = None,
+    adaptive_max_tokens: AdaptiveMaxTokensOption = False,
+    token_history: TokenHistoryOption = None,
+) -> None:
+    translate_client = boto3.client("translate")
+    source_language, target_language = validate_supported_languages(
+        translate_client, source_language.strip(), target_language.strip()
+    )
+    with open(messages_file) as fh:
+        messages = [json.loads(line) for line in fh if line.strip()]
+    if not messages:
+        print(f"ERROR: No messages found in {messages_file}")
+        exit(1)
+    print(f"Found {len(messages)} messages")
 
-    print("Improving initial translation...")
-    improved_translation_content = nmt_document.get_improved_content_from_assessment(
-        assessment
+    packer = packing.DocumentPacker(
+        max_pack_items=max_pack_items if pack else 1, max_workers=concurrency
+    )
+    source_documents = [
+        translate.Document(content=m["text"], language=source_language) for m in messages
+    ]
+    print("Translating messages...")
+    translated_documents = packer.translate(source_documents, translate_client, target_language)
+    print("Getting translation assessments...")
+    bedrock_client = _bedrock_client(bedrock_regions)
+    token_estimator = _token_estimator(adaptive_max_tokens, token_history)
+    assessments = packer.assess(
+        translated_documents, bedrock_client, token_estimator=token_estimator
     )
-    improved_translation_fname = os.path.join(assessment_dir, "applied.txt")
-    with open(improved_translation_fname, "w+") as fh:
-        print(
-            f"Saving improved version of the initial translation to {improved_translation_fname}"
+    print(f"Packing stats: {packer.stats().model_dump_json()}")
+    _print_region_stats(bedrock_client)
+    _print_token_stats(token_estimator)
+
+    output_file = output_file or messages_file.with_suffix(f".{target_language}.jsonl")
+    with open(output_file, "w+") as fh:
+        for message, document, assessment in zip(messages, translated_documents, assessments):
+            record = {
+                "id": message.get("id"),
+                "text": message["text"],
+                "translation": document.content,
+                "assessment": assessment.model_dump(),
+                "applied": document.get_improved_content_from_assessment(assessment),
+            }
+            fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+    print(f"Saved translated messages to {output_file}")
+
+
+@app.command(name="summarize-assessments")
+def summarize_assessments_cmd(
+    root: typing.Annotated[
+        pathlib.Path,
+        typer.Argument(
+            help=(
+                "Directory to search for assessment.json files and newline-delimited "
+                "(.ndjson) assessment logs."
+            ),
+            file_okay=False,
+            dir_okay=True,
+            exists=True,
+        ),
+    ],
+    concurrency: typing.Annotated[
+        int,
+        typer.Option(help="Maximum number of files read concurrently.", min=1),
+    ] = 8,
+) -> None:
+    summary = artifacts.summarize_assessments(
+        assessment for _, assessment in artifacts.scan_assessments(root, max_workers=concurrency)
+    )
+    print(summary.model_dump_json(indent=2))
+
+
+def _require_positive(value: float) -> float:
+    if value <= 0:
+        raise typer.BadParameter(f"must be greater than 0, got {value}")
+    return value
+
+
+def _parse_document_size(value: str) -> tuple[int, float]:
+    chars, _, weight = value.partition(":")
+    try:
+        return int(chars), float(weight or 1)
+    except ValueError:
+        raise typer.BadParameter(f"expected CHARS[:WEIGHT], got {value!r}")
+
+
+def _parse_cache_hit_rate(value: str) -> tuple[str, float]:
+    stage, _, rate = value.partition("=")
+    try:
+        if stage and 0 <= float(rate) <= 1:
+            return stage, float(rate)
+    except ValueError:
+        pass
+    raise typer.BadParameter(f"expected STAGE=RATE with a rate from 0 to 1, got {value!r}")
+
+
+@app.command(name="simulate")
+def simulate_cmd(
+    timings_file: typing.Annotated[
+        pathlib.Path,
+        typer.Argument(
+            help="JSONL file of pipeline timings recorded with translate --record-timings.",
+            dir_okay=False,
+            exists=True,
+        ),
+    ],
+    arrival_rate: typing.Annotated[
+        float,
+        typer.Option(
+            help="Documents arriving per minute, on average.", callback=_require_positive
+        ),
+    ],
+    duration: typing.Annotated[
+        float,
+        typer.Option(help="Minutes of arrivals to simulate.", callback=_require_positive),
+    ] = 60,
+    document_sizes: typing.Annotated[
+        typing.Optional[list[str]],
+        typer.Option(
+            "--document-size",
+            help=(
+                "Document size in characters, with an optional relative weight (CHARS[:WEIGHT]). "
+                "May be given multiple times. Defaults to the sizes of the recorded documents."
+            ),
+        ),
+    ] = None,
+    workers: typing.Annotated[
+        typing.Optional[list[int]],
+        typer.Option("--workers", help="Pipeline workers processing documents concurrently. May be given multiple times; every combination is simulated.", min=1),
+    ] = None,
+    translate_concurrency: typing.Annotated[
+        typing.Optional[list[int]],
+        typer.Option("--translate-concurrency", help="Concurrent Translate requests. May be given multiple times; every combination is simulated.", min=1),
+    ] = None,
+    bedrock_concurrency: typing.Annotated[
+        typing.Optional[list[int]],
+        typer.Option("--bedrock-concurrency", help="Concurrent Bedrock requests. May be given multiple times; every combination is simulated.", min=1),
+    ] = None,
+    translate_rpm: typing.Annotated[
+        typing.Optional[list[int]],
+        typer.Option("--translate-rpm", help="Translate requests per minute quota. May be given multiple times; every combination is simulated.", min=1),
+    ] = None,
+    bedrock_rpm: typing.Annotated[
+        typing.Optional[list[int]],
+        typer.Option("--bedrock-rpm", help="Bedrock requests per minute quota. May be given multiple times; every combination is simulated.", min=1),
+    ] = None,
+    bedrock_tpm: typing.Annotated[
+        typing.Optional[list[int]],
+        typer.Option("--bedrock-tpm", help="Bedrock tokens per minute quota. May be given multiple times; every combination is simulated.", min=1),
+    ] = None,
+    cache_hit_rates: typing.Annotated[
+        typing.Optional[list[str]],
+        typer.Option(
+            "--cache-hit-rate",
+            help="Fraction of documents that skip a stage (STAGE=RATE, e.g. nmt=0.3). "
+            "May be given multiple times; every combination is simulated.",
+        ),
+    ] = None,
+    token_history: typing.Annotated[
+        typing.Optional[pathlib.Path],
+        typer.Option(
+            help="JSONL file of token usage recorded by adaptive request sizing, to estimate Bedrock tokens.",
+            dir_okay=False,
+            exists=True,
+        ),
+    ] = None,
+    seed: typing.Annotated[int, typer.Option(help="Random seed.")] = 0,
+) -> None:
+    timings = simulate.load_timings(timings_file)
+    if not timings:
+        print(f"ERROR: No pipeline timings found in {timings_file}")
+        exit(1)
+    print(f"Found {len(timings)} recorded pipeline runs")
+
+    cache_hit_rate_options: dict[str, list[float]] = {}
+    for stage, rate in map(_parse_cache_hit_rate, cache_hit_rates or []):
+        cache_hit_rate_options.setdefault(stage, []).append(rate)
+    settings = [
+        simulate.SimulationSettings(
+            arrival_rate_per_min=arrival_rate,
+            duration_min=duration,
+            workers=run_workers,
+            translate_concurrency=run_translate_concurrency,
+            bedrock_concurrency=run_bedrock_concurrency,
+            translate_rpm=run_translate_rpm,
+            bedrock_rpm=run_bedrock_rpm,
+            bedrock_tpm=run_bedrock_tpm,
+            cache_hit_rates=dict(zip(cache_hit_rate_options, run_cache_hit_rates)),
+            seed=seed,
         )
-        fh.write(improved_translation_content)
+        for (
+            run_workers,
+            run_translate_concurrency,
+            run_bedrock_concurrency,
+            run_translate_rpm,
+            run_bedrock_rpm,
+            run_bedrock_tpm,
+            run_cache_hit_rates,
+        ) in itertools.product(
+            workers or [8],
+            translate_concurrency or [10],
+            bedrock_concurrency or [10],
+            translate_rpm or [None],
+            bedrock_rpm or [None],
+            bedrock_tpm or [None],
+            itertools.product(*cache_hit_rate_options.values()),
+        )
+    ]
+    results = simulate.simulate(
+        timings,
+        settings,
+        document_sizes=[_parse_document_size(v) for v in document_sizes or []],
+        token_estimator=TokenEstimator(history_path=token_history) if token_history else None,
+    )
+    print(simulate.format_simulation_table(results))
 
 
 def _show_schema_name_parser(value: str):
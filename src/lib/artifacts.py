@@ -0,0 +1,149 @@
+"""Fast reading and writing of assessment artifacts.
+
+Assessments are validated straight from raw JSON bytes with pydantic's
+``validate_json`` (skipping the intermediate Python objects built by
+``json.loads``).
+
+Besides the pretty-printed ``assessment.json`` written per run, assessments
+can be appended to a compact newline-delimited JSON (NDJSON) log, one
+``AssessmentRecord`` per line.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import datetime
+import os
+import pathlib
+import typing
+
+import pydantic
+
+from src.lib.llm_tools import TranslationAssessment
+from src.lib.logging import get_logger
+from src.lib.stats import mean
+
+ASSESSMENT_FILENAME = "assessment.json"
+NDJSON_SUFFIX = ".ndjson"
+
+
+class AssessmentRecord(pydantic.BaseModel):
+    document: str
+    source_language: str
+    target_language: str
+    created_at: datetime.datetime
+    assessment: TranslationAssessment
+
+
+class AssessmentSummary(pydantic.BaseModel):
+    assessments: int
+    invalid_records: int
+    improvements: int
+    major: int
+    minor: int
+    mean_confidence: typing.Optional[float]
+
+
+def write_assessment(
+    path: str | os.PathLike, assessment: TranslationAssessment, indent: typing.Optional[int] = 2
+) -> None:
+    with open(path, "wb") as fh:
+        fh.write(assessment.model_dump_json(indent=indent).encode("utf-8"))
+
+
+def load_assessment(path: str | os.PathLike) -> TranslationAssessment:
+    with open(path, "rb") as fh:
+        return TranslationAssessment.model_validate_json(fh.read())
+
+
+def append_assessment_records(
+    path: str | os.PathLike, records: typing.Iterable[AssessmentRecord]
+) -> None:
+    """Appends records to an NDJSON log, one compact JSON object per line."""
+    with open(path, "ab") as fh:
+        for record in records:
+            fh.write(record.model_dump_json().encode("utf-8") + b"\n")
+
+
+def iter_assessment_records(path: str | os.PathLike) -> typing.Iterator[AssessmentRecord]:
+    with open(path, "rb") as fh:
+        for line in fh:
+            if line.strip():
+                yield AssessmentRecord.model_validate_json(line)
+
+
+def find_assessment_files(root: str | os.PathLike) -> typing.Iterator[pathlib.Path]:
+    """Yields every ``assessment.json`` and ``*.ndjson`` file under ``root``."""
+    stack = [os.fspath(root)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name == ASSESSMENT_FILENAME or entry.name.endswith(NDJSON_SUFFIX):
+                    yield pathlib.Path(entry.path)
+
+
+def _read_bytes(path: pathlib.Path) -> bytes:
+    with open(path, "rb") as fh:
+        return fh.read()
+
+
+def scan_assessments(
+    root: str | os.PathLike, max_workers: int = 8
+) -> typing.Iterator[tuple[pathlib.Path, TranslationAssessment | None]]:
+    """Yields ``(path, assessment)`` for every assessment artifact under ``root``.
+
+    Files are read concurrently and validated from raw bytes. NDJSON logs yield
+    one item per record, each validated on its own. Invalid files and records
+    are logged and yielded with ``None``.
+    """
+    logger = get_logger(root=str(root))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        paths = list(find_assessment_files(root))
+        for path, data in zip(paths, executor.map(_read_bytes, paths)):
+            if not path.name.endswith(NDJSON_SUFFIX):
+                try:
+                    yield path, TranslationAssessment.model_validate_json(data)
+                except pydantic.ValidationError as e:
+                    logger.warning(
+                        "invalid assessment artifact", path=str(path), errors=e.error_count()
+                    )
+                    yield path, None
+                continue
+            for line_number, line in enumerate(data.splitlines(), start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield path, AssessmentRecord.model_validate_json(line).assessment
+                except pydantic.ValidationError as e:
+                    logger.warning(
+                        "invalid assessment record",
+                        path=str(path),
+                        line=line_number,
+                        errors=e.error_count(),
+                    )
+                    yield path, None
+
+
+def summarize_assessments(
+    assessments: typing.Iterable[TranslationAssessment | None],
+) -> AssessmentSummary:
+    count = invalid = improvements = major = 0
+    confidences: list[int] = []
+    for assessment in assessments:
+        if assessment is None:
+            invalid += 1
+            continue
+        count += 1
+        improvements += len(assessment.improvements)
+        major += sum(1 for i in assessment.improvements if i.severity == "MAJOR")
+        confidences.extend(i.confidence for i in assessment.improvements)
+    return AssessmentSummary(
+        assessments=count,
+        invalid_records=invalid,
+        improvements=improvements,
+        major=major,
+        minor=improvements - major,
+        mean_confidence=mean(confidences),
+    )
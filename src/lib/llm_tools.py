@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import abc
+import functools
 import typing
 
 import pydantic
@@ -9,6 +10,20 @@ if typing.TYPE_CHECKING:  # pragma: nocover
     import mypy_boto3_bedrock_runtime.type_defs
 
 
+@functools.cache
+def type_adapter(tp: typing.Any) -> pydantic.TypeAdapter[typing.Any]:
+    """Returns a ``TypeAdapter`` for ``tp``, building its validator only once."""
+    return pydantic.TypeAdapter(tp)
+
+
+def field_max_length(field: pydantic.fields.FieldInfo) -> int | None:
+    """Returns the ``max_length`` constraint of a model field, if it has one."""
+    for constraint in field.metadata:
+        if (max_length := getattr(constraint, "max_length", None)) is not None:
+            return max_length
+    return None
+
+
 class Tool(pydantic.BaseModel, abc.ABC):
     NAME: typing.ClassVar[str] = NotImplemented
     DESCRIPTION: typing.ClassVar[str] = NotImplemented
@@ -93,3 +108,25 @@ class TranslationAssessment(Tool):
             ]
         ],
     )
+
+
+class DocumentAssessment(pydantic.BaseModel):
+    document_id: str = pydantic.Field(
+        description='The id attribute of the <document> element that this assessment is about, e.g. "3".'
+    )
+    quality_assessments: list[str] = pydantic.Field(
+        description="Observations regarding the quality of this document's translation",
+        max_length=10,
+    )
+    improvements: list[TranslationImprovement] = pydantic.Field(
+        description="A list of objects that each provide a single recommendation for improving and/or correcting an excerpt of this document's translation. Excerpts must be quoted from this document only.",
+    )
+
+
+class BatchTranslationAssessment(Tool):
+    NAME = "batch_translation_assessment"
+    DESCRIPTION = "Provides feedback regarding and suggestions for improving each of several translated documents."
+
+    assessments: list[DocumentAssessment] = pydantic.Field(
+        description="Exactly one assessment per document, identified by the document's id.",
+    )
@@ -0,0 +1,213 @@
+"""Per-stage CPU and memory profiling for pipeline commands.
+
+Each ``Profiler.stage`` records a cProfile profile and tracemalloc statistics
+for the code run inside it, and writes:
+
+- ``NN-<stage>.pstats``: cProfile statistics, readable with ``pstats`` or snakeviz
+- ``NN-<stage>.collapsed``: collapsed stacks (microseconds of own time), readable
+  with flamegraph.pl, speedscope or inferno
+- ``NN-<stage>.memory.txt``: peak traced memory and the top allocating lines
+
+plus a ``summary.json`` of all stages. A profiler without an output directory
+is a no-op, so stages can be marked unconditionally.
+
+cProfile only observes the thread that entered the stage. Work done by thread
+pools shows up as time spent waiting on futures; tracemalloc, however, traces
+allocations from all threads.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import cProfile
+import json
+import os
+import pathlib
+import pstats
+import re
+import time
+import tracemalloc
+import typing
+
+import pydantic
+
+from src.lib.logging import get_logger
+
+_FuncKey = tuple[str, int, str]
+
+
+class StageProfile(pydantic.BaseModel):
+    name: str
+    wall_s: float
+    cpu_s: float
+    peak_memory_bytes: int
+    memory_growth_bytes: int
+    pstats_path: str
+    collapsed_path: str
+    memory_path: str
+
+
+class Profiler:
+    def __init__(
+        self,
+        output_dir: typing.Optional[str | os.PathLike] = None,
+        top_allocators: int = 25,
+        tracemalloc_frames: int = 10,
+    ):
+        self.output_dir = pathlib.Path(output_dir) if output_dir else None
+        self.top_allocators = top_allocators
+        self.tracemalloc_frames = tracemalloc_frames
+        self.stages: list[StageProfile] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.output_dir is not None
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> typing.Iterator[None]:
+        if self.output_dir is None:
+            yield
+            return
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        prefix = self.output_dir.joinpath(
+            f"{len(self.stages) + 1:02d}-{re.sub(r'[^A-Za-z0-9_.-]+', '_', name)}"
+        )
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(self.tracemalloc_frames)
+        tracemalloc.reset_peak()
+        snapshot_before = tracemalloc.take_snapshot()
+        memory_before, _ = tracemalloc.get_traced_memory()
+
+        profile = cProfile.Profile()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            wall_s = time.perf_counter() - wall_start
+            cpu_s = time.process_time() - cpu_start
+            memory_after, peak_memory = tracemalloc.get_traced_memory()
+            snapshot_after = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+
+            stats = pstats.Stats(profile)
+            pstats_path = prefix.with_suffix(".pstats")
+            stats.dump_stats(pstats_path)
+            collapsed_path = prefix.with_suffix(".collapsed")
+            write_collapsed_stacks(stats, collapsed_path)
+            memory_path = prefix.with_suffix(".memory.txt")
+            self._write_memory_report(
+                memory_path, name, snapshot_before, snapshot_after, peak_memory
+            )
+
+            stage_profile = StageProfile(
+                name=name,
+                wall_s=wall_s,
+                cpu_s=cpu_s,
+                peak_memory_bytes=peak_memory,
+                memory_growth_bytes=memory_after - memory_before,
+                pstats_path=str(pstats_path),
+                collapsed_path=str(collapsed_path),
+                memory_path=str(memory_path),
+            )
+            self.stages.append(stage_profile)
+            get_logger(profile_stage=name).info(
+                "profiled pipeline stage", **stage_profile.model_dump()
+            )
+
+    def _write_memory_report(
+        self,
+        path: pathlib.Path,
+        name: str,
+        snapshot_before: tracemalloc.Snapshot,
+        snapshot_after: tracemalloc.Snapshot,
+        peak_memory: int,
+    ) -> None:
+        # Exclude the profiler's own bookkeeping from the report.
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, pstats.__file__),
+        ]
+        differences = snapshot_after.filter_traces(filters).compare_to(
+            snapshot_before.filter_traces(filters), "lineno"
+        )
+        with open(path, "w+") as fh:
+            fh.write(f"stage: {name}\n")
+            fh.write(f"peak traced memory: {peak_memory} bytes\n\n")
+            fh.write(f"top {self.top_allocators} allocators by size change:\n")
+            for stat in differences[: self.top_allocators]:
+                fh.write(f"{stat}\n")
+
+    def write_summary(self) -> pathlib.Path | None:
+        if self.output_dir is None:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = self.output_dir.joinpath("summary.json")
+        with open(path, "w+") as fh:
+            json.dump([s.model_dump() for s in self.stages], fh, indent=2)
+        return path
+
+
+def _frame_label(func: _FuncKey) -> str:
+    filename, line, name = func
+    if filename == "~":  # built-in functions
+        label = name
+    else:
+        label = f"{name} ({os.path.basename(filename)}:{line})"
+    # ";" separates frames in collapsed stacks
+    return label.replace(";", ":")
+
+
+def write_collapsed_stacks(
+    stats: pstats.Stats,
+    path: str | os.PathLike,
+    max_depth: int = 64,
+    min_time_s: float = 1e-6,
+) -> None:
+    """Writes cProfile statistics as collapsed stacks for flamegraph tools.
+
+    cProfile only records caller/callee pairs, so full stacks are
+    reconstructed by attributing each function's time to its callers in
+    proportion to the time spent under each caller.
+    """
+    raw_stats: dict[_FuncKey, typing.Any] = stats.stats  # type: ignore[attr-defined]
+    callees: dict[_FuncKey, list[tuple[_FuncKey, float]]] = {}
+    roots: list[_FuncKey] = []
+    for func, (_, _, _, _, callers) in raw_stats.items():
+        if not callers:
+            roots.append(func)
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    lines: dict[str, float] = {}
+
+    def _visit(func: _FuncKey, stack: list[_FuncKey], scale: float) -> None:
+        _, _, own_time, total_time, _ = raw_stats[func]
+        stack = [*stack, func]
+        labels = ";".join(_frame_label(f) for f in stack)
+        if (own := own_time * scale) > 0:
+            lines[labels] = lines.get(labels, 0.0) + own
+        if len(stack) >= max_depth:
+            return
+        for callee, edge_time in callees.get(func, []):
+            callee_total = raw_stats[callee][3]
+            if callee in stack or callee_total <= 0:
+                continue
+            child_scale = scale * edge_time / callee_total
+            if child_scale * callee_total < min_time_s:
+                continue
+            _visit(callee, stack, child_scale)
+
+    for root in roots:
+        _visit(root, [], 1.0)
+
+    with open(path, "w+") as fh:
+        for labels, seconds in sorted(lines.items()):
+            if (microseconds := round(seconds * 1_000_000)) > 0:
+                fh.write(f"{labels} {microseconds}\n")
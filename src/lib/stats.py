@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import math
+import typing
+
+
+def percentile(values: typing.Iterable[float], pct: float) -> float | None:
+    """Returns the nearest-rank percentile of ``values``, or ``None`` when empty.
+
+    ``pct`` is expressed on a 0-100 scale, e.g. ``percentile(latencies, 95)``.
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    if not 0 <= pct <= 100:
+        raise ValueError("pct must be between 0 and 100")
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def mean(values: typing.Iterable[float]) -> float | None:
+    """Returns the arithmetic mean of ``values``, or ``None`` when empty."""
+    items = list(values)
+    return sum(items) / len(items) if items else None
+
+
+def fit_line(points: typing.Sequence[tuple[float, float]]) -> tuple[float, float] | None:
+    """Least-squares intercept and slope, or ``None`` when ``x`` does not vary."""
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if variance == 0:
+        return None
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+    return mean_y - slope * mean_x, slope
@@ -0,0 +1,313 @@
+"""Translatable segments of structured (HTML and Markdown) documents.
+
+A ``StructuredDocument`` splits a document into literal markup and translatable
+segments, so that each unique segment can be translated once and the document
+rebuilt around the translations. Placeholders (template variables, URLs, email
+addresses, inline code and link targets) can be protected from translation by
+wrapping them in ``<span translate="no">`` elements, which Amazon Translate
+leaves untouched when translating ``text/html`` content.
+"""
+
+from __future__ import annotations
+
+import collections
+import html
+import re
+import typing
+
+PLAIN_TEXT = "text/plain"
+HTML = "text/html"
+MARKDOWN = "text/markdown"
+
+MIME_TYPES_BY_EXTENSION = {
+    ".txt": PLAIN_TEXT,
+    ".html": HTML,
+    ".htm": HTML,
+    ".md": MARKDOWN,
+}
+
+EXTENSIONS_BY_MIME_TYPE = {
+    PLAIN_TEXT: ".txt",
+    HTML: ".html",
+    MARKDOWN: ".md",
+}
+
+
+class UnsupportedMimeType(Exception):
+    """MIME type has no structured document support"""
+
+
+_PLACEHOLDER_PATTERNS = [
+    r"\{\{.*?\}\}",  # {{ handlebars }}
+    r"\$\{[^}]*\}",  # ${template}
+    r"\{[A-Za-z0-9_.]+\}",  # {format}
+    r"%\([A-Za-z0-9_]+\)[sd]",  # %(printf)s
+    r"%[sd]",
+    r"\[\[.*?\]\]",  # [[wiki]]
+    r"https?://[^\s<>\"')\]]*[^\s<>\"')\].,;:!?]",
+    r"[\w.+-]+@[\w-]+\.[\w.-]*\w",
+]
+PLACEHOLDER_RE = re.compile("|".join(_PLACEHOLDER_PATTERNS))
+MARKDOWN_PLACEHOLDER_RE = re.compile(
+    "|".join([r"`[^`\n]+`", r"\]\([^)\s]*(?:\s+\"[^\"]*\")?\)", *_PLACEHOLDER_PATTERNS])
+)
+_NO_TRANSLATE_SPAN_RE = re.compile(r'<span translate="no">(.*?)</span>', re.DOTALL)
+
+_TAG_RE = re.compile(r"(<!--.*?-->|<![^>]*>|<[^>]+>)", re.DOTALL)
+_TAG_NAME_RE = re.compile(r"</?\s*([A-Za-z][A-Za-z0-9-]*)")
+_BLOCK_TAGS = frozenset(
+    {
+        "address", "article", "aside", "blockquote", "body", "br", "button",
+        "caption", "dd", "details", "div", "dl", "dt", "fieldset", "figcaption",
+        "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "head",
+        "header", "hr", "html", "img", "input", "label", "legend", "li", "link",
+        "main", "meta", "nav", "ol", "optgroup", "option", "p", "section",
+        "select", "summary", "table", "tbody", "td", "textarea", "tfoot", "th",
+        "thead", "title", "tr", "ul",
+    }
+)  # fmt: skip
+_UNTRANSLATED_TAGS = frozenset({"script", "style", "pre", "code", "noscript", "svg"})
+
+_MD_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_MD_RULE_RE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_MD_TABLE_SEPARATOR_RE = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+_MD_BLOCK_PREFIX_RE = re.compile(
+    r"^(\s*(?:#{1,6}\s+|>\s?|[-*+]\s+(?:\[[ xX]\]\s+)?|\d+[.)]\s+)*)"
+)
+_MD_TABLE_CELL_RE = re.compile(r"(?<!\\)\|")
+
+
+class StructuredDocument:
+    """A document split into literal markup and translatable segments.
+
+    ``parts`` holds literal strings and indexes into ``segments``; rebuilding
+    the document joins the literals with (translated) segments in order.
+    """
+
+    def __init__(
+        self,
+        parts: typing.Sequence[str | int],
+        segments: typing.Sequence[str],
+        mime_type: str,
+    ):
+        self.parts = list(parts)
+        self.segments = list(segments)
+        self.mime_type = mime_type
+
+    @classmethod
+    def parse(cls, content: str, mime_type: str) -> StructuredDocument:
+        if mime_type == HTML:
+            return _parse_html(content)
+        if mime_type == MARKDOWN:
+            return _parse_markdown(content)
+        if mime_type == PLAIN_TEXT:
+            return _parse_plain_text(content)
+        raise UnsupportedMimeType(f"no structured document support for {mime_type}")
+
+    def unique_segments(self) -> list[str]:
+        """Segments in order of first appearance, without repeats."""
+        return list(dict.fromkeys(self.segments))
+
+    def rebuild(self, translations: typing.Mapping[str, str]) -> str:
+        """Rebuilds the document, replacing each segment with its translation."""
+        return "".join(
+            part if isinstance(part, str) else translations[self.segments[part]]
+            for part in self.parts
+        )
+
+    def map_segments(self, fn: typing.Callable[[str], str]) -> str:
+        """Rebuilds the document, applying ``fn`` once per unique segment."""
+        return self.rebuild({s: fn(s) for s in self.unique_segments()})
+
+    def prose(self) -> str:
+        """Plain text of the unique segments, one paragraph per segment."""
+        return "\n\n".join(segment_text(s, self.mime_type) for s in self.unique_segments())
+
+
+def segment_text(segment: str, mime_type: str) -> str:
+    """Plain text of a segment, without inline markup."""
+    if mime_type == HTML:
+        return html.unescape(_TAG_RE.sub("", segment))
+    return segment
+
+
+def placeholders(segment: str, mime_type: str) -> list[str]:
+    pattern = MARKDOWN_PLACEHOLDER_RE if mime_type == MARKDOWN else PLACEHOLDER_RE
+    if mime_type != HTML:
+        return pattern.findall(segment)
+    return [
+        p
+        for chunk in _TAG_RE.split(segment)
+        if not _TAG_RE.fullmatch(chunk)
+        for p in pattern.findall(chunk)
+    ]
+
+
+def protect_placeholders(segment: str, mime_type: str) -> str:
+    """Returns the segment as HTML with placeholders excluded from translation."""
+    pattern = MARKDOWN_PLACEHOLDER_RE if mime_type == MARKDOWN else PLACEHOLDER_RE
+
+    def _protect_text(text: str) -> str:
+        protected = []
+        last = 0
+        for match in pattern.finditer(text):
+            protected.append(_escape(text[last : match.start()], mime_type))
+            protected.append(
+                f'<span translate="no">{_escape(match.group(), mime_type)}</span>'
+            )
+            last = match.end()
+        protected.append(_escape(text[last:], mime_type))
+        return "".join(protected)
+
+    if mime_type != HTML:
+        return _protect_text(segment)
+    return "".join(
+        chunk if _TAG_RE.fullmatch(chunk) else _protect_text(chunk)
+        for chunk in _TAG_RE.split(segment)
+    )
+
+
+def restore_placeholders(translated: str, mime_type: str) -> str:
+    """Reverses ``protect_placeholders`` on translated HTML."""
+    restored = _NO_TRANSLATE_SPAN_RE.sub(lambda m: m.group(1), translated)
+    if mime_type != HTML:
+        restored = html.unescape(restored)
+    return restored
+
+
+def missing_placeholders(source: str, translated: str, mime_type: str) -> list[str]:
+    """Placeholders of ``source`` that do not appear (as often) in ``translated``."""
+    missing = collections.Counter(placeholders(source, mime_type))
+    missing.subtract(placeholders(translated, mime_type))
+    return [p for p, count in missing.items() if count > 0]
+
+
+def _escape(text: str, mime_type: str) -> str:
+    # HTML text is already escaped; everything else needs escaping to be sent as HTML.
+    return text if mime_type == HTML else html.escape(text, quote=False)
+
+
+class _Builder:
+    def __init__(self, mime_type: str):
+        self.mime_type = mime_type
+        self.parts: list[str | int] = []
+        self.segments: list[str] = []
+
+    def literal(self, text: str) -> None:
+        if text:
+            self.parts.append(text)
+
+    def segment(self, text: str, has_text: typing.Optional[bool] = None) -> None:
+        """Adds text as a segment, keeping surrounding whitespace as literals."""
+        stripped = text.strip()
+        if has_text is None:
+            has_text = bool(stripped)
+        if not has_text:
+            self.literal(text)
+            return
+        start = text.index(stripped)
+        self.literal(text[:start])
+        self.parts.append(len(self.segments))
+        self.segments.append(stripped)
+        self.literal(text[start + len(stripped) :])
+
+    def build(self) -> StructuredDocument:
+        return StructuredDocument(self.parts, self.segments, self.mime_type)
+
+
+def _parse_plain_text(content: str) -> StructuredDocument:
+    builder = _Builder(PLAIN_TEXT)
+    for chunk in re.split(r"(\n\s*\n)", content):
+        builder.segment(chunk)
+    return builder.build()
+
+
+def _tag_name(tag: str) -> str | None:
+    match = _TAG_NAME_RE.match(tag)
+    return match.group(1).lower() if match else None
+
+
+def _parse_html(content: str) -> StructuredDocument:
+    builder = _Builder(HTML)
+    buffer: list[str] = []
+    skip_until: str | None = None
+
+    def _flush() -> None:
+        text = "".join(buffer)
+        has_text = any(
+            chunk.strip() and not _TAG_RE.fullmatch(chunk)
+            for chunk in _TAG_RE.split(text)
+        )
+        builder.segment(text, has_text=has_text)
+        buffer.clear()
+
+    for token in _TAG_RE.split(content):
+        if not token:
+            continue
+        if skip_until is not None:
+            builder.literal(token)
+            if _TAG_RE.fullmatch(token) and token.startswith("</") and _tag_name(token) == skip_until:
+                skip_until = None
+            continue
+        if not _TAG_RE.fullmatch(token):
+            buffer.append(token)
+            continue
+        name = _tag_name(token)
+        if name in _UNTRANSLATED_TAGS and not token.startswith("</"):
+            _flush()
+            builder.literal(token)
+            if not token.rstrip().endswith("/>"):
+                skip_until = name
+        elif name is None or name in _BLOCK_TAGS:
+            _flush()
+            builder.literal(token)
+        else:
+            buffer.append(token)
+    _flush()
+    return builder.build()
+
+
+def _parse_markdown(content: str) -> StructuredDocument:
+    builder = _Builder(MARKDOWN)
+    in_fence = False
+    paragraph: list[str] = []
+
+    def _flush_paragraph() -> None:
+        if paragraph:
+            builder.segment("".join(paragraph))
+            paragraph.clear()
+
+    for line in content.splitlines(keepends=True):
+        body = line.rstrip("\r\n")
+        if _MD_FENCE_RE.match(body):
+            _flush_paragraph()
+            in_fence = not in_fence
+            builder.literal(line)
+            continue
+        if in_fence or not body.strip() or _MD_RULE_RE.match(body):
+            _flush_paragraph()
+            builder.literal(line)
+            continue
+        if body.lstrip().startswith("|"):
+            _flush_paragraph()
+            if _MD_TABLE_SEPARATOR_RE.match(body):
+                builder.literal(line)
+                continue
+            cells = _MD_TABLE_CELL_RE.split(body)
+            for i, cell in enumerate(cells):
+                if i:
+                    builder.literal("|")
+                builder.segment(cell)
+            builder.literal(line[len(body) :])
+            continue
+        prefix = _MD_BLOCK_PREFIX_RE.match(body).group(1)
+        if prefix or not paragraph:
+            # a new block starts: headings, quotes and list items are their own segments
+            _flush_paragraph()
+            builder.literal(prefix)
+            paragraph.append(line[len(prefix) :])
+        else:
+            # a continuation line of the current paragraph
+            paragraph.append(line)
+    _flush_paragraph()
+    return builder.build()
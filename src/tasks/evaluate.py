@@ -0,0 +1,523 @@
+"""Runs translation assessments for several models and prompt variants over a corpus.
+
+A corpus is a directory containing one subdirectory per document::
+
+    corpus/
+      notice-1/
+        source.txt                  # required
+        es-MX/translation.txt       # optional; NMT output is generated when missing
+        es-MX/reference.txt         # optional; human-reviewed translation (the label)
+
+Every (document, model, prompt) combination is assessed concurrently, and
+Bedrock/Translate responses are cached on disk so that re-running a comparison
+only pays for combinations that have not been seen before.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import dataclasses
+import hashlib
+import itertools
+import json
+import os
+import pathlib
+import string
+import threading
+import time
+import typing
+
+import pydantic
+
+from src.lib import structured_documents
+from src.lib.llm_tools import TranslationAssessment, TranslationImprovement
+from src.lib.logging import get_logger
+from src.lib.stats import mean, percentile
+from src.tasks.translate import Document
+from src.translation_services import amazon_bedrock
+
+if typing.TYPE_CHECKING:  # pragma: nocover
+    from mypy_boto3_bedrock_runtime import BedrockRuntimeClient
+    from mypy_boto3_translate import TranslateClient
+    from src.translation_services.hedging import HedgingPolicy
+    from src.translation_services.token_budget import TokenEstimator
+
+
+DEFAULT_PROMPT_NAME = "default"
+PROMPT_PLACEHOLDERS = ("source_language_name", "target_language_name")
+
+
+class InvalidPromptTemplate(ValueError):
+    """Prompt template has invalid or unknown placeholders"""
+
+
+@dataclasses.dataclass(frozen=True)
+class PromptVariant:
+    name: str
+    template: string.Template = amazon_bedrock.PROMPT_TPL
+
+    @classmethod
+    def from_file(cls, path: str | os.PathLike) -> PromptVariant:
+        """Loads a prompt template whose placeholders match ``amazon_bedrock.PROMPT_TPL``.
+
+        Templates use ``string.Template`` syntax (``$name`` or ``${name}``, with
+        ``$$`` for a literal dollar sign), and are checked here so that a bad
+        placeholder fails once instead of on every assessment.
+        """
+        path = pathlib.Path(path)
+        template = string.Template(path.read_text().strip())
+        if not template.is_valid():
+            raise InvalidPromptTemplate(
+                f"{path}: invalid placeholder; use $$ for a literal dollar sign"
+            )
+        unknown = [i for i in template.get_identifiers() if i not in PROMPT_PLACEHOLDERS]
+        if unknown:
+            raise InvalidPromptTemplate(
+                f"{path}: unknown placeholders {', '.join(unknown)}, "
+                f"expected {', '.join(PROMPT_PLACEHOLDERS)}"
+            )
+        return cls(name=path.stem, template=template)
+
+
+DEFAULT_PROMPT_VARIANT = PromptVariant(name=DEFAULT_PROMPT_NAME)
+
+
+@dataclasses.dataclass
+class CorpusItem:
+    name: str
+    source_document: Document
+    nmt_document: typing.Optional[Document] = None
+    reference_text: typing.Optional[str] = None
+    nmt_latency_s: typing.Optional[float] = None
+    nmt_error: typing.Optional[str] = None
+
+
+class ResponseCache:
+    """File-backed cache of service responses, keyed by a hash of the request payload.
+
+    A cache without a directory never stores anything, which keeps callers free
+    of ``if cache is not None`` checks.
+    """
+
+    def __init__(self, cache_dir: typing.Optional[str | os.PathLike] = None):
+        self.cache_dir = pathlib.Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, namespace: str, payload: typing.Any) -> pathlib.Path | None:
+        if not self.cache_dir:
+            return None
+        digest = hashlib.sha256(
+            json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        return self.cache_dir.joinpath(f"{namespace}-{digest}.json")
+
+    def get(self, namespace: str, payload: typing.Any) -> typing.Any | None:
+        path = self._path(namespace, payload)
+        if path is None:
+            return None
+        try:
+            with open(path) as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return None
+
+    def put(self, namespace: str, payload: typing.Any, value: typing.Any) -> None:
+        path = self._path(namespace, payload)
+        if path is None:
+            return
+        # Write-then-rename so concurrent workers never observe a partial file.
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_path, "w") as fh:
+            json.dump(value, fh, default=str)
+        os.replace(tmp_path, path)
+
+
+@dataclasses.dataclass
+class ConverseCall:
+    latency_s: float
+    input_tokens: int
+    output_tokens: int
+    cached: bool
+
+
+class RecordingBedrockClient:
+    """Wraps a Bedrock Runtime client to cache ``converse`` responses and record
+    latency and token usage for each call.
+    """
+
+    def __init__(self, client: BedrockRuntimeClient, cache: ResponseCache):
+        self._client = client
+        self._cache = cache
+        self.calls: list[ConverseCall] = []
+
+    @property
+    def exceptions(self):
+        return self._client.exceptions
+
+    def converse(self, **kwargs):
+        if (response := self._cache.get("converse", kwargs)) is not None:
+            cached = True
+            latency_s = response.get("metrics", {}).get("latencyMs", 0) / 1000
+        else:
+            cached = False
+            start = time.perf_counter()
+            response = self._client.converse(**kwargs)
+            latency_s = time.perf_counter() - start
+            self._cache.put(
+                "converse",
+                kwargs,
+                {
+                    k: response[k]
+                    for k in ("output", "stopReason", "usage", "metrics")
+                    if k in response
+                },
+            )
+        usage = response.get("usage", {})
+        self.calls.append(
+            ConverseCall(
+                latency_s=latency_s,
+                input_tokens=usage.get("inputTokens", 0),
+                output_tokens=usage.get("outputTokens", 0),
+                cached=cached,
+            )
+        )
+        return response
+
+
+class EvalRecord(pydantic.BaseModel):
+    item: str
+    model_id: str
+    prompt: str
+    error: typing.Optional[str] = None
+    latency_s: typing.Optional[float] = None
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached: bool = False
+    improvements: int = 0
+    major: int = 0
+    minor: int = 0
+    applicable: int = 0
+    accepted: typing.Optional[int] = None
+    reference_aligned: typing.Optional[bool] = None
+    mean_confidence: typing.Optional[float] = None
+    nmt_latency_s: typing.Optional[float] = None
+
+
+class VariantSummary(pydantic.BaseModel):
+    model_id: str
+    prompt: str
+    documents: int
+    errors: int
+    improvements_per_document: typing.Optional[float]
+    major_share: typing.Optional[float]
+    applicable_rate: typing.Optional[float]
+    acceptance_rate: typing.Optional[float]
+    mean_confidence: typing.Optional[float]
+    latency_p50_s: typing.Optional[float]
+    latency_p95_s: typing.Optional[float]
+    mean_input_tokens: typing.Optional[float]
+    mean_output_tokens: typing.Optional[float]
+    cache_hits: int
+
+
+def load_corpus(
+    corpus_dir: str | os.PathLike, source_language: str, target_language: str
+) -> list[CorpusItem]:
+    items: list[CorpusItem] = []
+    for item_dir in sorted(pathlib.Path(corpus_dir).iterdir()):
+        source_path = item_dir.joinpath("source.txt")
+        if not source_path.is_file():
+            continue
+        source_document = Document(
+            content=source_path.read_text(), language=source_language
+        )
+        item = CorpusItem(name=item_dir.name, source_document=source_document)
+        target_dir = item_dir.joinpath(target_language)
+        if (nmt_path := target_dir.joinpath("translation.txt")).is_file():
+            item.nmt_document = Document(
+                content=nmt_path.read_text(),
+                language=target_language,
+                translation_source=source_document,
+            )
+        if (reference_path := target_dir.joinpath("reference.txt")).is_file():
+            item.reference_text = reference_path.read_text()
+        items.append(item)
+    return items
+
+
+def prepare_translations(
+    items: typing.Sequence[CorpusItem],
+    client: TranslateClient,
+    target_language: str,
+    cache: ResponseCache,
+    concurrency: int = 4,
+) -> None:
+    """Fills in the NMT document of every corpus item that does not have one yet."""
+    logger = get_logger(target_language=target_language)
+
+    def _translate(item: CorpusItem) -> None:
+        payload = {
+            "text": item.source_document.content,
+            "source_language": item.source_document.language,
+            "target_language": target_language,
+        }
+        if (cached := cache.get("translate", payload)) is not None:
+            content = cached["content"]
+        else:
+            start = time.perf_counter()
+            content = item.source_document.translate(client, target_language).content
+            item.nmt_latency_s = time.perf_counter() - start
+            cache.put("translate", payload, {"content": content})
+        item.nmt_document = Document(
+            content=content,
+            language=target_language,
+            translation_source=item.source_document,
+        )
+
+    pending = [item for item in items if item.nmt_document is None]
+    logger.info("translating corpus items without NMT output", count=len(pending))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(_translate, item): item for item in pending}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                # the item is reported as an error by evaluate_item
+                item = futures[future]
+                item.nmt_error = f"{type(e).__name__}: {e}"
+                logger.warning(
+                    "failed to translate corpus item", item=item.name, error=item.nmt_error
+                )
+
+
+def _count_accepted(
+    improvements: typing.Sequence[TranslationImprovement], nmt_text: str, reference_text: str
+) -> tuple[int, bool]:
+    """Counts improvements whose replacement appears in the reference translation.
+
+    When the NMT and reference translations have the same number of
+    paragraphs, the replacement must appear in the reference paragraph at the
+    same position as the NMT paragraph containing the excerpt. Otherwise the
+    whole reference is searched, which over-counts short replacements; the
+    second return value is ``False`` in that case.
+    """
+    nmt_segments = structured_documents.StructuredDocument.parse(
+        nmt_text, structured_documents.PLAIN_TEXT
+    ).segments
+    reference_segments = structured_documents.StructuredDocument.parse(
+        reference_text, structured_documents.PLAIN_TEXT
+    ).segments
+    if len(nmt_segments) != len(reference_segments):
+        return sum(1 for i in improvements if i.replacement in reference_text), False
+    return (
+        sum(
+            1
+            for i in improvements
+            if any(
+                i.excerpt in nmt_segment and i.replacement in reference_segment
+                for nmt_segment, reference_segment in zip(nmt_segments, reference_segments)
+            )
+        ),
+        True,
+    )
+
+
+def evaluate_item(
+    client: BedrockRuntimeClient,
+    item: CorpusItem,
+    model_id: str,
+    prompt: PromptVariant,
+    cache: ResponseCache,
+    hedging: typing.Optional[HedgingPolicy] = None,
+    token_estimator: typing.Optional[TokenEstimator] = None,
+) -> EvalRecord:
+    record = EvalRecord(
+        item=item.name,
+        model_id=model_id,
+        prompt=prompt.name,
+        nmt_latency_s=item.nmt_latency_s,
+    )
+    if item.nmt_document is None:
+        record.error = (
+            f"NMT failed: {item.nmt_error}" if item.nmt_error else "missing NMT translation"
+        )
+        return record
+
+    recorder = RecordingBedrockClient(client, cache)
+    start = time.perf_counter()
+    try:
+        assessment = amazon_bedrock.suggest_translation_refinements(
+            recorder,
+            translated_text=item.nmt_document.content,
+            source_language=item.source_document.language,
+            target_language=item.nmt_document.language,
+            with_tool=TranslationAssessment,
+            model_id=model_id,
+            prompt_template=prompt.template,
+            hedging=hedging,
+            # truncated or malformed output counts against the variant
+            salvage=False,
+            token_estimator=token_estimator,
+        )
+    except Exception as e:
+        record.error = f"{type(e).__name__}: {e}"
+        return record
+    finally:
+        record.latency_s = time.perf_counter() - start
+        if recorder.calls:
+            record.input_tokens = sum(c.input_tokens for c in recorder.calls)
+            record.output_tokens = sum(c.output_tokens for c in recorder.calls)
+            record.cached = all(c.cached for c in recorder.calls)
+            if record.cached:
+                # report the latency of the original (uncached) calls
+                record.latency_s = sum(c.latency_s for c in recorder.calls)
+
+    assessment = typing.cast(TranslationAssessment, assessment)
+    improvements = assessment.improvements
+    record.improvements = len(improvements)
+    record.major = sum(1 for i in improvements if i.severity == "MAJOR")
+    record.minor = sum(1 for i in improvements if i.severity == "MINOR")
+    record.applicable = sum(
+        1 for i in improvements if i.excerpt in item.nmt_document.content
+    )
+    if item.reference_text is not None:
+        record.accepted, record.reference_aligned = _count_accepted(
+            improvements, item.nmt_document.content, item.reference_text
+        )
+    record.mean_confidence = mean(i.confidence for i in improvements)
+    return record
+
+
+def run_evaluation(
+    items: typing.Sequence[CorpusItem],
+    client: BedrockRuntimeClient,
+    model_ids: typing.Sequence[str],
+    prompts: typing.Sequence[PromptVariant],
+    cache: ResponseCache,
+    concurrency: int = 4,
+    hedging: typing.Optional[HedgingPolicy] = None,
+    token_estimator: typing.Optional[TokenEstimator] = None,
+) -> list[EvalRecord]:
+    logger = get_logger(
+        items=len(items), model_ids=list(model_ids), prompts=[p.name for p in prompts]
+    )
+    combinations = list(itertools.product(items, model_ids, prompts))
+    logger.info("running evaluation", combinations=len(combinations))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        records = list(
+            executor.map(
+                lambda args: evaluate_item(
+                    client,
+                    *args,
+                    cache=cache,
+                    hedging=hedging,
+                    token_estimator=token_estimator,
+                ),
+                combinations,
+            )
+        )
+    logger.info(
+        "evaluation complete", errors=sum(1 for r in records if r.error is not None)
+    )
+    return records
+
+
+def _ratio(numerator: int, denominator: int) -> float | None:
+    return numerator / denominator if denominator else None
+
+
+def summarize(records: typing.Iterable[EvalRecord]) -> list[VariantSummary]:
+    grouped: dict[tuple[str, str], list[EvalRecord]] = {}
+    for record in records:
+        grouped.setdefault((record.model_id, record.prompt), []).append(record)
+
+    summaries: list[VariantSummary] = []
+    for (model_id, prompt), group in grouped.items():
+        ok = [r for r in group if r.error is None]
+        improvements = sum(r.improvements for r in ok)
+        labelled = [r for r in ok if r.accepted is not None]
+        confidences = [r.mean_confidence for r in ok if r.mean_confidence is not None]
+        summaries.append(
+            VariantSummary(
+                model_id=model_id,
+                prompt=prompt,
+                documents=len(group),
+                errors=len(group) - len(ok),
+                improvements_per_document=_ratio(improvements, len(ok)),
+                major_share=_ratio(sum(r.major for r in ok), improvements),
+                applicable_rate=_ratio(sum(r.applicable for r in ok), improvements),
+                acceptance_rate=_ratio(
+                    sum(typing.cast(int, r.accepted) for r in labelled),
+                    sum(r.improvements for r in labelled),
+                ),
+                mean_confidence=mean(confidences),
+                latency_p50_s=percentile(
+                    (r.latency_s for r in ok if r.latency_s is not None), 50
+                ),
+                latency_p95_s=percentile(
+                    (r.latency_s for r in ok if r.latency_s is not None), 95
+                ),
+                mean_input_tokens=mean(r.input_tokens for r in ok),
+                mean_output_tokens=mean(r.output_tokens for r in ok),
+                cache_hits=sum(1 for r in group if r.cached),
+            )
+        )
+    return summaries
+
+
+_TABLE_COLUMNS: list[tuple[str, str]] = [
+    ("model_id", "model"),
+    ("prompt", "prompt"),
+    ("documents", "docs"),
+    ("errors", "errors"),
+    ("improvements_per_document", "improvements/doc"),
+    ("major_share", "MAJOR share"),
+    ("applicable_rate", "applicable"),
+    ("acceptance_rate", "accepted"),
+    ("mean_confidence", "confidence"),
+    ("latency_p50_s", "p50 s"),
+    ("latency_p95_s", "p95 s"),
+    ("mean_input_tokens", "in tokens"),
+    ("mean_output_tokens", "out tokens"),
+    ("cache_hits", "cached"),
+]
+
+
+def format_comparison_table(summaries: typing.Sequence[VariantSummary]) -> str:
+    """Renders variant summaries as a Markdown table."""
+
+    def _cell(value: typing.Any) -> str:
+        if value is None:
+            return "-"
+        if isinstance(value, float):
+            return f"{value:.2f}"
+        return str(value)
+
+    lines = [
+        "| " + " | ".join(title for _, title in _TABLE_COLUMNS) + " |",
+        "|" + "|".join("---" for _ in _TABLE_COLUMNS) + "|",
+    ]
+    for summary in summaries:
+        lines.append(
+            "| "
+            + " | ".join(_cell(getattr(summary, field)) for field, _ in _TABLE_COLUMNS)
+            + " |"
+        )
+    return "\n".join(lines)
+
+
+def write_results(
+    output_dir: str | os.PathLike,
+    records: typing.Sequence[EvalRecord],
+    summaries: typing.Sequence[VariantSummary],
+) -> None:
+    output_dir = pathlib.Path(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    with open(output_dir.joinpath("results.jsonl"), "w+") as fh:
+        for record in records:
+            fh.write(record.model_dump_json() + "\n")
+    with open(output_dir.joinpath("summary.json"), "w+") as fh:
+        json.dump([s.model_dump() for s in summaries], fh, indent=2)
+    with open(output_dir.joinpath("comparison.md"), "w+") as fh:
+        fh.write(format_comparison_table(summaries) + "\n")
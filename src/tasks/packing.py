@@ -0,0 +1,345 @@
+"""Packs many short documents into shared translation and assessment requests.
+
+For short messages (SMS reminders, form labels) the per-request overhead of a
+``translate_document`` or ``converse`` call dominates. ``DocumentPacker``
+combines short plain text documents with the same language pair into one
+request:
+
+- translations are sent as one HTML document with a ``<div data-item="N">``
+  element per document, which Translate (and the LLM providers) keep intact;
+- assessments are sent as ``<document id="N">`` elements and requested with
+  the ``batch_translation_assessment`` tool, which has one entry per document.
+
+Responses are split back into per-document results, and each result is
+checked: a translation must come back exactly once with its line breaks, and
+an assessment must be returned exactly once with excerpts quoted from its own
+document. Documents whose result fails a check are retried individually.
+"""
+
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import html
+import re
+import string
+import threading
+import typing
+
+import pydantic
+
+from src.lib import structured_documents
+from src.lib.llm_tools import BatchTranslationAssessment, TranslationAssessment
+from src.lib.logging import get_logger
+from src.tasks.translate import Document, MissingTranslationSource, translation_provider
+from src.translation_services import amazon_bedrock, providers
+
+if typing.TYPE_CHECKING:  # pragma: nocover
+    from mypy_boto3_bedrock_runtime import BedrockRuntimeClient
+    from mypy_boto3_translate import TranslateClient
+    from src.translation_services.hedging import HedgingPolicy
+    from src.translation_services.providers import TranslationProvider
+    from src.translation_services.token_budget import TokenEstimator
+
+T = typing.TypeVar("T")
+
+BATCH_PROMPT_TPL = string.Template(
+    """
+Each of the following documents, enclosed in <document> elements, has been
+translated to "$target_language_name" language. The original documents were in
+"$source_language_name". Assess every document separately: identify common
+translation errors and suggest corrections, quoting excerpts exactly from that
+document only. Do not suggest translations for web URLs or proper nouns, such
+as the names of government departments, systems, and services.
+""".replace("\n", " ").strip()
+)
+
+_PACKED_ITEM_RE = re.compile(r'<div data-item="(\d+)">(.*?)</div>', re.DOTALL)
+_BR_RE = re.compile(r"<br\s*/?>", re.IGNORECASE)
+
+
+class PackingStats(pydantic.BaseModel):
+    documents: int
+    packed_documents: int
+    packed_requests: int
+    individual_requests: int
+    fallbacks: int
+    requests_saved: int
+
+
+def pack_for_translation(texts: typing.Sequence[str]) -> str:
+    """Combines plain texts into one HTML document, one element per text."""
+    items = []
+    for i, text in enumerate(texts):
+        body = html.escape(text.strip(), quote=False).replace("\n", "<br>")
+        items.append(f'<div data-item="{i}">{body}</div>')
+    return "\n".join(items)
+
+
+def unpack_translation(packed: str, texts: typing.Sequence[str]) -> list[str | None]:
+    """Splits a translated packed document into one translation per text.
+
+    A translation is ``None`` when it is missing, duplicated, empty, or has
+    lost line breaks or markup integrity.
+    """
+    found: dict[int, list[str]] = collections.defaultdict(list)
+    for match in _PACKED_ITEM_RE.finditer(packed):
+        found[int(match.group(1))].append(match.group(2))
+
+    results: list[str | None] = []
+    for i, text in enumerate(texts):
+        if len(found.get(i, ())) != 1:
+            results.append(None)
+            continue
+        body = _BR_RE.sub("\n", found[i][0]).strip()
+        if "<" in body or not body or body.count("\n") != text.strip().count("\n"):
+            results.append(None)
+            continue
+        # keep the whitespace around the original text, e.g. a trailing newline
+        stripped = text.strip()
+        start = text.index(stripped)
+        results.append(text[:start] + html.unescape(body) + text[start + len(stripped) :])
+    return results
+
+
+def pack_for_assessment(texts: typing.Sequence[str]) -> str:
+    return "\n\n".join(
+        f'<document id="{i}">\n{text}\n</document>' for i, text in enumerate(texts)
+    )
+
+
+def unpack_assessment(
+    batch: BatchTranslationAssessment, texts: typing.Sequence[str]
+) -> list[TranslationAssessment | None]:
+    """Splits a batch assessment into one assessment per text.
+
+    An assessment is ``None`` when its document is missing or assessed more
+    than once, or when an excerpt does not come from its document.
+    """
+    by_id: dict[str, list[typing.Any]] = collections.defaultdict(list)
+    for assessment in batch.assessments:
+        by_id[assessment.document_id.strip()].append(assessment)
+
+    results: list[TranslationAssessment | None] = []
+    for i, text in enumerate(texts):
+        entries = by_id.get(str(i), [])
+        if len(entries) != 1 or any(
+            improvement.excerpt not in text for improvement in entries[0].improvements
+        ):
+            results.append(None)
+            continue
+        results.append(
+            TranslationAssessment(
+                quality_assessments=entries[0].quality_assessments,
+                improvements=entries[0].improvements,
+            )
+        )
+    return results
+
+
+class DocumentPacker:
+    """Translates and assesses short documents in shared requests.
+
+    Can be shared by concurrent callers.
+
+    :param max_item_chars: Longer documents are always sent individually.
+    :param max_pack_chars: Maximum combined length of the documents in one request.
+    :param max_pack_items: Maximum number of documents in one request.
+    :param max_workers: Number of requests sent concurrently.
+    """
+
+    def __init__(
+        self,
+        max_item_chars: int = 500,
+        max_pack_chars: int = 5000,
+        max_pack_items: int = 50,
+        max_workers: int = 4,
+    ):
+        self.max_item_chars = max_item_chars
+        self.max_pack_chars = max_pack_chars
+        self.max_pack_items = max_pack_items
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._documents = 0
+        self._packed_documents = 0
+        self._packed_requests = 0
+        self._individual_requests = 0
+        self._fallbacks = 0
+
+    def is_packable(self, document: Document) -> bool:
+        return (
+            not document.is_structured
+            and bool(document.content.strip())
+            and len(document.content) <= self.max_item_chars
+        )
+
+    def _packs(
+        self, documents: typing.Sequence[Document], key: typing.Callable[[Document], typing.Hashable]
+    ) -> tuple[list[list[int]], list[int]]:
+        """Groups packable documents by ``key`` into packs; returns packs and unpacked indexes."""
+        groups: dict[typing.Hashable, list[list[int]]] = {}
+        individual: list[int] = []
+        sizes: dict[typing.Hashable, int] = {}
+        for i, document in enumerate(documents):
+            if not self.is_packable(document):
+                individual.append(i)
+                continue
+            group = groups.setdefault(key(document), [[]])
+            size = sizes.get(key(document), 0)
+            if group[-1] and (
+                len(group[-1]) >= self.max_pack_items
+                or size + len(document.content) > self.max_pack_chars
+            ):
+                group.append([])
+                size = 0
+            group[-1].append(i)
+            sizes[key(document)] = size + len(document.content)
+        packs = [pack for group in groups.values() for pack in group]
+        # a "pack" of one document is just an individual request
+        individual.extend(pack[0] for pack in packs if len(pack) == 1)
+        return [pack for pack in packs if len(pack) > 1], sorted(individual)
+
+    def _run(
+        self,
+        documents: typing.Sequence[Document],
+        key: typing.Callable[[Document], typing.Hashable],
+        packed_call: typing.Callable[[list[Document]], list[T | None]],
+        individual_call: typing.Callable[[Document], T],
+    ) -> list[T]:
+        logger = get_logger(documents=len(documents))
+        packs, individual = self._packs(documents, key)
+        results: list[T | None] = [None] * len(documents)
+
+        def _individual(i: int) -> None:
+            with self._lock:
+                self._individual_requests += 1
+            results[i] = individual_call(documents[i])
+
+        def _packed(pack: list[int]) -> list[int]:
+            with self._lock:
+                self._packed_requests += 1
+                self._packed_documents += len(pack)
+            try:
+                pack_results = packed_call([documents[i] for i in pack])
+            except Exception as e:
+                logger.warning(
+                    "packed request failed, sending documents individually",
+                    pack_size=len(pack),
+                    error=str(e),
+                )
+                pack_results = [None] * len(pack)
+            failed = []
+            for i, result in zip(pack, pack_results):
+                if result is None:
+                    failed.append(i)
+                else:
+                    results[i] = result
+            if failed:
+                logger.info(
+                    "packed results failed validation, sending documents individually",
+                    pack_size=len(pack),
+                    failed=len(failed),
+                )
+                with self._lock:
+                    self._fallbacks += len(failed)
+            return failed
+
+        with self._lock:
+            self._documents += len(documents)
+        logger.info(
+            "packing documents into shared requests",
+            packs=len(packs),
+            individual=len(individual),
+        )
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(_individual, i) for i in individual]
+            for failed in executor.map(_packed, packs):
+                futures.extend(executor.submit(_individual, i) for i in failed)
+            for future in futures:
+                future.result()
+        return typing.cast(list[T], results)
+
+    def translate(
+        self,
+        documents: typing.Sequence[Document],
+        client: TranslateClient | TranslationProvider,
+        language: str,
+    ) -> list[Document]:
+        """Translates every document into ``language``, in the same order."""
+        provider = translation_provider(client)
+
+        def _packed(pack: list[Document]) -> list[Document | None]:
+            texts = [d.content for d in pack]
+            translated = provider.translate(
+                pack_for_translation(texts),
+                source_language=pack[0].language,
+                target_language=language,
+                mime_type=structured_documents.HTML,
+            )
+            return [
+                Document(content=content, language=language, translation_source=document)
+                if content is not None
+                else None
+                for document, content in zip(pack, unpack_translation(translated, texts))
+            ]
+
+        return self._run(
+            documents,
+            key=lambda d: d.language,
+            packed_call=_packed,
+            individual_call=lambda d: d.translate(provider, language),
+        )
+
+    def assess(
+        self,
+        documents: typing.Sequence[Document],
+        client: BedrockRuntimeClient,
+        model_id: str = amazon_bedrock.DEFAULT_MODEL_ID,
+        hedging: typing.Optional[HedgingPolicy] = None,
+        token_estimator: typing.Optional[TokenEstimator] = None,
+    ) -> list[TranslationAssessment]:
+        """Assesses every (translated) document, in the same order."""
+        if any(d.translation_source is None for d in documents):
+            raise MissingTranslationSource(
+                "cannot assess a document that has no translation source"
+            )
+        individual_provider = providers.AmazonProvider(
+            bedrock_client=client,
+            model_id=model_id,
+            hedging=hedging,
+            token_estimator=token_estimator,
+        )
+
+        def _packed(pack: list[Document]) -> list[TranslationAssessment | None]:
+            texts = [d.content for d in pack]
+            batch = amazon_bedrock.suggest_translation_refinements(
+                client,
+                translated_text=pack_for_assessment(texts),
+                source_language=typing.cast(Document, pack[0].translation_source).language,
+                target_language=pack[0].language,
+                with_tool=BatchTranslationAssessment,
+                model_id=model_id,
+                prompt_template=BATCH_PROMPT_TPL,
+                hedging=hedging,
+                token_estimator=token_estimator,
+            )
+            return unpack_assessment(typing.cast(BatchTranslationAssessment, batch), texts)
+
+        return self._run(
+            documents,
+            key=lambda d: (typing.cast(Document, d.translation_source).language, d.language),
+            packed_call=_packed,
+            individual_call=lambda d: d.get_assessment(individual_provider),
+        )
+
+    def stats(self) -> PackingStats:
+        with self._lock:
+            requests = self._packed_requests + self._individual_requests
+            return PackingStats(
+                documents=self._documents,
+                packed_documents=self._packed_documents,
+                packed_requests=self._packed_requests,
+                individual_requests=self._individual_requests,
+                fallbacks=self._fallbacks,
+                requests_saved=self._documents - requests,
+            )
@@ -0,0 +1,539 @@
+"""Capacity planning by discrete-event simulation of the translate pipeline.
+
+``translate --record-timings FILE`` appends one ``PipelineTiming`` per run:
+the wall-clock time and number of requests per service of each pipeline
+stage, along with the size of the document. ``simulate`` replays those timings
+against a target arrival rate and document-size mix, to predict throughput,
+queue depth, end-to-end latency and throttling for a deployment without
+load-testing live services.
+
+The model:
+
+- documents arrive at random (a Poisson process) and wait for one of
+  ``workers`` pipeline workers;
+- each stage's latency is predicted from the document size with a
+  least-squares fit of the recorded timings, multiplied by a residual drawn
+  from the recorded runs so that the simulated spread (and tail) follows
+  the observed one;
+- stages that call Translate or Bedrock also wait for one of the service's
+  concurrent request slots, and count against its requests-per-minute and
+  (for Bedrock) tokens-per-minute quotas. A stage that calls both services
+  (e.g. verification with re-assessment) calls them in turn, splitting its
+  latency by request count. Token usage is estimated with
+  ``TokenEstimator``, optionally from a ``--token-history`` file;
+- requests over a quota are throttled and retried with exponential backoff
+  and full jitter, failing the document after ``max_attempts``;
+- a stage is skipped for the given fraction of documents that hit a cache.
+"""
+
+from __future__ import annotations
+
+import collections
+import contextlib
+import dataclasses
+import datetime
+import heapq
+import itertools
+import json
+import os
+import random
+import time
+import typing
+
+import pydantic
+
+from src.lib.llm_tools import TranslationAssessment
+from src.lib.logging import get_logger
+from src.lib.stats import fit_line, mean, percentile
+from src.translation_services import amazon_bedrock
+from src.translation_services.token_budget import TokenEstimator
+
+if typing.TYPE_CHECKING:  # pragma: nocover
+    from src.lib.profiling import Profiler
+
+# Services simulated, named as providers count their requests. Requests to
+# other services (e.g. Azure or Gemini) only occupy a worker.
+TRANSLATE = "translate"
+BEDROCK = "bedrock"
+SERVICES = (TRANSLATE, BEDROCK)
+
+# Stages recorded by ``translate``, in the order it runs them
+PIPELINE_STAGES = ("nmt", "assessment", "serialize_assessment", "apply_improvements", "verify")
+
+# Latency of a throttled request, before it is retried
+THROTTLE_LATENCY_S = 0.05
+
+
+class NoTimings(Exception):
+    """No recorded pipeline timings to simulate from"""
+
+
+class StageTiming(pydantic.BaseModel):
+    name: str
+    wall_s: float
+    requests: dict[str, int] = {}
+
+
+class PipelineTiming(pydantic.BaseModel):
+    document: str
+    mime_type: str
+    source_chars: int
+    created_at: datetime.datetime
+    stages: list[StageTiming]
+
+
+class SimulationSettings(pydantic.BaseModel):
+    arrival_rate_per_min: float = pydantic.Field(gt=0)
+    duration_min: float = pydantic.Field(default=60, gt=0)
+    workers: int = 8
+    translate_concurrency: int = 10
+    bedrock_concurrency: int = 10
+    translate_rpm: typing.Optional[int] = None
+    bedrock_rpm: typing.Optional[int] = None
+    bedrock_tpm: typing.Optional[int] = None
+    cache_hit_rates: dict[str, float] = {}
+    max_attempts: int = 5
+    backoff_base_s: float = 1.0
+    backoff_max_s: float = 20.0
+    seed: int = 0
+
+
+class ServiceResult(pydantic.BaseModel):
+    requests: int
+    throttled: int
+    throttle_rate: float
+    utilization: float
+
+
+class SimulationResult(pydantic.BaseModel):
+    settings: SimulationSettings
+    arrived: int
+    completed: int
+    failed: int
+    backlog_at_end: int
+    throughput_per_min: float
+    latency_mean_s: typing.Optional[float]
+    latency_p50_s: typing.Optional[float]
+    latency_p95_s: typing.Optional[float]
+    latency_p99_s: typing.Optional[float]
+    queue_depth_mean: float
+    queue_depth_max: int
+    services: dict[str, ServiceResult]
+
+
+class TimingRecorder:
+    """Records the wall-clock time and service requests of pipeline stages.
+
+    :param profiler: Each stage is also profiled with this profiler.
+    :param request_counter: Returns the number of requests made so far per
+        service; a stage's requests are the difference before and after it.
+    """
+
+    def __init__(
+        self,
+        profiler: typing.Optional[Profiler] = None,
+        request_counter: typing.Optional[typing.Callable[[], typing.Mapping[str, int]]] = None,
+    ):
+        self.profiler = profiler
+        self.request_counter = request_counter
+        self.stages: list[StageTiming] = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> typing.Iterator[None]:
+        requests_before = dict(self.request_counter()) if self.request_counter else {}
+        start = time.perf_counter()
+        with self.profiler.stage(name) if self.profiler else contextlib.nullcontext():
+            try:
+                yield
+            finally:
+                wall_s = time.perf_counter() - start
+                requests_after = self.request_counter() if self.request_counter else {}
+                self.stages.append(
+                    StageTiming(
+                        name=name,
+                        wall_s=wall_s,
+                        requests={
+                            service: count - requests_before.get(service, 0)
+                            for service, count in requests_after.items()
+                            if count > requests_before.get(service, 0)
+                        },
+                    )
+                )
+
+    def timing(self, document: str, mime_type: str, source_chars: int) -> PipelineTiming:
+        return PipelineTiming(
+            document=document,
+            mime_type=mime_type,
+            source_chars=source_chars,
+            created_at=datetime.datetime.now(datetime.timezone.utc),
+            stages=self.stages,
+        )
+
+
+def append_timings(path: str | os.PathLike, timings: typing.Iterable[PipelineTiming]) -> None:
+    with open(path, "a") as fh:
+        for timing in timings:
+            fh.write(timing.model_dump_json() + "\n")
+
+
+def load_timings(path: str | os.PathLike) -> list[PipelineTiming]:
+    with open(path, "rb") as fh:
+        return [PipelineTiming.model_validate_json(line) for line in fh if line.strip()]
+
+
+class StageModel:
+    """Predicts the latency of one pipeline stage from the document size.
+
+    :param residuals: Ratios of recorded to predicted latency, sampled to
+        reproduce the recorded spread.
+    :param requests: Requests per document to each simulated service; the
+        stage calls the services in turn.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        intercept: float,
+        slope: float,
+        residuals: typing.Sequence[float],
+        requests: typing.Mapping[str, int],
+    ):
+        self.name = name
+        self.intercept = intercept
+        self.slope = slope
+        self.residuals = list(residuals) or [1.0]
+        self.requests = {s: n for s, n in requests.items() if s in SERVICES and n > 0}
+
+    @classmethod
+    def fit(cls, name: str, samples: typing.Sequence[tuple[int, StageTiming]]) -> StageModel:
+        """Fits a stage model to ``(document chars, timing)`` samples."""
+        fit = fit_line([(chars, timing.wall_s) for chars, timing in samples])
+        if fit is None or fit[1] < 0 or fit[0] + fit[1] * min(c for c, _ in samples) <= 0:
+            # sizes do not vary, or do not explain the latency
+            fit = (typing.cast(float, mean(t.wall_s for _, t in samples)), 0.0)
+        intercept, slope = fit
+        residuals = [
+            timing.wall_s / predicted
+            for chars, timing in samples
+            if (predicted := intercept + slope * chars) > 0
+        ]
+        requests = {
+            # every service the stage called at least once is called by every document
+            service: max(round(sum(t.requests.get(service, 0) for _, t in samples) / len(samples)), 1)
+            for service in SERVICES
+            if any(t.requests.get(service) for _, t in samples)
+        }
+        return cls(name, intercept, slope, residuals, requests)
+
+    def sample(self, chars: int, rng: random.Random) -> float:
+        return max(self.intercept + self.slope * chars, 0.0) * rng.choice(self.residuals)
+
+
+def fit_stage_models(timings: typing.Sequence[PipelineTiming]) -> list[StageModel]:
+    """Fits one model per recorded stage, in pipeline order.
+
+    Stages not in ``PIPELINE_STAGES`` come last, in the order they were recorded.
+    """
+    if not timings:
+        raise NoTimings("no recorded pipeline timings")
+    samples: dict[str, list[tuple[int, StageTiming]]] = collections.defaultdict(list)
+    for timing in timings:
+        for stage in timing.stages:
+            samples[stage.name].append((timing.source_chars, stage))
+    # a run may skip stages, e.g. nmt when a translation already exists
+    names = sorted(
+        samples,
+        key=lambda name: (
+            PIPELINE_STAGES.index(name) if name in PIPELINE_STAGES else len(PIPELINE_STAGES)
+        ),
+    )
+    return [StageModel.fit(name, samples[name]) for name in names]
+
+
+@dataclasses.dataclass
+class _Document:
+    chars: int
+    arrived_at: float
+    stage: int = 0
+    # service calls left in the current stage: (service, requests, latency)
+    calls: list[tuple[str, int, float]] = dataclasses.field(default_factory=list)
+
+
+class _Service:
+    """Concurrent request slots and sliding one-minute quotas of a service."""
+
+    def __init__(self, concurrency: int, rpm: typing.Optional[int], tpm: typing.Optional[int]):
+        self.concurrency = concurrency
+        self.rpm = rpm
+        self.tpm = tpm
+        self.busy = 0
+        self.waiting: collections.deque[tuple[_Document, int]] = collections.deque()
+        self._request_log: collections.deque[tuple[float, int, int]] = collections.deque()
+        self._window_requests = 0
+        self._window_tokens = 0
+        self.requests = 0
+        self.throttled = 0
+        self.busy_s = 0.0
+
+    def admit(self, now: float, requests: int, tokens: int) -> bool:
+        """Counts the requests against the quotas, or returns ``False`` if they are throttled."""
+        while self._request_log and self._request_log[0][0] <= now - 60:
+            _, old_requests, old_tokens = self._request_log.popleft()
+            self._window_requests -= old_requests
+            self._window_tokens -= old_tokens
+        self.requests += requests
+        if (self.rpm is not None and self._window_requests + requests > self.rpm) or (
+            self.tpm is not None and self._window_tokens + tokens > self.tpm
+        ):
+            self.throttled += requests
+            return False
+        self._request_log.append((now, requests, tokens))
+        self._window_requests += requests
+        self._window_tokens += tokens
+        return True
+
+
+class Simulation:
+    """Simulates the pipeline for one set of settings."""
+
+    def __init__(
+        self,
+        stages: typing.Sequence[StageModel],
+        settings: SimulationSettings,
+        document_sizes: typing.Sequence[tuple[int, float]],
+        token_estimator: typing.Optional[TokenEstimator] = None,
+    ):
+        self.stages = list(stages)
+        self.settings = settings
+        self.document_sizes = list(document_sizes)
+        self.token_estimator = token_estimator or TokenEstimator()
+        self.overhead_chars = len(
+            amazon_bedrock.format_prompt("English", "Spanish", TranslationAssessment.NAME)
+        ) + len(json.dumps(TranslationAssessment.as_toolspec()))
+        self.rng = random.Random(settings.seed)
+        self.services = {
+            TRANSLATE: _Service(settings.translate_concurrency, settings.translate_rpm, None),
+            BEDROCK: _Service(settings.bedrock_concurrency, settings.bedrock_rpm, settings.bedrock_tpm),
+        }
+        self._events: list[tuple[float, int, typing.Callable[[], None]]] = []
+        self._sequence = itertools.count()
+        self.now = 0.0
+        self._busy_workers = 0
+        self._worker_queue: collections.deque[_Document] = collections.deque()
+        self._queue_area = 0.0
+        self._queue_max = 0
+        self._arrived = 0
+        self._completed_in_window = 0
+        self._failed = 0
+        self._backlog_at_end = 0
+        self._latencies: list[float] = []
+
+    def _schedule(self, delay_s: float, callback: typing.Callable[[], None]) -> None:
+        heapq.heappush(self._events, (self.now + delay_s, next(self._sequence), callback))
+
+    def _queue_depth(self) -> int:
+        return len(self._worker_queue) + sum(len(s.waiting) for s in self.services.values())
+
+    def _tokens(self, service: str, requests: int, chars: int) -> int:
+        if service != BEDROCK:
+            return 0
+        estimate = self.token_estimator.estimate_chars(
+            chars, overhead_chars=self.overhead_chars
+        )
+        return (estimate.input_tokens + estimate.output_tokens) * requests
+
+    def _arrive(self) -> None:
+        end_s = self.settings.duration_min * 60
+        if self.now >= end_s:
+            return
+        self._arrived += 1
+        sizes, weights = zip(*self.document_sizes)
+        document = _Document(chars=self.rng.choices(sizes, weights)[0], arrived_at=self.now)
+        if self._busy_workers < self.settings.workers:
+            self._busy_workers += 1
+            self._next_stage(document)
+        else:
+            self._worker_queue.append(document)
+        self._schedule(
+            self.rng.expovariate(self.settings.arrival_rate_per_min / 60), self._arrive
+        )
+
+    def _release_worker(self) -> None:
+        if self._worker_queue:
+            self._next_stage(self._worker_queue.popleft())
+        else:
+            self._busy_workers -= 1
+
+    def _next_stage(self, document: _Document) -> None:
+        if document.stage == len(self.stages):
+            self._latencies.append(self.now - document.arrived_at)
+            if self.now <= self.settings.duration_min * 60:
+                self._completed_in_window += 1
+            self._release_worker()
+            return
+        stage = self.stages[document.stage]
+        document.stage += 1
+        if self.rng.random() < self.settings.cache_hit_rates.get(stage.name, 0):
+            self._next_stage(document)
+            return
+        duration_s = stage.sample(document.chars, self.rng)
+        if not stage.requests:
+            self._schedule(duration_s, lambda: self._next_stage(document))
+            return
+        total_requests = sum(stage.requests.values())
+        document.calls = [
+            (name, requests, duration_s * requests / total_requests)
+            for name, requests in stage.requests.items()
+        ]
+        self._request(document, attempt=1)
+
+    def _request(self, document: _Document, attempt: int) -> None:
+        name, requests, duration_s = document.calls[0]
+        service = self.services[name]
+        if service.busy >= service.concurrency:
+            service.waiting.append((document, attempt))
+            return
+        service.busy += 1
+        if service.admit(self.now, requests, self._tokens(name, requests, document.chars)):
+
+            def _done() -> None:
+                service.busy_s += duration_s
+                self._release_slot(service)
+                document.calls.pop(0)
+                if document.calls:
+                    self._request(document, attempt=1)
+                else:
+                    self._next_stage(document)
+
+            self._schedule(duration_s, _done)
+            return
+
+        def _throttled() -> None:
+            self._release_slot(service)
+            if attempt >= self.settings.max_attempts:
+                self._failed += 1
+                self._release_worker()
+                return
+            backoff_s = self.rng.uniform(
+                0,
+                min(self.settings.backoff_max_s, self.settings.backoff_base_s * 2 ** (attempt - 1)),
+            )
+            self._schedule(backoff_s, lambda: self._request(document, attempt + 1))
+
+        self._schedule(THROTTLE_LATENCY_S, _throttled)
+
+    def _release_slot(self, service: _Service) -> None:
+        service.busy -= 1
+        if service.waiting:
+            self._request(*service.waiting.popleft())
+
+    def run(self) -> SimulationResult:
+        end_s = self.settings.duration_min * 60
+        self._schedule(0, self._arrive)
+        backlog_recorded = False
+        while self._events:
+            at, _, callback = heapq.heappop(self._events)
+            if not backlog_recorded and at > end_s:
+                self._backlog_at_end = (
+                    self._arrived - len(self._latencies) - self._failed
+                )
+                backlog_recorded = True
+            depth = self._queue_depth()
+            if self.now < end_s:
+                self._queue_area += depth * (min(at, end_s) - self.now)
+            self.now = at
+            callback()
+            self._queue_max = max(self._queue_max, self._queue_depth())
+
+        return SimulationResult(
+            settings=self.settings,
+            arrived=self._arrived,
+            completed=len(self._latencies),
+            failed=self._failed,
+            backlog_at_end=self._backlog_at_end,
+            throughput_per_min=self._completed_in_window / self.settings.duration_min,
+            latency_mean_s=mean(self._latencies),
+            latency_p50_s=percentile(self._latencies, 50),
+            latency_p95_s=percentile(self._latencies, 95),
+            latency_p99_s=percentile(self._latencies, 99),
+            queue_depth_mean=self._queue_area / end_s,
+            queue_depth_max=self._queue_max,
+            services={
+                name: ServiceResult(
+                    requests=service.requests,
+                    throttled=service.throttled,
+                    throttle_rate=service.throttled / service.requests if service.requests else 0.0,
+                    utilization=min(
+                        service.busy_s / (service.concurrency * max(self.now, end_s)), 1.0
+                    ),
+                )
+                for name, service in self.services.items()
+            },
+        )
+
+
+def simulate(
+    timings: typing.Sequence[PipelineTiming],
+    settings: typing.Iterable[SimulationSettings],
+    document_sizes: typing.Optional[typing.Sequence[tuple[int, float]]] = None,
+    token_estimator: typing.Optional[TokenEstimator] = None,
+) -> list[SimulationResult]:
+    """Simulates the pipeline under each of ``settings``.
+
+    ``document_sizes`` is a mix of ``(chars, weight)`` pairs; it defaults to
+    the sizes of the recorded documents.
+    """
+    stages = fit_stage_models(timings)
+    sizes = document_sizes or [(t.source_chars, 1.0) for t in timings]
+    logger = get_logger(stages=[s.name for s in stages], recorded_runs=len(timings))
+    results = []
+    for run_settings in settings:
+        result = Simulation(stages, run_settings, sizes, token_estimator).run()
+        logger.debug("simulated pipeline", **result.model_dump(exclude={"services"}))
+        results.append(result)
+    return results
+
+
+_TABLE_COLUMNS = [
+    ("workers", "Workers"),
+    ("translate_concurrency", "Translate conc."),
+    ("bedrock_concurrency", "Bedrock conc."),
+    ("translate_rpm", "Translate RPM"),
+    ("bedrock_rpm", "Bedrock RPM"),
+    ("bedrock_tpm", "Bedrock TPM"),
+    ("cache_hit_rates", "Cache hits"),
+    ("throughput_per_min", "Docs/min"),
+    ("latency_p95_s", "p95 latency (s)"),
+    ("queue_depth_mean", "Mean queue"),
+    ("queue_depth_max", "Max queue"),
+    ("backlog_at_end", "Backlog"),
+    ("failed", "Failed"),
+    ("throttled", "Throttled"),
+]
+
+
+def format_simulation_table(results: typing.Sequence[SimulationResult]) -> str:
+    """Renders simulation results as a Markdown table."""
+
+    def _cell(result: SimulationResult, field: str) -> str:
+        if field == "throttled":
+            return ", ".join(
+                f"{name} {service.throttle_rate:.1%}" for name, service in result.services.items()
+            )
+        source = result.settings if field in SimulationSettings.model_fields else result
+        value = getattr(source, field)
+        if value is None:
+            return "-"
+        if isinstance(value, dict):
+            return ", ".join(f"{k} {v:.0%}" for k, v in value.items()) or "-"
+        if isinstance(value, float):
+            return f"{value:.2f}"
+        return str(value)
+
+    lines = [
+        "| " + " | ".join(title for _, title in _TABLE_COLUMNS) + " |",
+        "|" + "|".join("---" for _ in _TABLE_COLUMNS) + "|",
+    ]
+    for result in results:
+        lines.append("| " + " | ".join(_cell(result, field) for field, _ in _TABLE_COLUMNS) + " |")
+    return "\n".join(lines)
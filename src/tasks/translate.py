@@ -1,15 +1,28 @@
 from __future__ import annotations
 
+import collections
+import concurrent.futures
+import html
+import io
+import os
+import pathlib
 import typing
 
-from src.translation_services import amazon_translate
-from src.translation_services import amazon_bedrock
+from src.lib import structured_documents
 from src.lib.llm_tools import TranslationAssessment
+from src.lib.logging import get_logger
+from src.translation_services import amazon_bedrock
+from src.translation_services import providers
+from src.translation_services import token_budget
 
 
 if typing.TYPE_CHECKING:  # pragma: nocover
     from mypy_boto3_bedrock_runtime import BedrockRuntimeClient
     from mypy_boto3_translate import TranslateClient
+    from src.translation_services.hedging import HedgingPolicy
+    from src.translation_services.model_tiers import TieredModelPolicy
+    from src.translation_services.providers import TranslationProvider
+    from src.translation_services.token_budget import TokenEstimator
 
 
 class MissingTranslationSource(Exception):
@@ -20,59 +33,410 @@ class MissingContent(Exception):
     """Document content is empty or blank"""
 
 
+DEFAULT_CHUNK_CHARS = 10_000
+DEFAULT_READ_SIZE = 64 * 1024
+
+
 class Document:
     def __init__(
         self,
         content: str,
         language: str,
         translation_source: typing.Optional[Document] = None,
+        mime_type: str = structured_documents.PLAIN_TEXT,
     ):
         self.content = content
         self.language = language
         self.translation_source = translation_source
+        self.mime_type = mime_type
+
+    @property
+    def is_structured(self) -> bool:
+        return self.mime_type != structured_documents.PLAIN_TEXT
 
-    def translate(self, client: TranslateClient, language: str) -> Document:
+    @property
+    def prose(self) -> str:
+        """Translatable text of the document, without markup."""
+        if not self.is_structured:
+            return self.content
+        return structured_documents.StructuredDocument.parse(
+            self.content, self.mime_type
+        ).prose()
+
+    def translate(
+        self, client: TranslateClient | TranslationProvider, language: str
+    ) -> Document:
         if not self.content.strip():
             raise MissingContent("cannot translate a document whose contents are missing or blank")
-        return Document(
-            content=amazon_translate.translate(
-                client,
-                source_text=self.content,
+        provider = translation_provider(client)
+        if self.is_structured:
+            content = translate_structured_content(
+                provider,
+                content=self.content,
+                mime_type=self.mime_type,
                 source_language=self.language,
                 target_language=language,
-            ),
+            )
+        else:
+            content = provider.translate(
+                self.content, source_language=self.language, target_language=language
+            )
+        return Document(
+            content=content,
             language=language,
             translation_source=self,
+            mime_type=self.mime_type,
         )
 
-    def get_assessment(self, client: BedrockRuntimeClient) -> TranslationAssessment:
+    def get_assessment(
+        self,
+        client: BedrockRuntimeClient | TranslationProvider,
+        hedging: typing.Optional[HedgingPolicy] = None,
+        model_policy: typing.Optional[TieredModelPolicy] = None,
+        content_type: typing.Optional[str] = None,
+        token_estimator: typing.Optional[TokenEstimator] = None,
+        on_assessed: typing.Optional[typing.Callable[[TranslationAssessment], None]] = None,
+    ) -> TranslationAssessment:
+        """Assesses the translation with a provider, or with Bedrock given a Bedrock client.
+
+        ``hedging``, ``model_policy`` and ``token_estimator`` only apply to
+        Bedrock clients; providers are configured when they are created.
+        Documents too large for a single request are assessed in chunks, and
+        ``on_assessed`` is called with the assessment of each chunk as soon as
+        it is available.
+        """
         if self.translation_source is None:
             raise MissingTranslationSource(
                 "cannot assess a document that has no translation source"
             )
-        if not self.content.strip():
+        # Only the prose is assessed, so that markup is never suggested for replacement.
+        translated_text = self.prose
+        if not translated_text.strip():
             raise MissingContent("cannot assess a document whose contents are empty or blank")
-        assessment = amazon_bedrock.suggest_translation_refinements(
+        provider = assessment_provider(
             client,
-            translated_text=self.content,
-            source_language=self.translation_source.language,
-            target_language=self.language,
-            with_tool=TranslationAssessment,
+            hedging=hedging,
+            model_policy=model_policy,
+            token_estimator=token_estimator,
         )
-        assessment = typing.cast(TranslationAssessment, assessment)
-        return assessment
+
+        def _assess(text: str) -> TranslationAssessment:
+            assessment = provider.assess(
+                text,
+                source_language=self.translation_source.language,
+                target_language=self.language,
+                content_type=content_type,
+            )
+            if on_assessed is not None:
+                on_assessed(assessment)
+            return assessment
+
+        try:
+            return _assess(translated_text)
+        except token_budget.InputTooLarge as e:
+            if e.max_text_chars < 1:
+                raise
+            get_logger(
+                estimated_input_tokens=e.estimate.input_tokens,
+                chunk_chars=e.max_text_chars,
+            ).info("assessing oversize document in chunks")
+            return merge_assessments(
+                _assess(chunk)
+                for chunk in iter_text_chunks(io.StringIO(translated_text), e.max_text_chars)
+                if chunk.strip()
+            )
 
     def get_improved_content_from_assessment(self, assessment) -> str:
         return apply_assessment_improvements(
-            to_replace=self.content, assessment=assessment
+            to_replace=self.content, assessment=assessment, mime_type=self.mime_type
         )
 
 
+class FileDocument(Document):
+    """A plain text document whose content stays on disk.
+
+    Translating, assessing and applying improvements stream the file in chunks
+    of at most ``chunk_chars`` characters (split at paragraph or line breaks
+    where possible) and write results incrementally, so peak memory depends on
+    the chunk size rather than the document size. Accessing ``content`` reads
+    the whole file into memory.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        language: str,
+        translation_source: typing.Optional[Document] = None,
+        chunk_chars: int = DEFAULT_CHUNK_CHARS,
+        read_size: int = DEFAULT_READ_SIZE,
+    ):
+        # Document.__init__ would store content in memory, which is what this class avoids.
+        self.path = pathlib.Path(path)
+        self.language = language
+        self.translation_source = translation_source
+        self.mime_type = structured_documents.PLAIN_TEXT
+        self.chunk_chars = chunk_chars
+        self.read_size = read_size
+
+    @property
+    def content(self) -> str:  # type: ignore[override]
+        with open(self.path, encoding="utf-8", newline="") as fh:
+            return fh.read()
+
+    def iter_chunks(self) -> typing.Iterator[str]:
+        with open(self.path, encoding="utf-8", newline="") as fh:
+            yield from iter_text_chunks(fh, self.chunk_chars, self.read_size)
+
+    def translate_to_file(
+        self,
+        client: TranslateClient | TranslationProvider,
+        language: str,
+        output_path: str | os.PathLike,
+        max_in_flight: int = 4,
+    ) -> FileDocument:
+        """Translates the document chunk by chunk, writing each translation as it completes.
+
+        Up to ``max_in_flight`` chunks are translated concurrently; results
+        are written in document order.
+        """
+        logger = get_logger(path=str(self.path), target_language=language)
+        provider = translation_provider(client)
+        blank = True
+
+        def _translate(chunk: str) -> str:
+            stripped = chunk.strip()
+            if not stripped:
+                return chunk
+            # translation trims whitespace, so keep the chunk's paragraph breaks as literals
+            start = chunk.index(stripped)
+            translated = provider.translate(
+                stripped, source_language=self.language, target_language=language
+            )
+            return chunk[:start] + translated.strip() + chunk[start + len(stripped) :]
+
+        os.makedirs(pathlib.Path(output_path).parent, exist_ok=True)
+        with (
+            concurrent.futures.ThreadPoolExecutor(max_workers=max_in_flight) as executor,
+            open(output_path, "w", encoding="utf-8", newline="") as out,
+        ):
+            in_flight: collections.deque[concurrent.futures.Future[str]] = collections.deque()
+            for chunk in self.iter_chunks():
+                blank = blank and not chunk.strip()
+                if len(in_flight) >= max_in_flight:
+                    out.write(in_flight.popleft().result())
+                in_flight.append(executor.submit(_translate, chunk))
+            while in_flight:
+                out.write(in_flight.popleft().result())
+
+        if blank:
+            raise MissingContent("cannot translate a document whose contents are missing or blank")
+        logger.info("wrote streamed translation", output_path=str(output_path))
+        return FileDocument(
+            output_path,
+            language=language,
+            translation_source=self,
+            chunk_chars=self.chunk_chars,
+            read_size=self.read_size,
+        )
+
+    def get_assessment(
+        self,
+        client: BedrockRuntimeClient | TranslationProvider,
+        hedging: typing.Optional[HedgingPolicy] = None,
+        model_policy: typing.Optional[TieredModelPolicy] = None,
+        content_type: typing.Optional[str] = None,
+        token_estimator: typing.Optional[TokenEstimator] = None,
+        on_assessed: typing.Optional[typing.Callable[[TranslationAssessment], None]] = None,
+    ) -> TranslationAssessment:
+        """Assesses the document one chunk at a time and merges the results."""
+        if self.translation_source is None:
+            raise MissingTranslationSource(
+                "cannot assess a document that has no translation source"
+            )
+        provider = assessment_provider(
+            client,
+            hedging=hedging,
+            model_policy=model_policy,
+            token_estimator=token_estimator,
+        )
+        return merge_assessments(
+            Document(
+                content=chunk,
+                language=self.language,
+                translation_source=self.translation_source,
+            ).get_assessment(provider, content_type=content_type, on_assessed=on_assessed)
+            for chunk in self.iter_chunks()
+            if chunk.strip()
+        )
+
+    def apply_improvements_to_file(
+        self, assessment: TranslationAssessment, output_path: str | os.PathLike
+    ) -> FileDocument:
+        """Applies improvements chunk by chunk, writing the result incrementally.
+
+        Excerpts are matched within a chunk, so an excerpt spanning a chunk
+        boundary (normally a paragraph break) is not replaced.
+        """
+        os.makedirs(pathlib.Path(output_path).parent, exist_ok=True)
+        with open(output_path, "w", encoding="utf-8", newline="") as out:
+            for chunk in self.iter_chunks():
+                out.write(apply_assessment_improvements(chunk, assessment))
+        return FileDocument(
+            output_path,
+            language=self.language,
+            translation_source=self.translation_source,
+            chunk_chars=self.chunk_chars,
+            read_size=self.read_size,
+        )
+
+
+def iter_text_chunks(
+    fh: typing.TextIO, max_chars: int, read_size: int = DEFAULT_READ_SIZE
+) -> typing.Iterator[str]:
+    """Yields consecutive chunks of at most ``max_chars`` characters from a text file.
+
+    Chunks end at the last paragraph break, line break or whitespace that fits,
+    in that order of preference, so joining them reproduces the file exactly.
+    """
+    if max_chars < 1:
+        raise ValueError("max_chars must be at least 1")
+    buffer = ""
+    while True:
+        data = fh.read(read_size)
+        buffer += data
+        while len(buffer) > max_chars or (buffer and not data):
+            if len(buffer) <= max_chars:
+                split = len(buffer)
+            else:
+                window = buffer[: max_chars + 1]
+                split = next(
+                    (
+                        i + len(sep)
+                        for sep in ("\n\n", "\n", " ")
+                        if (i := window.rfind(sep, 0, max_chars - len(sep) + 1)) > 0
+                    ),
+                    max_chars,
+                )
+            yield buffer[:split]
+            buffer = buffer[split:]
+        if not data:
+            return
+
+
+def translation_provider(
+    client: TranslateClient | TranslationProvider,
+) -> TranslationProvider:
+    """Returns the client itself if it is a provider, otherwise an Amazon provider wrapping it."""
+    if isinstance(client, providers.TranslationProvider):
+        return client
+    return providers.AmazonProvider(translate_client=client)
+
+
+def assessment_provider(
+    client: BedrockRuntimeClient | TranslationProvider,
+    hedging: typing.Optional[HedgingPolicy] = None,
+    model_policy: typing.Optional[TieredModelPolicy] = None,
+    token_estimator: typing.Optional[TokenEstimator] = None,
+) -> TranslationProvider:
+    """Returns the client itself if it is a provider, otherwise an Amazon provider wrapping it."""
+    if isinstance(client, providers.TranslationProvider):
+        if any(o is not None for o in (hedging, model_policy, token_estimator)):
+            raise ValueError(
+                "hedging, model_policy and token_estimator only apply to Bedrock clients"
+            )
+        return client
+    return providers.AmazonProvider(
+        bedrock_client=client,
+        hedging=hedging,
+        model_policy=model_policy,
+        token_estimator=token_estimator,
+    )
+
+
+def merge_assessments(
+    assessments: typing.Iterable[TranslationAssessment],
+) -> TranslationAssessment:
+    """Merges the assessments of a document's chunks, dropping duplicate entries."""
+    merged: TranslationAssessment | None = None
+    for assessment in assessments:
+        merged = (
+            assessment
+            if merged is None
+            else typing.cast(
+                TranslationAssessment,
+                amazon_bedrock.merge_tool_results(TranslationAssessment, merged, assessment),
+            )
+        )
+    if merged is None:
+        raise MissingContent("cannot assess a document whose contents are empty or blank")
+    return merged
+
+
+def translate_structured_content(
+    client: TranslateClient | TranslationProvider,
+    content: str,
+    mime_type: str,
+    source_language: str,
+    target_language: str,
+) -> str:
+    """Translates the unique segments of a structured document and rebuilds it.
+
+    Markup is kept as-is and placeholders are excluded from translation.
+    """
+    logger = get_logger(mime_type=mime_type, target_language=target_language)
+    structured = structured_documents.StructuredDocument.parse(content, mime_type)
+    unique_segments = structured.unique_segments()
+    translated_segments = translation_provider(client).translate_segments(
+        [structured_documents.protect_placeholders(s, mime_type) for s in unique_segments],
+        source_language=source_language,
+        target_language=target_language,
+        mime_type=structured_documents.HTML,
+    )
+    translations: dict[str, str] = {}
+    for segment, translated in zip(unique_segments, translated_segments):
+        translated = structured_documents.restore_placeholders(translated, mime_type)
+        if missing := structured_documents.missing_placeholders(segment, translated, mime_type):
+            logger.warning(
+                "placeholders missing from translated segment",
+                segment=segment,
+                translated_segment=translated,
+                missing_placeholders=missing,
+            )
+        translations[segment] = translated
+    return structured.rebuild(translations)
+
+
 def apply_assessment_improvements(
-    to_replace: str, assessment: TranslationAssessment
+    to_replace: str,
+    assessment: TranslationAssessment,
+    mime_type: str = structured_documents.PLAIN_TEXT,
 ) -> str:
+    if mime_type != structured_documents.PLAIN_TEXT:
+        # Improvements refer to prose, so they are applied segment by segment
+        # to avoid touching markup.
+        structured = structured_documents.StructuredDocument.parse(to_replace, mime_type)
+        return structured.map_segments(
+            lambda segment: _apply_improvements_to_segment(segment, assessment, mime_type)
+        )
     result = to_replace
     for rep in assessment.improvements:
         result = result.replace(rep.excerpt, rep.replacement, -1)
     return result
 
+
+def _apply_improvements_to_segment(
+    segment: str, assessment: TranslationAssessment, mime_type: str
+) -> str:
+    result = segment
+    for rep in assessment.improvements:
+        if mime_type == structured_documents.HTML:
+            # prose is unescaped, so excerpts are matched, and replacements written, escaped
+            excerpt = html.escape(rep.excerpt, quote=False)
+            if excerpt not in result:
+                # markup may leave characters such as & unescaped
+                excerpt = rep.excerpt
+            result = result.replace(excerpt, html.escape(rep.replacement, quote=False), -1)
+        else:
+            result = result.replace(rep.excerpt, rep.replacement, -1)
+    return result
+
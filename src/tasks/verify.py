@@ -0,0 +1,341 @@
+"""Back-translation verification of improved translations.
+
+Applying assessment improvements can change what a translation means: a bad
+replacement is not caught by anything downstream. ``verify_translation``
+back-translates each segment of the improved translation to the source
+language and scores it against the source segment with chrF, a character
+n-gram F-score that needs no model or reference data.
+
+Only segments changed by the improvements are back-translated, concurrently.
+A ``BackTranslator`` passed to ``Document.get_assessment`` starts
+back-translating the segments changed by each assessed chunk while the next
+chunk is still being assessed, and ``verify_translation`` reuses its results.
+Segments scoring below the threshold are flagged. Optionally, the original
+translation of each flagged segment is re-assessed as soon as it is scored,
+while the remaining segments are still being back-translated, and the
+re-assessed version is kept when its back-translation scores higher. When the
+re-assessment suggests nothing, this reverts the segment to the original.
+
+A segment whose back-translation or re-assessment fails keeps its improved
+translation, and the error is recorded in the report.
+"""
+
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import threading
+import typing
+
+import pydantic
+
+from src.lib import structured_documents
+from src.lib.llm_tools import TranslationAssessment
+from src.lib.logging import get_logger
+from src.tasks.translate import (
+    Document,
+    MissingTranslationSource,
+    apply_assessment_improvements,
+    assessment_provider,
+    merge_assessments,
+    translation_provider,
+)
+
+if typing.TYPE_CHECKING:  # pragma: nocover
+    from mypy_boto3_bedrock_runtime import BedrockRuntimeClient
+    from mypy_boto3_translate import TranslateClient
+    from src.translation_services.providers import TranslationProvider
+
+DEFAULT_THRESHOLD = 0.35
+
+
+class SegmentVerification(pydantic.BaseModel):
+    index: int
+    source: str
+    translation: str
+    back_translation: typing.Optional[str]
+    score: typing.Optional[float]
+    flagged: bool
+    reassessed_translation: typing.Optional[str] = None
+    reassessed_score: typing.Optional[float] = None
+    error: typing.Optional[str] = None
+
+
+class VerificationReport(pydantic.BaseModel):
+    threshold: float
+    aligned: bool
+    segments: int
+    unchanged: int
+    verified: int
+    flagged: int
+    reassessed: int
+    replaced: int
+    errors: int
+    results: list[SegmentVerification]
+
+
+def _char_ngrams(text: str, n: int) -> collections.Counter[str]:
+    return collections.Counter(text[i : i + n] for i in range(len(text) - n + 1))
+
+
+def chrf(hypothesis: str, reference: str, max_order: int = 6, beta: float = 2.0) -> float:
+    """Character n-gram F-score of ``hypothesis`` against ``reference``, from 0 to 1.
+
+    Whitespace and case are ignored. ``beta`` weighs recall over precision.
+    """
+    hypothesis = "".join(hypothesis.split()).casefold()
+    reference = "".join(reference.split()).casefold()
+    if not hypothesis and not reference:
+        return 1.0
+    precisions: list[float] = []
+    recalls: list[float] = []
+    for n in range(1, max_order + 1):
+        hypothesis_ngrams = _char_ngrams(hypothesis, n)
+        reference_ngrams = _char_ngrams(reference, n)
+        if not hypothesis_ngrams and not reference_ngrams:
+            break
+        matches = sum((hypothesis_ngrams & reference_ngrams).values())
+        precisions.append(matches / max(sum(hypothesis_ngrams.values()), 1))
+        recalls.append(matches / max(sum(reference_ngrams.values()), 1))
+    precision = sum(precisions) / len(precisions)
+    recall = sum(recalls) / len(recalls)
+    if precision == 0 and recall == 0:
+        return 0.0
+    return (1 + beta**2) * precision * recall / (beta**2 * precision + recall)
+
+
+class BackTranslator:
+    """Back-translates segments of an improved translation on a thread pool.
+
+    Each unique segment is back-translated once. ``submit_changes`` can be
+    given to ``Document.get_assessment`` as ``on_assessed``, so that segments
+    are back-translated as soon as the improvements that change them are
+    known, while the rest of the document is still being assessed.
+    """
+
+    def __init__(
+        self,
+        client: TranslateClient | TranslationProvider,
+        nmt: Document,
+        max_workers: int = 8,
+    ):
+        if nmt.translation_source is None:
+            raise MissingTranslationSource(
+                "cannot verify a document that has no translation source"
+            )
+        self.nmt = nmt
+        self._translator = translation_provider(client)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._futures: dict[str, concurrent.futures.Future[str]] = {}
+        self._assessment: TranslationAssessment | None = None
+        self._lock = threading.Lock()
+
+    def back_translate(self, segment: str) -> str:
+        return self._translator.translate(
+            structured_documents.segment_text(segment, self.nmt.mime_type),
+            source_language=self.nmt.language,
+            target_language=typing.cast(Document, self.nmt.translation_source).language,
+        )
+
+    def submit(self, segment: str) -> concurrent.futures.Future[str]:
+        with self._lock:
+            if segment not in self._futures:
+                self._futures[segment] = self._executor.submit(self.back_translate, segment)
+            return self._futures[segment]
+
+    def submit_changes(self, assessment: TranslationAssessment) -> None:
+        """Back-translates the segments changed by the improvements assessed so far."""
+        with self._lock:
+            self._assessment = (
+                assessment
+                if self._assessment is None
+                else merge_assessments([self._assessment, assessment])
+            )
+            merged = self._assessment
+        mime_type = self.nmt.mime_type
+        nmt_segments = structured_documents.StructuredDocument.parse(
+            self.nmt.content, mime_type
+        ).segments
+        segments = structured_documents.StructuredDocument.parse(
+            apply_assessment_improvements(self.nmt.content, merged, mime_type), mime_type
+        ).segments
+        if len(segments) != len(nmt_segments):
+            # verify_translation compares the whole documents instead
+            return
+        for nmt_segment, segment in zip(nmt_segments, segments):
+            if segment != nmt_segment:
+                self.submit(segment)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def verify_translation(
+    nmt: Document,
+    improved: Document,
+    client: TranslateClient | TranslationProvider,
+    assessor: typing.Optional[BedrockRuntimeClient | TranslationProvider] = None,
+    threshold: float = DEFAULT_THRESHOLD,
+    changed_only: bool = True,
+    max_workers: int = 8,
+    back_translator: typing.Optional[BackTranslator] = None,
+) -> tuple[Document, VerificationReport]:
+    """Back-translates the segments of ``improved`` and scores them against the source.
+
+    ``nmt`` is the translation the improvements were applied to, and its
+    ``translation_source`` is the source document. When ``assessor`` is
+    given, flagged segments of ``nmt`` are re-assessed and the improved
+    segment is replaced when the re-assessed version scores higher.
+
+    Returns the (possibly updated) improved document and the report. When
+    the source and the translation do not have the same number of segments,
+    the whole documents are compared instead, and nothing is re-assessed.
+    Back-translations already submitted to ``back_translator`` are reused.
+    """
+    source = nmt.translation_source
+    if source is None:
+        raise MissingTranslationSource("cannot verify a document that has no translation source")
+    mime_type = improved.mime_type
+    logger = get_logger(source_language=source.language, target_language=improved.language)
+    reassessor = assessment_provider(assessor) if assessor is not None else None
+
+    source_segments = structured_documents.StructuredDocument.parse(
+        source.content, mime_type
+    ).segments
+    nmt_segments = structured_documents.StructuredDocument.parse(nmt.content, mime_type).segments
+    improved_structure = structured_documents.StructuredDocument.parse(improved.content, mime_type)
+    segments = list(improved_structure.segments)
+
+    aligned = len(source_segments) == len(segments)
+    if aligned:
+        texts = [structured_documents.segment_text(s, mime_type) for s in source_segments]
+        if len(nmt_segments) != len(segments):
+            # e.g. a replacement added a paragraph break
+            changed_only, reassessor = False, None
+        candidates = [
+            i for i in range(len(segments)) if not changed_only or nmt_segments[i] != segments[i]
+        ]
+    else:
+        logger.warning(
+            "source and translation segments do not align, verifying the whole document",
+            source_segments=len(source_segments),
+            translation_segments=len(segments),
+        )
+        texts, candidates, reassessor = [source.prose], [0], None
+        segments = [improved.prose]
+        nmt_segments = [nmt.prose]
+
+    owns_back_translator = back_translator is None
+    if back_translator is None:
+        back_translator = BackTranslator(client, nmt, max_workers=max_workers)
+
+    def _reassess(i: int) -> tuple[str, str | None, float | None]:
+        assessment = typing.cast("TranslationProvider", reassessor).assess(
+            structured_documents.segment_text(nmt_segments[i], mime_type),
+            source_language=source.language,
+            target_language=improved.language,
+        )
+        candidate = apply_assessment_improvements(nmt_segments[i], assessment, mime_type)
+        if candidate == segments[i]:
+            return candidate, None, None
+        back_translation = back_translator.back_translate(candidate)
+        return candidate, back_translation, chrf(back_translation, texts[i])
+
+    results: dict[int, SegmentVerification] = {}
+    reassessments: dict[concurrent.futures.Future, int] = {}
+    # identical segments are only back-translated once
+    unique: dict[str, list[int]] = collections.defaultdict(list)
+    for i in candidates:
+        unique[segments[i]].append(i)
+    back_translations = {
+        back_translator.submit(segment): indexes for segment, indexes in unique.items()
+    }
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for future in concurrent.futures.as_completed(back_translations):
+                try:
+                    back_translation = future.result()
+                except Exception as e:
+                    logger.warning(
+                        "back-translation failed, keeping the segment unverified",
+                        segments=back_translations[future],
+                        error=str(e),
+                    )
+                    for i in back_translations[future]:
+                        results[i] = SegmentVerification(
+                            index=i,
+                            source=texts[i],
+                            translation=structured_documents.segment_text(segments[i], mime_type),
+                            back_translation=None,
+                            score=None,
+                            flagged=False,
+                            error=f"back-translation failed: {e}",
+                        )
+                    continue
+                for i in back_translations[future]:
+                    score = chrf(back_translation, texts[i])
+                    flagged = score < threshold
+                    results[i] = SegmentVerification(
+                        index=i,
+                        source=texts[i],
+                        translation=structured_documents.segment_text(segments[i], mime_type),
+                        back_translation=back_translation,
+                        score=score,
+                        flagged=flagged,
+                    )
+                    if flagged and reassessor is not None:
+                        reassessments[executor.submit(_reassess, i)] = i
+            for future, i in reassessments.items():
+                try:
+                    candidate, back_translation, score = future.result()
+                except Exception as e:
+                    logger.warning(
+                        "re-assessment failed, keeping the flagged segment", segment=i, error=str(e)
+                    )
+                    results[i].error = f"re-assessment failed: {e}"
+                    continue
+                results[i].reassessed_translation = structured_documents.segment_text(
+                    candidate, mime_type
+                )
+                results[i].reassessed_score = score
+                if score is not None and score > typing.cast(float, results[i].score):
+                    segments[i] = candidate
+    finally:
+        if owns_back_translator:
+            back_translator.shutdown()
+
+    replaced = sum(
+        1
+        for r in results.values()
+        if r.score is not None and r.reassessed_score is not None and r.reassessed_score > r.score
+    )
+    report = VerificationReport(
+        threshold=threshold,
+        aligned=aligned,
+        segments=len(segments),
+        unchanged=len(segments) - len(candidates),
+        verified=sum(1 for r in results.values() if r.score is not None),
+        flagged=sum(1 for r in results.values() if r.flagged),
+        reassessed=len(reassessments),
+        replaced=replaced,
+        errors=sum(1 for r in results.values() if r.error is not None),
+        results=[results[i] for i in sorted(results)],
+    )
+    logger.info(
+        "verified translation by back-translation",
+        **report.model_dump(exclude={"results"}),
+    )
+    if not replaced:
+        return improved, report
+    content = "".join(
+        part if isinstance(part, str) else segments[part] for part in improved_structure.parts
+    )
+    return (
+        Document(
+            content=content,
+            language=improved.language,
+            translation_source=source,
+            mime_type=mime_type,
+        ),
+        report,
+    )
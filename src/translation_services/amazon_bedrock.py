@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+import json
 import string
+import threading
 import typing
 
 import pydantic
 
-from src.lib.llm_tools import Tool
+from src.lib.llm_tools import Tool, field_max_length, type_adapter
 from src.lib.logging import get_logger
 
 if typing.TYPE_CHECKING:  # pragma: nocover
@@ -14,12 +16,63 @@ if typing.TYPE_CHECKING:  # pragma: nocover
         ConverseRequestTypeDef,
         ConverseResponseTypeDef,
     )
+    from src.translation_services.hedging import HedgingPolicy
+    from src.translation_services.token_budget import TokenEstimator
 
 
 class UnexpectedBedrockResponse(Exception):
     """Bedrock returned unexpected converse response data that could not be handled"""
 
 
+class PartialToolResponse(UnexpectedBedrockResponse):
+    """Tool input was truncated or partially invalid, but its valid parts were salvaged"""
+
+    def __init__(
+        self,
+        message: str,
+        partial: Tool,
+        tool_use_id: str,
+        invalid_items: list[dict[str, typing.Any]],
+        truncated: bool,
+    ):
+        super().__init__(message)
+        self.partial = partial
+        self.tool_use_id = tool_use_id
+        self.invalid_items = invalid_items
+        self.truncated = truncated
+
+
+DEFAULT_MODEL_ID = "anthropic.claude-3-5-haiku-20241022-v1:0"
+
+
+class CountingClient:
+    """Passes ``converse`` calls through to a Bedrock client, counting requests and token usage.
+
+    Every call is counted, including hedged duplicates, escalations and repairs.
+    """
+
+    def __init__(self, client: BedrockRuntimeClient):
+        self._client = client
+        # hedged attempts may run concurrently
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    @property
+    def exceptions(self):
+        return self._client.exceptions
+
+    def converse(self, **kwargs: typing.Any):
+        with self._lock:
+            self.requests += 1
+        response = self._client.converse(**kwargs)
+        usage = response.get("usage", {})
+        with self._lock:
+            self.input_tokens += usage.get("inputTokens", 0)
+            self.output_tokens += usage.get("outputTokens", 0)
+        return response
+
 PROMPT_TPL = string.Template(
     """
 The following text has been translated to "$target_language_name" language.
@@ -32,9 +85,12 @@ government departments, systems, and services.
 
 
 def format_prompt(
-    source_language, target_language, with_tool_name: typing.Optional[str] = ""
+    source_language,
+    target_language,
+    with_tool_name: typing.Optional[str] = "",
+    prompt_template: string.Template = PROMPT_TPL,
 ) -> str:
-    prompt = PROMPT_TPL.substitute(
+    prompt = prompt_template.substitute(
         target_language_name=target_language,
         source_language_name=source_language,
     )
@@ -53,6 +109,13 @@ def suggest_translation_refinements(
     source_language: str,
     target_language: str,
     with_tool: type[Tool],
+    model_id: str = ...,
+    prompt_template: string.Template = ...,
+    hedging: typing.Optional[HedgingPolicy] = ...,
+    salvage: bool = ...,
+    repair: bool = ...,
+    token_estimator: typing.Optional[TokenEstimator] = ...,
+    temperature: float = ...,
 ) -> Tool: ...
 
 
@@ -63,6 +126,13 @@ def suggest_translation_refinements(
     source_language: str,
     target_language: str,
     with_tool: None,
+    model_id: str = ...,
+    prompt_template: string.Template = ...,
+    hedging: typing.Optional[HedgingPolicy] = ...,
+    salvage: bool = ...,
+    repair: bool = ...,
+    token_estimator: typing.Optional[TokenEstimator] = ...,
+    temperature: float = ...,
 ) -> str: ...
 
 def suggest_translation_refinements(
@@ -71,18 +141,27 @@ def suggest_translation_refinements(
     source_language: str,
     target_language: str,
     with_tool: typing.Optional[type[Tool]] = None,
+    model_id: str = DEFAULT_MODEL_ID,
+    prompt_template: string.Template = PROMPT_TPL,
+    hedging: typing.Optional[HedgingPolicy] = None,
+    salvage: bool = True,
+    repair: bool = True,
+    token_estimator: typing.Optional[TokenEstimator] = None,
+    temperature: float = 0.5,
 ) -> Tool | str:
     logger = get_logger(
         machine_readable_request=with_tool is not None,
         machine_readable_tool_type=with_tool,
         machine_readable_tool_name=with_tool.NAME if with_tool else None,
+        model_id=model_id,
+        temperature=temperature,
     )
-    model_id = "anthropic.claude-3-5-haiku-20241022-v1:0"
 
     prompt = format_prompt(
         source_language=source_language,
         target_language=target_language,
         with_tool_name=with_tool.NAME if with_tool else None,
+        prompt_template=prompt_template,
     )
 
     converse_kwargs: ConverseRequestTypeDef = {
@@ -94,7 +173,7 @@ def suggest_translation_refinements(
             },
         ],
         "system": [{"text": prompt}],
-        "inferenceConfig": {"maxTokens": 5000, "temperature": 0.5, "topP": 0.9},
+        "inferenceConfig": {"maxTokens": 5000, "temperature": temperature, "topP": 0.9},
     }
     if with_tool is not None:
         logger.debug(
@@ -105,6 +184,15 @@ def suggest_translation_refinements(
             "toolChoice": {"tool": {"name": with_tool.NAME}},
         }
 
+    overhead_chars = len(prompt)
+    if with_tool is not None:
+        overhead_chars += len(json.dumps(with_tool.as_toolspec()))
+    if token_estimator is not None:
+        # Raises InputTooLarge before anything is sent.
+        estimate = token_estimator.check(translated_text, overhead_chars)
+        converse_kwargs["inferenceConfig"]["maxTokens"] = estimate.max_tokens
+        logger.debug("sized request from token estimate", **estimate.model_dump())
+
     logger.debug(
         "configured additional converse options",
         converse_kwargs=converse_kwargs,
@@ -112,29 +200,61 @@ def suggest_translation_refinements(
         user_prompt=translated_text,
     )
 
-    try:
-        response: ConverseResponseTypeDef = client.converse(**converse_kwargs)
-        logger.debug("received bedrock response", response=response)
-    except client.exceptions.ClientError:
-        logger.exception("error calling bedrock service")
-        raise
+    def _converse_and_parse() -> Tool | str:
+        try:
+            response: ConverseResponseTypeDef = client.converse(**converse_kwargs)
+            logger.debug("received bedrock response", response=response)
+        except client.exceptions.ClientError:
+            logger.exception("error calling bedrock service")
+            raise
 
-    if with_tool:
-        logger.debug("parsing bedrock response with tool")
-        return _parse_conversation_response_with_tool(response, with_tool)
+        if token_estimator is not None and (usage := response.get("usage")):
+            token_estimator.record_usage(
+                translated_text,
+                overhead_chars,
+                input_tokens=usage["inputTokens"],
+                output_tokens=usage["outputTokens"],
+                truncated=response["stopReason"] == "max_tokens",
+            )
 
-    return response["output"]["message"]["content"][0]["text"]
+        if with_tool:
+            logger.debug("parsing bedrock response with tool")
+            try:
+                return _parse_conversation_response_with_tool(response, with_tool, salvage)
+            except PartialToolResponse as e:
+                if not repair:
+                    logger.warning("using salvaged partial tool response without repair")
+                    return e.partial
+                return _repair_partial_tool_response(
+                    client, converse_kwargs, with_tool, e
+                )
+
+        return response["output"]["message"]["content"][0]["text"]
+
+    if hedging is not None:
+        # Parsing happens inside each attempt so that only a valid result can win.
+        return hedging.call(_converse_and_parse)
+    return _converse_and_parse()
 
 
 def _parse_conversation_response_with_tool(
-    response: ConverseResponseTypeDef, tool_type: type[Tool]
+    response: ConverseResponseTypeDef, tool_type: type[Tool], salvage: bool = True
 ) -> Tool:
+    """Parses the tool input of a response.
+
+    With ``salvage``, the valid parts of truncated or partially invalid tool
+    input are raised as a ``PartialToolResponse``. Otherwise a truncated
+    response raises ``UnexpectedBedrockResponse`` and invalid tool input
+    raises ``pydantic.ValidationError``.
+    """
     logger = get_logger(tool_type=tool_type)
 
-    if response["stopReason"] != "tool_use":
+    stop_reason = response["stopReason"]
+    # Truncated responses may still carry a usable (partial) tool input.
+    if stop_reason not in (("tool_use", "max_tokens") if salvage else ("tool_use",)):
         logger.error(
             'response stopReason must be "tool_use" in order to be parsed with tool',
-            response_stop_reason=response["stopReason"],
+            response_stop_reason=stop_reason,
         )
         raise UnexpectedBedrockResponse("invalid stopReason")
 
@@ -151,24 +271,209 @@ def _parse_conversation_response_with_tool(
     message_content = all_message_content[0]
 
     tool_use = message_content.get("toolUse")
+    if not tool_use and stop_reason != "tool_use":
+        logger.error(
+            'response stopReason must be "tool_use" in order to be parsed with tool',
+            response_stop_reason=stop_reason,
+        )
+        raise UnexpectedBedrockResponse("invalid stopReason")
     if not tool_use:
         logger.warn(
             "ignoring bedrock message content due to missing tool use",
             message_content=message_content,
         )
-        raise Exception("unexpected message content without toolUse")
+        raise UnexpectedBedrockResponse("unexpected message content without toolUse")
 
     logger = logger.bind(
         tool_use_name=tool_use["name"], tool_use_id=tool_use["toolUseId"]
     )
+    validation_error: pydantic.ValidationError | None = None
     try:
         data = tool_type.model_validate(tool_use["input"])
-    except pydantic.ValidationError:
-        logger.exception(
+        if stop_reason == "tool_use":
+            return data
+    except pydantic.ValidationError as e:
+        validation_error = e
+
+    if not salvage:
+        logger.error(
             "received malformed input for tool use in bedrock message content",
             actual_input=tool_use["input"],
             expected_schema=tool_type.model_json_schema(),
         )
-        raise
+        raise typing.cast(pydantic.ValidationError, validation_error)
+
+    partial, invalid_items = _salvage_tool_input(tool_type, tool_use["input"])
+    if partial is None:
+        logger.error(
+            "received malformed input for tool use in bedrock message content",
+            actual_input=tool_use["input"],
+            expected_schema=tool_type.model_json_schema(),
+            response_stop_reason=stop_reason,
+        )
+        if validation_error is not None:
+            raise validation_error
+        raise UnexpectedBedrockResponse("truncated tool input could not be salvaged")
+
+    logger.warning(
+        "salvaged valid parts of tool input from bedrock message content",
+        response_stop_reason=stop_reason,
+        num_invalid_items=len(invalid_items),
+    )
+    raise PartialToolResponse(
+        "tool input was truncated or partially invalid",
+        partial=partial,
+        tool_use_id=tool_use["toolUseId"],
+        invalid_items=invalid_items,
+        truncated=stop_reason == "max_tokens",
+    )
+
+
+def _list_item_type(field: pydantic.fields.FieldInfo) -> typing.Any | None:
+    if typing.get_origin(field.annotation) is list:
+        return typing.get_args(field.annotation)[0]
+    return None
+
+
+def _salvage_tool_input(
+    tool_type: type[Tool], tool_input: typing.Any
+) -> tuple[Tool | None, list[dict[str, typing.Any]]]:
+    """Keeps every individually valid entry of the tool's list fields.
+
+    Returns the salvaged tool (or ``None`` when the remaining input is still
+    invalid) and a description of each discarded list entry.
+    """
+    if not isinstance(tool_input, dict):
+        return None, []
+
+    salvaged: dict[str, typing.Any] = {}
+    invalid_items: list[dict[str, typing.Any]] = []
+    for name, field in tool_type.model_fields.items():
+        item_type = _list_item_type(field)
+        value = tool_input.get(name)
+        if item_type is None or not isinstance(value, list):
+            if name in tool_input:
+                salvaged[name] = value
+            elif item_type is not None:
+                # e.g. the field was cut off before it started
+                salvaged[name] = []
+            continue
+        adapter = type_adapter(item_type)
+        kept = []
+        for item in value:
+            try:
+                kept.append(adapter.validate_python(item))
+            except pydantic.ValidationError as e:
+                invalid_items.append(
+                    {"field": name, "item": item, "errors": e.errors(include_url=False)}
+                )
+        salvaged[name] = kept[: field_max_length(field)]
+
+    try:
+        return tool_type.model_validate(salvaged), invalid_items
+    except pydantic.ValidationError:
+        return None, invalid_items
+
+
+def _dedupe_key(item: typing.Any) -> str:
+    if isinstance(item, pydantic.BaseModel):
+        return item.model_dump_json()
+    return json.dumps(item, sort_keys=True, default=str)
+
+
+def merge_tool_results(tool_type: type[Tool], first: Tool, second: Tool) -> Tool:
+    """Combines the list fields of two tool results, dropping duplicate entries."""
+    merged = {name: getattr(first, name) for name in tool_type.model_fields}
+    for name, field in tool_type.model_fields.items():
+        if _list_item_type(field) is None:
+            continue
+        combined = list(getattr(first, name))
+        seen = {_dedupe_key(i) for i in combined}
+        for item in getattr(second, name):
+            if (key := _dedupe_key(item)) not in seen:
+                seen.add(key)
+                combined.append(item)
+        merged[name] = combined[: field_max_length(field)]
+    return tool_type.model_validate(merged)
+
+
+def _repair_partial_tool_response(
+    client: BedrockRuntimeClient,
+    converse_kwargs: ConverseRequestTypeDef,
+    tool_type: type[Tool],
+    partial_response: PartialToolResponse,
+) -> Tool:
+    """Asks the model for only the missing or invalid parts of a partial tool response.
+
+    The salvaged input is replayed as the assistant's tool use, followed by an
+    error tool result describing what is missing, so the model only has to
+    generate the remainder. Falls back to the salvaged result if the repair fails.
+    """
+    logger = get_logger(
+        tool_type=tool_type,
+        truncated=partial_response.truncated,
+        num_invalid_items=len(partial_response.invalid_items),
+    )
+    partial = partial_response.partial
+
+    feedback = []
+    if partial_response.truncated:
+        feedback.append(
+            "Your previous response was cut off; the input shown above is what was received. "
+            f"Call the {tool_type.NAME} tool again with only the remaining entries "
+            "that are not already listed."
+        )
+    if partial_response.invalid_items:
+        invalid = [
+            {"field": i["field"], "item": i["item"], "errors": [e["msg"] for e in i["errors"]]}
+            for i in partial_response.invalid_items
+        ]
+        feedback.append(
+            "The following entries were invalid and were discarded. "
+            f"Call the {tool_type.NAME} tool again with corrected versions of only these entries: "
+            + json.dumps(invalid, default=str)
+        )
+
+    repair_kwargs: ConverseRequestTypeDef = {
+        **converse_kwargs,
+        "messages": [
+            *converse_kwargs["messages"],
+            {
+                "role": "assistant",
+                "content": [
+                    {
+                        "toolUse": {
+                            "toolUseId": partial_response.tool_use_id,
+                            "name": tool_type.NAME,
+                            "input": partial.model_dump(mode="json"),
+                        }
+                    }
+                ],
+            },
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "toolResult": {
+                            "toolUseId": partial_response.tool_use_id,
+                            "content": [{"text": " ".join(feedback)}],
+                            "status": "error",
+                        }
+                    }
+                ],
+            },
+        ],
+    }
+
+    logger.info("requesting repair of partial tool response")
+    try:
+        response: ConverseResponseTypeDef = client.converse(**repair_kwargs)
+        try:
+            repaired = _parse_conversation_response_with_tool(response, tool_type)
+        except PartialToolResponse as e:
+            repaired = e.partial
+    except Exception:
+        logger.exception("repair of partial tool response failed; using salvaged result")
+        return partial
 
-    return data
+    return merge_tool_results(tool_type, partial, repaired)
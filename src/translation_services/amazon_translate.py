@@ -28,11 +28,12 @@ def translate(
     formal: bool = True,
     mask_profanity: bool = False,
     brevity: bool = False,
+    content_type: str = "text/plain",
 ) -> str:
     request_options: TranslateDocumentRequestTypeDef = {
         "Document": {
             "Content": source_text.encode("utf-8"),
-            "ContentType": "text/plain",
+            "ContentType": content_type,
         },
         "SourceLanguageCode": source_language,
         "TargetLanguageCode": target_language,
@@ -0,0 +1,283 @@
+"""Routing of Bedrock ``converse`` calls across several regions and/or inference profiles.
+
+``BedrockRegionRouter`` exposes the subset of the Bedrock Runtime client
+interface used by ``amazon_bedrock`` (``converse`` and ``exceptions``), so it can
+be passed anywhere a client is expected. Each call goes to the endpoint with the
+most remaining capacity relative to its observed latency. Endpoints that return
+throttling or server errors are drained for a back-off period, and the call is
+retried on another endpoint.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import typing
+
+import boto3
+import botocore.exceptions
+import pydantic
+
+from src.lib.logging import get_logger
+
+if typing.TYPE_CHECKING:  # pragma: nocover
+    from mypy_boto3_bedrock_runtime import BedrockRuntimeClient
+
+
+RETRYABLE_ERROR_CODES = frozenset(
+    {
+        "ThrottlingException",
+        "TooManyRequestsException",
+        "ServiceQuotaExceededException",
+        "ServiceUnavailableException",
+        "ModelNotReadyException",
+        "InternalServerException",
+    }
+)
+
+
+class NoAvailableRegion(Exception):
+    """Every configured Bedrock region failed or is unavailable"""
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """Whether an error indicates throttling or a transient server-side failure."""
+    if isinstance(
+        error,
+        (
+            botocore.exceptions.EndpointConnectionError,
+            botocore.exceptions.ConnectTimeoutError,
+            botocore.exceptions.ReadTimeoutError,
+        ),
+    ):
+        return True
+    if isinstance(error, botocore.exceptions.ClientError):
+        if error.response.get("Error", {}).get("Code") in RETRYABLE_ERROR_CODES:
+            return True
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return status == 429 or status >= 500
+    return False
+
+
+def profile_model_id(profile_id: str) -> str:
+    """Model ID of a cross-region inference profile ID, e.g. ``us.anthropic.x`` -> ``anthropic.x``."""
+    return profile_id.partition(".")[2] or profile_id
+
+
+class RegionStats(pydantic.BaseModel):
+    name: str
+    requests: int
+    successes: int
+    retryable_errors: int
+    other_errors: int
+    in_flight: int
+    max_concurrency: int
+    request_share: float
+    utilisation: float
+    latency_ewma_s: typing.Optional[float]
+    drained_for_s: float
+
+
+class RegionEndpoint:
+    """A Bedrock Runtime client for one region, optionally pinned to an inference profile.
+
+    :param name: Label used in logs and stats, usually the region name.
+    :param client: Bedrock Runtime client (or a stub with the same interface).
+    :param max_concurrency: Number of concurrent requests the endpoint's quota supports.
+    :param model_ids: Maps requested model IDs to the ID used in this region,
+        e.g. a regional inference profile ID. Requests for other models are sent
+        with their ``modelId`` unchanged.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        client: BedrockRuntimeClient,
+        max_concurrency: int = 8,
+        model_ids: typing.Optional[typing.Mapping[str, str]] = None,
+    ):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.name = name
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.model_ids = dict(model_ids or {})
+        self.in_flight = 0
+        self.requests = 0
+        self.successes = 0
+        self.retryable_errors = 0
+        self.other_errors = 0
+        self.consecutive_failures = 0
+        self.drained_until = 0.0
+        self.latency_ewma_s: float | None = None
+        self.busy_s = 0.0
+
+
+class BedrockRegionRouter:
+    """Spreads ``converse`` calls across region endpoints by capacity and latency.
+
+    :param endpoints: Endpoints to route between.
+    :param drain_s: Base time an endpoint is drained after a retryable error.
+        Consecutive failures double the drain time, up to ``max_drain_s``.
+    :param latency_alpha: Smoothing factor of the per-endpoint latency EWMA.
+    :param clock: Monotonic clock, replaceable in tests.
+    """
+
+    def __init__(
+        self,
+        endpoints: typing.Sequence[RegionEndpoint],
+        drain_s: float = 10.0,
+        max_drain_s: float = 120.0,
+        latency_alpha: float = 0.2,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ):
+        if not endpoints:
+            raise ValueError("at least one endpoint is required")
+        self.endpoints = list(endpoints)
+        self.drain_s = drain_s
+        self.max_drain_s = max_drain_s
+        self.latency_alpha = latency_alpha
+        self._clock = clock
+        self._started = clock()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_specs(
+        cls,
+        specs: typing.Iterable[str],
+        session: typing.Optional[boto3.session.Session] = None,
+        max_concurrency: int = 8,
+        **kwargs: typing.Any,
+    ) -> BedrockRegionRouter:
+        """Builds a router from ``REGION`` or ``REGION=PROFILE_ID[,PROFILE_ID...]`` strings.
+
+        Requests for the model of each inference profile are sent to that
+        profile in the region, see ``profile_model_id``.
+        """
+        session = session or boto3.session.Session()
+        endpoints = []
+        for spec in specs:
+            region, _, profile_ids = spec.partition("=")
+            endpoints.append(
+                RegionEndpoint(
+                    name=spec,
+                    client=session.client("bedrock-runtime", region_name=region.strip()),
+                    max_concurrency=max_concurrency,
+                    model_ids={
+                        profile_model_id(p.strip()): p.strip()
+                        for p in profile_ids.split(",")
+                        if p.strip()
+                    },
+                )
+            )
+        return cls(endpoints, **kwargs)
+
+    @property
+    def exceptions(self):
+        return self.endpoints[0].client.exceptions
+
+    def _score(self, endpoint: RegionEndpoint, default_latency: float) -> float:
+        # Expected wait grows with how full the endpoint is and how slow it has been.
+        load = (endpoint.in_flight + 1) / endpoint.max_concurrency
+        latency = endpoint.latency_ewma_s or default_latency
+        return load * latency
+
+    def _acquire(self, exclude: set[str]) -> RegionEndpoint | None:
+        with self._lock:
+            now = self._clock()
+            candidates = [e for e in self.endpoints if e.name not in exclude]
+            if not candidates:
+                return None
+            healthy = [e for e in candidates if e.drained_until <= now]
+            if healthy:
+                known = [e.latency_ewma_s for e in healthy if e.latency_ewma_s]
+                default_latency = min(known) if known else 1.0
+                endpoint = min(healthy, key=lambda e: self._score(e, default_latency))
+            else:
+                # Everything is drained: try whichever endpoint recovers first.
+                endpoint = min(candidates, key=lambda e: e.drained_until)
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def _release(
+        self, endpoint: RegionEndpoint, elapsed: float, error: BaseException | None
+    ) -> None:
+        with self._lock:
+            endpoint.in_flight -= 1
+            endpoint.busy_s += elapsed
+            if error is None:
+                endpoint.successes += 1
+                endpoint.consecutive_failures = 0
+                endpoint.latency_ewma_s = (
+                    elapsed
+                    if endpoint.latency_ewma_s is None
+                    else self.latency_alpha * elapsed
+                    + (1 - self.latency_alpha) * endpoint.latency_ewma_s
+                )
+            elif is_retryable_error(error):
+                endpoint.retryable_errors += 1
+                endpoint.consecutive_failures += 1
+                drain = min(
+                    self.drain_s * 2 ** (endpoint.consecutive_failures - 1),
+                    self.max_drain_s,
+                )
+                endpoint.drained_until = self._clock() + drain
+            else:
+                endpoint.other_errors += 1
+
+    @property
+    def requests(self) -> int:
+        """Requests sent to any endpoint, counting each retry."""
+        with self._lock:
+            return sum(e.requests for e in self.endpoints)
+
+    def converse(self, **kwargs: typing.Any):
+        logger = get_logger(service="bedrock region router")
+        tried: set[str] = set()
+        last_error: BaseException | None = None
+        while (endpoint := self._acquire(exclude=tried)) is not None:
+            tried.add(endpoint.name)
+            request = kwargs
+            if (model_id := endpoint.model_ids.get(kwargs.get("modelId", ""))) is not None:
+                request = dict(kwargs, modelId=model_id)
+            start = self._clock()
+            try:
+                response = endpoint.client.converse(**request)
+            except Exception as e:
+                self._release(endpoint, self._clock() - start, e)
+                if not is_retryable_error(e):
+                    raise
+                logger.warning(
+                    "draining bedrock region after retryable error",
+                    region=endpoint.name,
+                    error=str(e),
+                )
+                last_error = e
+                continue
+            self._release(endpoint, self._clock() - start, None)
+            return response
+
+        raise NoAvailableRegion("all bedrock regions failed") from last_error
+
+    def stats(self) -> list[RegionStats]:
+        with self._lock:
+            now = self._clock()
+            elapsed = max(now - self._started, 1e-9)
+            total_requests = sum(e.requests for e in self.endpoints)
+            return [
+                RegionStats(
+                    name=e.name,
+                    requests=e.requests,
+                    successes=e.successes,
+                    retryable_errors=e.retryable_errors,
+                    other_errors=e.other_errors,
+                    in_flight=e.in_flight,
+                    max_concurrency=e.max_concurrency,
+                    request_share=e.requests / total_requests if total_requests else 0.0,
+                    utilisation=min(e.busy_s / (elapsed * e.max_concurrency), 1.0),
+                    latency_ewma_s=e.latency_ewma_s,
+                    drained_for_s=max(e.drained_until - now, 0.0),
+                )
+                for e in self.endpoints
+            ]
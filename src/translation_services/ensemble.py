@@ -0,0 +1,258 @@
+"""Ensemble assessment with improvement voting.
+
+A single sampled assessment is noisy: assessing the same translation twice
+suggests different excerpts. ``EnsembleProvider`` runs several assessments of
+a document concurrently (e.g. across models or temperatures), so that the
+latency stays close to that of one request, and merges them:
+
+- improvements from different runs whose excerpts cover overlapping spans of
+  the translated text are treated as the same suggestion;
+- suggestions made by fewer than ``min_votes`` runs are dropped;
+- each kept suggestion uses the most common replacement, the majority
+  severity, and the mean confidence of the runs that made it.
+"""
+
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import dataclasses
+import statistics
+import typing
+
+import pydantic
+
+from src.lib.llm_tools import TranslationAssessment, TranslationImprovement, field_max_length
+from src.lib.logging import get_logger
+from src.translation_services.providers import ProviderError, TranslationProvider
+
+# Improvements are the same suggestion when their excerpts overlap by at
+# least this fraction of the shorter excerpt.
+MIN_SPAN_OVERLAP = 0.5
+
+
+class EnsembleStats(pydantic.BaseModel):
+    assessments: int
+    runs: int
+    failed_runs: int
+    late_runs: int
+    candidate_improvements: int
+    kept_improvements: int
+
+
+@dataclasses.dataclass
+class _Vote:
+    run: int
+    improvement: TranslationImprovement
+    span: tuple[int, int] | None
+
+
+def _span(text: str, excerpt: str) -> tuple[int, int] | None:
+    start = text.find(excerpt)
+    return (start, start + len(excerpt)) if start >= 0 and excerpt else None
+
+
+def _same_suggestion(a: _Vote, b: _Vote) -> bool:
+    if a.span is None or b.span is None:
+        return a.improvement.excerpt.strip() == b.improvement.excerpt.strip()
+    overlap = min(a.span[1], b.span[1]) - max(a.span[0], b.span[0])
+    shorter = min(a.span[1] - a.span[0], b.span[1] - b.span[0])
+    return overlap > 0 and overlap >= MIN_SPAN_OVERLAP * shorter
+
+
+def vote_improvements(
+    translated_text: str,
+    assessments: typing.Sequence[TranslationAssessment],
+    min_votes: int,
+) -> list[TranslationImprovement]:
+    """Merges the improvements of several assessments of ``translated_text``.
+
+    Each assessment votes at most once per suggestion. Suggestions with fewer
+    than ``min_votes`` votes are dropped; kept suggestions are returned in
+    the order they appear in the text.
+    """
+    clusters: list[list[_Vote]] = []
+    for run, assessment in enumerate(assessments):
+        for improvement in assessment.improvements:
+            vote = _Vote(run, improvement, _span(translated_text, improvement.excerpt))
+            cluster = next(
+                (
+                    c
+                    for c in clusters
+                    if all(v.run != run for v in c) and any(_same_suggestion(vote, v) for v in c)
+                ),
+                None,
+            )
+            if cluster is None:
+                clusters.append([vote])
+            else:
+                cluster.append(vote)
+
+    merged: list[tuple[int, TranslationImprovement]] = []
+    for cluster in clusters:
+        if len(cluster) < min_votes:
+            continue
+        counts = collections.Counter(
+            (v.improvement.excerpt, v.improvement.replacement) for v in cluster
+        )
+        # the most common suggestion, ties going to the most confident run
+        representative = max(
+            cluster,
+            key=lambda v: (
+                counts[(v.improvement.excerpt, v.improvement.replacement)],
+                v.improvement.confidence,
+            ),
+        )
+        majors = sum(1 for v in cluster if v.improvement.severity == "MAJOR")
+        merged.append(
+            (
+                representative.span[0] if representative.span else len(translated_text),
+                representative.improvement.model_copy(
+                    update={
+                        "severity": "MAJOR" if majors * 2 >= len(cluster) else "MINOR",
+                        "confidence": round(
+                            statistics.mean(v.improvement.confidence for v in cluster)
+                        ),
+                    }
+                ),
+            )
+        )
+    return [improvement for _, improvement in sorted(merged, key=lambda m: m[0])]
+
+
+class EnsembleProvider(TranslationProvider):
+    """Assesses with several providers concurrently and votes on their improvements.
+
+    Translation is delegated to ``translator``.
+
+    :param members: Providers that each assess the document once, e.g.
+        ``AmazonProvider``s with different models or temperatures.
+    :param translator: Provider used for translation. Defaults to the first member.
+    :param min_votes: Runs that must agree on an improvement for it to be kept.
+        Defaults to a majority of the runs that returned an assessment. When
+        fewer runs than ``min_votes`` return an assessment, assessing fails.
+    :param deadline_s: Seconds to wait for the runs of an assessment. Runs that
+        have not finished by then are left out of the vote.
+    :param max_workers: Size of the thread pool that runs assessments.
+    """
+
+    def __init__(
+        self,
+        members: typing.Sequence[TranslationProvider],
+        translator: typing.Optional[TranslationProvider] = None,
+        min_votes: typing.Optional[int] = None,
+        deadline_s: float = 120,
+        max_workers: int = 32,
+        name: str = "ensemble",
+    ):
+        if not members:
+            raise ValueError("at least one member is required")
+        if min_votes is not None and not 1 <= min_votes <= len(members):
+            raise ValueError("min_votes must be between 1 and the number of members")
+        super().__init__(name)
+        self.members = list(members)
+        self.translator = translator or self.members[0]
+        self.min_votes = min_votes
+        self.deadline_s = deadline_s
+        self._assessments = 0
+        self._runs = 0
+        self._failed_runs = 0
+        self._late_runs = 0
+        self._candidates = 0
+        self._kept = 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ensemble"
+        )
+
+    def _translate(
+        self, text: str, source_language: str, target_language: str, mime_type: str
+    ) -> str:
+        return self.translator.translate(text, source_language, target_language, mime_type)
+
+    def _assess(
+        self,
+        translated_text: str,
+        source_language: str,
+        target_language: str,
+        content_type: typing.Optional[str],
+    ) -> TranslationAssessment:
+        logger = get_logger(members=[m.name for m in self.members])
+        futures = [
+            self._executor.submit(
+                m.assess, translated_text, source_language, target_language, content_type
+            )
+            for m in self.members
+        ]
+        done, late = concurrent.futures.wait(futures, timeout=self.deadline_s)
+        for future in late:
+            future.cancel()
+
+        assessments: list[TranslationAssessment] = []
+        errors: list[BaseException] = []
+        # keep member order, so that votes are deterministic
+        for future in futures:
+            if future not in done:
+                continue
+            if (error := future.exception()) is not None:
+                errors.append(error)
+            else:
+                assessments.append(future.result())
+        with self._lock:
+            self._assessments += 1
+            self._runs += len(futures)
+            self._failed_runs += len(errors)
+            self._late_runs += len(late)
+        if not assessments:
+            if errors and not late:
+                raise errors[0]
+            raise ProviderError(
+                f"no ensemble run returned an assessment ({len(errors)} failed, {len(late)} late)"
+            )
+        if errors or late:
+            logger.warning(
+                "voting without some ensemble runs",
+                failed=[str(e) for e in errors],
+                late=len(late),
+            )
+
+        if self.min_votes is not None and len(assessments) < self.min_votes:
+            raise ProviderError(
+                f"{len(assessments)} ensemble runs returned an assessment, fewer than the "
+                f"{self.min_votes} votes required ({len(errors)} failed, {len(late)} late)"
+            )
+        min_votes = self.min_votes or len(assessments) // 2 + 1
+        improvements = vote_improvements(translated_text, assessments, min_votes)
+        candidates = sum(len(a.improvements) for a in assessments)
+        with self._lock:
+            self._candidates += candidates
+            self._kept += len(improvements)
+        logger.debug(
+            "merged ensemble assessments",
+            runs=len(assessments),
+            min_votes=min_votes,
+            candidates=candidates,
+            kept=len(improvements),
+        )
+        quality_assessments = list(
+            dict.fromkeys(q for a in assessments for q in a.quality_assessments)
+        )
+        return TranslationAssessment(
+            quality_assessments=quality_assessments[
+                : field_max_length(TranslationAssessment.model_fields["quality_assessments"])
+            ],
+            improvements=improvements,
+        )
+
+    def ensemble_stats(self) -> EnsembleStats:
+        with self._lock:
+            return EnsembleStats(
+                assessments=self._assessments,
+                runs=self._runs,
+                failed_runs=self._failed_runs,
+                late_runs=self._late_runs,
+                candidate_improvements=self._candidates,
+                kept_improvements=self._kept,
+            )
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
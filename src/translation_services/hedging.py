@@ -0,0 +1,177 @@
+"""Hedged requests for cutting tail latency on slow service calls.
+
+A hedged call starts a primary attempt and, if it has not finished after the
+configured latency percentile (measured online from recent successful attempts), starts a
+duplicate attempt. Whichever attempt first returns a valid result wins; the
+other is cancelled if it has not started yet and otherwise ignored. The number
+of duplicate attempts is capped at a fraction of all calls.
+"""
+
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import threading
+import time
+import typing
+
+import pydantic
+
+from src.lib.logging import get_logger
+from src.lib.stats import percentile
+
+T = typing.TypeVar("T")
+
+
+class HedgingStats(pydantic.BaseModel):
+    requests: int
+    hedges_sent: int
+    hedge_wins: int
+    extra_request_ratio: float
+    hedge_delay_s: typing.Optional[float]
+    primary_p50_s: typing.Optional[float]
+    primary_p99_s: typing.Optional[float]
+    effective_p50_s: typing.Optional[float]
+    effective_p99_s: typing.Optional[float]
+    p99_improvement_s: typing.Optional[float]
+
+
+class HedgingPolicy:
+    """Opt-in hedging policy that can be shared by concurrent callers.
+
+    :param percentile: Latency percentile (0-100) of recent attempts after
+        which a duplicate attempt is sent.
+    :param budget: Maximum ratio of duplicate attempts to calls, e.g. ``0.1``
+        allows at most one hedge per ten calls.
+    :param min_samples: Number of observed latencies required before hedging
+        starts; until then calls are never hedged.
+    :param window: Number of recent latencies used to estimate the percentile.
+    :param max_workers: Size of the thread pool that runs attempts.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95,
+        budget: float = 0.1,
+        min_samples: int = 20,
+        window: int = 500,
+        max_workers: int = 32,
+    ):
+        if not 0 < percentile < 100:
+            raise ValueError("percentile must be between 0 and 100")
+        if budget < 0:
+            raise ValueError("budget must not be negative")
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._attempt_latencies: collections.deque[float] = collections.deque(
+            maxlen=window
+        )
+        self._primary_latencies: collections.deque[float] = collections.deque(
+            maxlen=window
+        )
+        self._effective_latencies: collections.deque[float] = collections.deque(
+            maxlen=window
+        )
+        self._requests = 0
+        self._hedges_sent = 0
+        self._hedge_wins = 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="hedging"
+        )
+
+    def hedge_delay(self) -> float | None:
+        """Returns the current hedge delay in seconds, or ``None`` while warming up."""
+        with self._lock:
+            if len(self._attempt_latencies) < self.min_samples:
+                return None
+            return percentile(self._attempt_latencies, self.percentile)
+
+    def _take_budget(self) -> bool:
+        with self._lock:
+            if self._hedges_sent + 1 > self.budget * self._requests:
+                return False
+            self._hedges_sent += 1
+            return True
+
+    def _attempt(self, fn: typing.Callable[[], T], is_primary: bool) -> T:
+        start = time.perf_counter()
+        result = fn()
+        # Only successful attempts are timed: fast errors would lower the
+        # hedge delay and cause more hedging.
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._attempt_latencies.append(elapsed)
+            if is_primary:
+                self._primary_latencies.append(elapsed)
+        return result
+
+    def call(self, fn: typing.Callable[[], T]) -> T:
+        """Calls ``fn`` (possibly twice, concurrently) and returns the first valid result.
+
+        An attempt is valid when ``fn`` returns without raising. When every
+        attempt raises, the first exception is re-raised.
+        """
+        logger = get_logger(hedging_percentile=self.percentile)
+        start = time.perf_counter()
+        with self._lock:
+            self._requests += 1
+        delay = self.hedge_delay()
+
+        primary = self._executor.submit(self._attempt, fn, True)
+        pending: set[concurrent.futures.Future[T]] = {primary}
+        if delay is not None:
+            done, _ = concurrent.futures.wait(pending, timeout=delay)
+            if not done and self._take_budget():
+                logger.debug("sending hedged request", hedge_delay_s=delay)
+                pending.add(self._executor.submit(self._attempt, fn, False))
+
+        first_error: BaseException | None = None
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                if (error := future.exception()) is not None:
+                    logger.debug("hedging attempt failed", error=str(error))
+                    first_error = first_error or error
+                    continue
+                for other in pending:
+                    other.cancel()
+                with self._lock:
+                    self._effective_latencies.append(time.perf_counter() - start)
+                    if future is not primary:
+                        self._hedge_wins += 1
+                return future.result()
+
+        assert first_error is not None
+        raise first_error
+
+    def stats(self) -> HedgingStats:
+        with self._lock:
+            primary_p99 = percentile(self._primary_latencies, 99)
+            effective_p99 = percentile(self._effective_latencies, 99)
+            requests = self._requests
+            hedges_sent = self._hedges_sent
+            stats = HedgingStats(
+                requests=requests,
+                hedges_sent=hedges_sent,
+                hedge_wins=self._hedge_wins,
+                extra_request_ratio=hedges_sent / requests if requests else 0.0,
+                hedge_delay_s=None,
+                primary_p50_s=percentile(self._primary_latencies, 50),
+                primary_p99_s=primary_p99,
+                effective_p50_s=percentile(self._effective_latencies, 50),
+                effective_p99_s=effective_p99,
+                p99_improvement_s=(
+                    primary_p99 - effective_p99
+                    if primary_p99 is not None and effective_p99 is not None
+                    else None
+                ),
+            )
+        stats.hedge_delay_s = self.hedge_delay()
+        return stats
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
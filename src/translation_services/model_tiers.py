@@ -0,0 +1,231 @@
+"""Tiered model routing for translation assessments.
+
+Documents are first assessed with a fast, inexpensive model. The assessment is
+repeated with a stronger model only when the first pass shows warning signs
+(MAJOR severities, low confidence, truncated or malformed output), or when the
+document's content type or length calls for the stronger model up front.
+"""
+
+from __future__ import annotations
+
+import collections
+import threading
+import time
+import typing
+
+import pydantic
+
+from src.lib.llm_tools import TranslationAssessment
+from src.lib.logging import get_logger
+from src.lib.stats import mean, percentile
+from src.translation_services import amazon_bedrock
+
+if typing.TYPE_CHECKING:  # pragma: nocover
+    from mypy_boto3_bedrock_runtime import BedrockRuntimeClient
+    from src.translation_services.hedging import HedgingPolicy
+    from src.translation_services.token_budget import TokenEstimator
+
+
+DEFAULT_ESCALATION_MODEL_ID = "anthropic.claude-3-5-sonnet-20241022-v2:0"
+
+FIRST_PASS = "first_pass"
+ESCALATION = "escalation"
+
+
+class TierUsage(pydantic.BaseModel):
+    model_id: str
+    assessments: int
+    errors: int
+    latency_mean_s: typing.Optional[float]
+    latency_p95_s: typing.Optional[float]
+    input_tokens: int
+    output_tokens: int
+
+
+class TierStats(pydantic.BaseModel):
+    documents: int
+    first_pass_only: int
+    escalated: int
+    direct_to_escalation_model: int
+    escalation_reasons: dict[str, int]
+    tiers: dict[str, TierUsage]
+
+
+class TieredModelPolicy:
+    """Decides which model assesses a document, and when to escalate.
+
+    :param first_pass_model_id: Fast, inexpensive model used first.
+    :param escalation_model_id: Stronger model used on escalation.
+    :param min_confidence: Escalate when any improvement has a lower confidence score.
+    :param escalate_on_major: Escalate when any improvement has MAJOR severity.
+    :param max_first_pass_chars: Documents longer than this go straight to the escalation model.
+    :param escalate_content_types: Content types (case-insensitive) that always
+        use the escalation model, e.g. legal or eligibility notices.
+    """
+
+    def __init__(
+        self,
+        first_pass_model_id: str = amazon_bedrock.DEFAULT_MODEL_ID,
+        escalation_model_id: str = DEFAULT_ESCALATION_MODEL_ID,
+        min_confidence: int = 6,
+        escalate_on_major: bool = True,
+        max_first_pass_chars: typing.Optional[int] = 12000,
+        escalate_content_types: typing.Iterable[str] = (),
+    ):
+        self.first_pass_model_id = first_pass_model_id
+        self.escalation_model_id = escalation_model_id
+        self.min_confidence = min_confidence
+        self.escalate_on_major = escalate_on_major
+        self.max_first_pass_chars = max_first_pass_chars
+        self.escalate_content_types = {c.lower() for c in escalate_content_types}
+        self._lock = threading.Lock()
+        self._documents = 0
+        self._escalation_reasons: collections.Counter[str] = collections.Counter()
+        self._direct = 0
+        self._latencies: dict[str, list[float]] = collections.defaultdict(list)
+        self._errors: collections.Counter[str] = collections.Counter()
+        self._input_tokens: collections.Counter[str] = collections.Counter()
+        self._output_tokens: collections.Counter[str] = collections.Counter()
+
+    def upfront_escalation_reason(
+        self, translated_text: str, content_type: typing.Optional[str] = None
+    ) -> str | None:
+        """Returns why a document should skip the first pass, if it should."""
+        if content_type and content_type.lower() in self.escalate_content_types:
+            return "content_type"
+        if (
+            self.max_first_pass_chars is not None
+            and len(translated_text) > self.max_first_pass_chars
+        ):
+            return "document_length"
+        return None
+
+    def escalation_reason(self, assessment: TranslationAssessment) -> str | None:
+        """Returns why a first-pass assessment should be escalated, if it should."""
+        if self.escalate_on_major and any(
+            i.severity == "MAJOR" for i in assessment.improvements
+        ):
+            return "major_severity"
+        if any(i.confidence < self.min_confidence for i in assessment.improvements):
+            return "low_confidence"
+        return None
+
+    def record_outcome(self, reason: str | None, direct: bool = False) -> None:
+        """Counts an assessed document and the reason it was escalated, if any."""
+        with self._lock:
+            self._documents += 1
+            if reason is not None:
+                self._escalation_reasons[reason] += 1
+            if direct:
+                self._direct += 1
+
+    def record_assessment(
+        self,
+        tier: str,
+        latency_s: float,
+        input_tokens: int,
+        output_tokens: int,
+        error: bool = False,
+    ) -> None:
+        """Records the latency and token usage of one assessment with a tier's model."""
+        with self._lock:
+            self._latencies[tier].append(latency_s)
+            self._input_tokens[tier] += input_tokens
+            self._output_tokens[tier] += output_tokens
+            if error:
+                self._errors[tier] += 1
+
+    def stats(self) -> TierStats:
+        with self._lock:
+            escalated = sum(self._escalation_reasons.values())
+            return TierStats(
+                documents=self._documents,
+                first_pass_only=self._documents - escalated,
+                escalated=escalated,
+                direct_to_escalation_model=self._direct,
+                escalation_reasons=dict(self._escalation_reasons),
+                tiers={
+                    tier: TierUsage(
+                        model_id=model_id,
+                        assessments=len(self._latencies[tier]),
+                        errors=self._errors[tier],
+                        latency_mean_s=mean(self._latencies[tier]),
+                        latency_p95_s=percentile(self._latencies[tier], 95),
+                        input_tokens=self._input_tokens[tier],
+                        output_tokens=self._output_tokens[tier],
+                    )
+                    for tier, model_id in (
+                        (FIRST_PASS, self.first_pass_model_id),
+                        (ESCALATION, self.escalation_model_id),
+                    )
+                },
+            )
+
+
+def suggest_translation_refinements_tiered(
+    client: BedrockRuntimeClient,
+    translated_text: str,
+    source_language: str,
+    target_language: str,
+    policy: TieredModelPolicy,
+    content_type: typing.Optional[str] = None,
+    hedging: typing.Optional[HedgingPolicy] = None,
+    token_estimator: typing.Optional[TokenEstimator] = None,
+) -> TranslationAssessment:
+    logger = get_logger(
+        first_pass_model_id=policy.first_pass_model_id,
+        escalation_model_id=policy.escalation_model_id,
+        content_type=content_type,
+    )
+
+    def _assess(tier: str, salvage: bool = True) -> TranslationAssessment:
+        counting_client = amazon_bedrock.CountingClient(client)
+        start = time.perf_counter()
+        failed = True
+        try:
+            assessment = amazon_bedrock.suggest_translation_refinements(
+                typing.cast("BedrockRuntimeClient", counting_client),
+                translated_text=translated_text,
+                source_language=source_language,
+                target_language=target_language,
+                with_tool=TranslationAssessment,
+                model_id=(
+                    policy.first_pass_model_id if tier == FIRST_PASS else policy.escalation_model_id
+                ),
+                hedging=hedging,
+                salvage=salvage,
+                token_estimator=token_estimator,
+            )
+            failed = False
+        finally:
+            policy.record_assessment(
+                tier,
+                time.perf_counter() - start,
+                counting_client.input_tokens,
+                counting_client.output_tokens,
+                error=failed,
+            )
+        return typing.cast(TranslationAssessment, assessment)
+
+    if reason := policy.upfront_escalation_reason(translated_text, content_type):
+        logger.info("skipping first-pass assessment", escalation_reason=reason)
+        policy.record_outcome(reason, direct=True)
+        return _assess(ESCALATION)
+
+    try:
+        # Truncated or malformed first-pass output is escalated rather than
+        # salvaged: the stronger model is the repair.
+        assessment = _assess(FIRST_PASS, salvage=False)
+        reason = policy.escalation_reason(assessment)
+    except amazon_bedrock.UnexpectedBedrockResponse:
+        # e.g. truncated output (stopReason other than tool_use)
+        reason = "unexpected_response"
+    except pydantic.ValidationError:
+        reason = "validation_failure"
+
+    policy.record_outcome(reason)
+    if reason is None:
+        return assessment
+
+    logger.info("escalating assessment to stronger model", escalation_reason=reason)
+    return _assess(ESCALATION)
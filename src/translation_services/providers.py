@@ -0,0 +1,742 @@
+"""Pluggable translation and assessment providers.
+
+A ``TranslationProvider`` translates text and assesses translations with one
+backend: Amazon (Translate and Bedrock), an Azure OpenAI-compatible chat
+completions endpoint, or a Gemini-compatible ``generateContent`` endpoint.
+Every provider records the latency of its calls.
+
+``RacingProvider`` sends the same request to several providers concurrently
+and returns the first valid result received before a deadline.
+"""
+
+from __future__ import annotations
+
+import abc
+import collections
+import concurrent.futures
+import json
+import os
+import re
+import string
+import threading
+import time
+import typing
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pydantic
+
+from src.lib import structured_documents
+from src.lib.llm_tools import Tool, TranslationAssessment
+from src.lib.logging import get_logger
+from src.lib.stats import mean, percentile
+from src.translation_services import amazon_bedrock, amazon_translate, model_tiers, token_budget
+
+if typing.TYPE_CHECKING:  # pragma: nocover
+    from mypy_boto3_bedrock_runtime import BedrockRuntimeClient
+    from mypy_boto3_translate import TranslateClient
+    from src.translation_services.hedging import HedgingPolicy
+    from src.translation_services.model_tiers import TieredModelPolicy
+    from src.translation_services.token_budget import TokenEstimator
+
+T = typing.TypeVar("T")
+
+_BATCH_ITEM_RE = re.compile(r'<div data-item="(\d+)">(.*?)</div>', re.DOTALL | re.IGNORECASE)
+
+TRANSLATION_PROMPT_TPL = string.Template(
+    """
+You are a professional translator. Translate the text provided by the user
+from "$source_language_name" to "$target_language_name".
+$format_instructions
+Respond with only the translation, without explanations.
+""".replace("\n", " ").strip()
+)
+
+_FORMAT_INSTRUCTIONS = {
+    structured_documents.PLAIN_TEXT: "Keep the paragraph breaks of the original.",
+    structured_documents.HTML: (
+        "The text is HTML: keep all markup unchanged and translate only the text content. "
+        'Copy the contents of elements with a translate="no" attribute verbatim.'
+    ),
+    structured_documents.MARKDOWN: (
+        "The text is Markdown: keep all formatting unchanged, and do not translate "
+        "code, URLs or link targets."
+    ),
+}
+
+# JSON schema keywords understood by Gemini function declarations
+_GEMINI_SCHEMA_KEYS = frozenset(
+    {
+        "type", "format", "description", "nullable", "enum", "properties",
+        "required", "items", "minItems", "maxItems", "minimum", "maximum",
+    }
+)  # fmt: skip
+
+
+class ProviderError(Exception):
+    """Provider request failed or returned a response that could not be used"""
+
+
+class NoProviderResult(Exception):
+    """No raced provider returned a valid result before the deadline"""
+
+
+class ProviderNotConfigured(Exception):
+    """Settings required by a provider are missing"""
+
+
+class ProviderStats(pydantic.BaseModel):
+    name: str
+    requests: int
+    requests_by_service: dict[str, int]
+    errors: int
+    latency_mean_s: typing.Optional[float]
+    latency_p50_s: typing.Optional[float]
+    latency_p95_s: typing.Optional[float]
+    latency_p99_s: typing.Optional[float]
+
+
+class RaceStats(pydantic.BaseModel):
+    races: int
+    wins: dict[str, int]
+    failures: dict[str, int]
+    deadline_exceeded: int
+
+
+class TranslationProvider(abc.ABC):
+    """Base class of translation providers.
+
+    Subclasses implement ``_translate`` and ``_assess``; the public methods
+    record the latency and outcome of every call, and count it against the
+    service that handles it (``TRANSLATE_SERVICE`` or ``ASSESS_SERVICE``,
+    by default the provider's name).
+
+    :param name: Label used in logs and stats.
+    :param window: Number of recent latencies used for latency percentiles.
+    """
+
+    TRANSLATE_SERVICE: typing.ClassVar[typing.Optional[str]] = None
+    ASSESS_SERVICE: typing.ClassVar[typing.Optional[str]] = None
+
+    def __init__(self, name: str, window: int = 500):
+        self.name = name
+        self._lock = threading.Lock()
+        self._latencies: collections.deque[float] = collections.deque(maxlen=window)
+        self._requests: collections.Counter[str] = collections.Counter()
+        self._errors = 0
+
+    def _timed(self, fn: typing.Callable[[], T], service: typing.Optional[str] = None) -> T:
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = fn()
+            failed = False
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._requests[service or self.name] += 1
+                self._latencies.append(elapsed)
+                if failed:
+                    self._errors += 1
+
+    def translate(
+        self,
+        text: str,
+        source_language: str,
+        target_language: str,
+        mime_type: str = structured_documents.PLAIN_TEXT,
+    ) -> str:
+        return self._timed(
+            lambda: self._translate(text, source_language, target_language, mime_type),
+            self.TRANSLATE_SERVICE,
+        )
+
+    def translate_segments(
+        self,
+        segments: typing.Sequence[str],
+        source_language: str,
+        target_language: str,
+        mime_type: str = structured_documents.PLAIN_TEXT,
+        max_workers: int = 8,
+        max_batch_chars: int = 5000,
+    ) -> list[str]:
+        """Translates each unique segment once, concurrently.
+
+        HTML segments are sent in batches of up to ``max_batch_chars``, one
+        ``<div>`` element per segment, so that short segments do not each cost
+        a request. Segments missing from a batch's translation are translated
+        on their own. Returns one translation per input segment, in the same order.
+        """
+        logger = get_logger(provider=self.name, target_language=target_language)
+        unique_segments = list(dict.fromkeys(segments))
+        batches: list[list[str]] = []
+        batch_chars = 0
+        for segment in unique_segments:
+            if (
+                mime_type != structured_documents.HTML
+                or not batches
+                or batch_chars + len(segment) > max_batch_chars
+            ):
+                batches.append([])
+                batch_chars = 0
+            batches[-1].append(segment)
+            batch_chars += len(segment)
+
+        def _translate(segment: str) -> str:
+            return self.translate(segment, source_language, target_language, mime_type)
+
+        def _translate_batch(batch: list[str]) -> dict[str, str]:
+            if len(batch) == 1:
+                return {batch[0]: _translate(batch[0])}
+            translated = self.translate(
+                "\n".join(f'<div data-item="{i}">{s}</div>' for i, s in enumerate(batch)),
+                source_language,
+                target_language,
+                structured_documents.HTML,
+            )
+            found: dict[int, list[str]] = collections.defaultdict(list)
+            for match in _BATCH_ITEM_RE.finditer(translated):
+                found[int(match.group(1))].append(match.group(2).strip())
+            missing = [
+                i for i in range(len(batch)) if len(found.get(i, ())) != 1 or not found[i][0]
+            ]
+            if missing:
+                logger.warning(
+                    "segments missing from batched translation, translating them individually",
+                    batch_size=len(batch),
+                    missing=len(missing),
+                )
+            return {
+                segment: _translate(segment) if i in missing else found[i][0]
+                for i, segment in enumerate(batch)
+            }
+
+        logger.info(
+            "translating unique segments",
+            num_segments=len(segments),
+            num_unique_segments=len(unique_segments),
+            num_requests=len(batches),
+        )
+        translations: dict[str, str] = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for batch_translations in executor.map(_translate_batch, batches):
+                translations.update(batch_translations)
+        return [translations[s] for s in segments]
+
+    def assess(
+        self,
+        translated_text: str,
+        source_language: str,
+        target_language: str,
+        content_type: typing.Optional[str] = None,
+    ) -> TranslationAssessment:
+        return self._timed(
+            lambda: self._assess(
+                translated_text, source_language, target_language, content_type
+            ),
+            self.ASSESS_SERVICE,
+        )
+
+    @abc.abstractmethod
+    def _translate(
+        self, text: str, source_language: str, target_language: str, mime_type: str
+    ) -> str: ...
+
+    @abc.abstractmethod
+    def _assess(
+        self,
+        translated_text: str,
+        source_language: str,
+        target_language: str,
+        content_type: typing.Optional[str],
+    ) -> TranslationAssessment: ...
+
+    def stats(self) -> ProviderStats:
+        with self._lock:
+            return ProviderStats(
+                name=self.name,
+                requests=sum(self._requests.values()),
+                requests_by_service=dict(self._requests),
+                errors=self._errors,
+                latency_mean_s=mean(self._latencies),
+                latency_p50_s=percentile(self._latencies, 50),
+                latency_p95_s=percentile(self._latencies, 95),
+                latency_p99_s=percentile(self._latencies, 99),
+            )
+
+
+class AmazonProvider(TranslationProvider):
+    """Translates with Amazon Translate and assesses with Bedrock.
+
+    :param translate_client: Amazon Translate client, required for translation.
+    :param bedrock_client: Bedrock Runtime client (or ``BedrockRegionRouter``),
+        required for assessment.
+    :param model_policy: Assess with tiered model routing instead of a single model.
+    :param token_estimator: Size ``maxTokens`` per request, and refuse oversize inputs.
+    :param temperature: Sampling temperature of assessment requests.
+    """
+
+    TRANSLATE_SERVICE = "translate"
+    ASSESS_SERVICE = "bedrock"
+
+    def __init__(
+        self,
+        translate_client: typing.Optional[TranslateClient] = None,
+        bedrock_client: typing.Optional[BedrockRuntimeClient] = None,
+        model_id: str = amazon_bedrock.DEFAULT_MODEL_ID,
+        hedging: typing.Optional[HedgingPolicy] = None,
+        model_policy: typing.Optional[TieredModelPolicy] = None,
+        token_estimator: typing.Optional[TokenEstimator] = None,
+        temperature: float = 0.5,
+        name: str = "amazon",
+    ):
+        super().__init__(name)
+        self.translate_client = translate_client
+        self.bedrock_client = bedrock_client
+        self.model_id = model_id
+        self.hedging = hedging
+        self.model_policy = model_policy
+        self.token_estimator = token_estimator
+        self.temperature = temperature
+
+    def _translate(
+        self, text: str, source_language: str, target_language: str, mime_type: str
+    ) -> str:
+        if self.translate_client is None:
+            raise ProviderError(f"{self.name} provider has no Amazon Translate client")
+        return amazon_translate.translate(
+            self.translate_client,
+            source_text=text,
+            source_language=source_language,
+            target_language=target_language,
+            content_type=mime_type,
+        )
+
+    def _assess(
+        self,
+        translated_text: str,
+        source_language: str,
+        target_language: str,
+        content_type: typing.Optional[str],
+    ) -> TranslationAssessment:
+        if self.bedrock_client is None:
+            raise ProviderError(f"{self.name} provider has no Bedrock client")
+        if self.model_policy is not None:
+            return model_tiers.suggest_translation_refinements_tiered(
+                self.bedrock_client,
+                translated_text=translated_text,
+                source_language=source_language,
+                target_language=target_language,
+                policy=self.model_policy,
+                content_type=content_type,
+                hedging=self.hedging,
+                token_estimator=self.token_estimator,
+            )
+        assessment = amazon_bedrock.suggest_translation_refinements(
+            self.bedrock_client,
+            translated_text=translated_text,
+            source_language=source_language,
+            target_language=target_language,
+            with_tool=TranslationAssessment,
+            model_id=self.model_id,
+            hedging=self.hedging,
+            token_estimator=self.token_estimator,
+            temperature=self.temperature,
+        )
+        return typing.cast(TranslationAssessment, assessment)
+
+
+class AzureOpenAIProvider(TranslationProvider):
+    """Calls an Azure OpenAI-compatible chat completions deployment.
+
+    Assessments are requested as a forced function call whose parameters are
+    the ``TranslationAssessment`` schema.
+
+    :param endpoint: Resource endpoint, e.g. ``https://RESOURCE.openai.azure.com``.
+    :param deployment: Name of the model deployment.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        deployment: str,
+        api_key: str,
+        api_version: str = "2024-06-01",
+        temperature: float = 0.3,
+        max_tokens: int = 5000,
+        timeout_s: float = 120,
+        name: str = "azure",
+    ):
+        super().__init__(name)
+        self.url = (
+            f"{endpoint.rstrip('/')}/openai/deployments/{urllib.parse.quote(deployment)}"
+            f"/chat/completions?api-version={urllib.parse.quote(api_version)}"
+        )
+        self.api_key = api_key
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.timeout_s = timeout_s
+
+    @classmethod
+    def from_env(
+        cls, environ: typing.Mapping[str, str] = os.environ, **kwargs: typing.Any
+    ) -> AzureOpenAIProvider:
+        """Creates a provider from the same settings as the Apps Script translator.
+
+        ``AZURE_OPENAI_ENDPOINT`` may be set instead of ``AZURE_RESOURCE_NAME``
+        to use another compatible endpoint.
+        """
+        settings = _required_settings(
+            environ, "AZURE_API_KEY", "AZURE_DEPLOYMENT_NAME", "AZURE_API_VERSION"
+        )
+        if not (endpoint := environ.get("AZURE_OPENAI_ENDPOINT")):
+            resource_name = _required_settings(environ, "AZURE_RESOURCE_NAME")[0]
+            endpoint = f"https://{resource_name}.openai.azure.com"
+        return cls(
+            endpoint=endpoint,
+            deployment=settings[1],
+            api_key=settings[0],
+            api_version=settings[2],
+            **kwargs,
+        )
+
+    def _chat(self, system: str, text: str, **extra: typing.Any) -> dict[str, typing.Any]:
+        payload = {
+            "messages": [
+                {"role": "system", "content": system},
+                {"role": "user", "content": text},
+            ],
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            **extra,
+        }
+        response = post_json(
+            self.url, payload, headers={"api-key": self.api_key}, timeout_s=self.timeout_s
+        )
+        try:
+            return response["choices"][0]["message"]
+        except (KeyError, IndexError, TypeError):
+            raise ProviderError(f"{self.name} returned no choices")
+
+    def _translate(
+        self, text: str, source_language: str, target_language: str, mime_type: str
+    ) -> str:
+        message = self._chat(
+            format_translation_prompt(source_language, target_language, mime_type), text
+        )
+        if not (content := (message.get("content") or "").strip()):
+            raise ProviderError(f"{self.name} returned an empty translation")
+        return content
+
+    def _assess(
+        self,
+        translated_text: str,
+        source_language: str,
+        target_language: str,
+        content_type: typing.Optional[str],
+    ) -> TranslationAssessment:
+        tool = TranslationAssessment
+        message = self._chat(
+            amazon_bedrock.format_prompt(
+                source_language, target_language, with_tool_name=tool.NAME
+            ),
+            translated_text,
+            tools=[
+                {
+                    "type": "function",
+                    "function": {
+                        "name": tool.NAME,
+                        "description": tool.DESCRIPTION,
+                        "parameters": tool.model_json_schema(),
+                    },
+                }
+            ],
+            tool_choice={"type": "function", "function": {"name": tool.NAME}},
+        )
+        for call in message.get("tool_calls") or []:
+            if call.get("function", {}).get("name") == tool.NAME:
+                return tool.model_validate_json(call["function"]["arguments"])
+        raise ProviderError(f"{self.name} did not call the {tool.NAME} function")
+
+
+class GeminiProvider(TranslationProvider):
+    """Calls a Gemini-compatible ``generateContent`` endpoint.
+
+    Assessments are requested as a forced function call whose parameters are
+    the ``TranslationAssessment`` schema, reduced to the subset Gemini accepts.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        api_key: str,
+        endpoint: str = "https://generativelanguage.googleapis.com",
+        temperature: float = 0.3,
+        max_tokens: int = 5000,
+        timeout_s: float = 120,
+        name: str = "gemini",
+    ):
+        super().__init__(name)
+        self.url = (
+            f"{endpoint.rstrip('/')}/v1beta/models/{urllib.parse.quote(model)}:generateContent"
+        )
+        self.api_key = api_key
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.timeout_s = timeout_s
+
+    @classmethod
+    def from_env(
+        cls, environ: typing.Mapping[str, str] = os.environ, **kwargs: typing.Any
+    ) -> GeminiProvider:
+        """Creates a provider from the same settings as the Apps Script translator.
+
+        ``GEMINI_ENDPOINT`` may be set to use another compatible endpoint.
+        """
+        api_key, model = _required_settings(environ, "GEMINI_API_KEY", "GEMINI_VERSION")
+        if endpoint := environ.get("GEMINI_ENDPOINT"):
+            kwargs["endpoint"] = endpoint
+        return cls(model=model, api_key=api_key, **kwargs)
+
+    def _generate(
+        self, system: str, text: str, **extra: typing.Any
+    ) -> list[dict[str, typing.Any]]:
+        payload = {
+            "systemInstruction": {"parts": [{"text": system}]},
+            "contents": [{"role": "user", "parts": [{"text": text}]}],
+            "generationConfig": {
+                "temperature": self.temperature,
+                "maxOutputTokens": self.max_tokens,
+            },
+            **extra,
+        }
+        response = post_json(
+            self.url,
+            payload,
+            headers={"x-goog-api-key": self.api_key},
+            timeout_s=self.timeout_s,
+        )
+        try:
+            return response["candidates"][0]["content"]["parts"]
+        except (KeyError, IndexError, TypeError):
+            raise ProviderError(f"{self.name} returned no candidates")
+
+    def _translate(
+        self, text: str, source_language: str, target_language: str, mime_type: str
+    ) -> str:
+        parts = self._generate(
+            format_translation_prompt(source_language, target_language, mime_type), text
+        )
+        if not (content := "".join(p.get("text", "") for p in parts).strip()):
+            raise ProviderError(f"{self.name} returned an empty translation")
+        return content
+
+    def _assess(
+        self,
+        translated_text: str,
+        source_language: str,
+        target_language: str,
+        content_type: typing.Optional[str],
+    ) -> TranslationAssessment:
+        tool = TranslationAssessment
+        parts = self._generate(
+            amazon_bedrock.format_prompt(
+                source_language, target_language, with_tool_name=tool.NAME
+            ),
+            translated_text,
+            tools=[{"functionDeclarations": [gemini_function_declaration(tool)]}],
+            toolConfig={
+                "functionCallingConfig": {"mode": "ANY", "allowedFunctionNames": [tool.NAME]}
+            },
+        )
+        for part in parts:
+            if (call := part.get("functionCall")) and call.get("name") == tool.NAME:
+                return tool.model_validate(call.get("args", {}))
+        raise ProviderError(f"{self.name} did not call the {tool.NAME} function")
+
+
+class RacingProvider(TranslationProvider):
+    """Sends each request to several providers and returns the first valid result.
+
+    A result is valid when the provider returns without raising, i.e. after
+    the provider's own parsing and validation. Slower providers keep running
+    in the background so their latency is still recorded, but their results
+    are discarded.
+
+    :param providers: Providers to race.
+    :param deadline_s: Seconds to wait for a valid result before giving up.
+    :param max_workers: Size of the thread pool that runs provider calls.
+    """
+
+    def __init__(
+        self,
+        providers: typing.Sequence[TranslationProvider],
+        deadline_s: float = 60,
+        max_workers: int = 32,
+        name: str = "race",
+    ):
+        if not providers:
+            raise ValueError("at least one provider is required")
+        super().__init__(name)
+        self.providers = list(providers)
+        self.deadline_s = deadline_s
+        self._races = 0
+        self._wins: collections.Counter[str] = collections.Counter()
+        self._failures: collections.Counter[str] = collections.Counter()
+        self._deadline_exceeded = 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="provider-race"
+        )
+
+    def _race(self, call: typing.Callable[[TranslationProvider], T]) -> T:
+        logger = get_logger(providers=[p.name for p in self.providers])
+        deadline = time.monotonic() + self.deadline_s
+        with self._lock:
+            self._races += 1
+        pending = {self._executor.submit(call, p): p for p in self.providers}
+        errors: dict[str, str] = {}
+        too_large: list[token_budget.InputTooLarge] = []
+        while pending:
+            done, _ = concurrent.futures.wait(
+                pending,
+                timeout=max(0.0, deadline - time.monotonic()),
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            if not done:
+                break
+            for future in done:
+                provider = pending.pop(future)
+                if (error := future.exception()) is not None:
+                    logger.debug("raced provider failed", provider=provider.name, error=str(error))
+                    errors[provider.name] = str(error)
+                    if isinstance(error, token_budget.InputTooLarge):
+                        too_large.append(error)
+                    with self._lock:
+                        self._failures[provider.name] += 1
+                    continue
+                for other in pending:
+                    other.cancel()
+                with self._lock:
+                    self._wins[provider.name] += 1
+                logger.debug("raced provider won", provider=provider.name)
+                return future.result()
+
+        if pending:
+            with self._lock:
+                self._deadline_exceeded += 1
+            raise NoProviderResult(
+                f"no valid result within {self.deadline_s}s "
+                f"(waiting on {', '.join(p.name for p in pending.values())}; failed: {errors})"
+            )
+        if len(too_large) == len(self.providers):
+            # callers split oversize input and retry, e.g. Document.get_assessment
+            raise min(too_large, key=lambda e: e.max_text_chars)
+        raise NoProviderResult(f"every raced provider failed: {errors}")
+
+    def _translate(
+        self, text: str, source_language: str, target_language: str, mime_type: str
+    ) -> str:
+        return self._race(
+            lambda p: p.translate(text, source_language, target_language, mime_type)
+        )
+
+    def _assess(
+        self,
+        translated_text: str,
+        source_language: str,
+        target_language: str,
+        content_type: typing.Optional[str],
+    ) -> TranslationAssessment:
+        return self._race(
+            lambda p: p.assess(translated_text, source_language, target_language, content_type)
+        )
+
+    def race_stats(self) -> RaceStats:
+        with self._lock:
+            return RaceStats(
+                races=self._races,
+                wins=dict(self._wins),
+                failures=dict(self._failures),
+                deadline_exceeded=self._deadline_exceeded,
+            )
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _required_settings(environ: typing.Mapping[str, str], *names: str) -> list[str]:
+    if missing := [name for name in names if not environ.get(name)]:
+        raise ProviderNotConfigured(f"missing settings: {', '.join(missing)}")
+    return [environ[name] for name in names]
+
+
+def format_translation_prompt(
+    source_language: str,
+    target_language: str,
+    mime_type: str = structured_documents.PLAIN_TEXT,
+    prompt_template: string.Template = TRANSLATION_PROMPT_TPL,
+) -> str:
+    return prompt_template.substitute(
+        source_language_name=source_language,
+        target_language_name=target_language,
+        format_instructions=_FORMAT_INSTRUCTIONS.get(mime_type, ""),
+    )
+
+
+def post_json(
+    url: str,
+    payload: typing.Any,
+    headers: typing.Optional[typing.Mapping[str, str]] = None,
+    timeout_s: float = 120,
+) -> typing.Any:
+    """POSTs a JSON payload and returns the decoded JSON response.
+
+    Raises ``ProviderError`` for HTTP errors, connection failures and
+    responses that are not JSON.
+    """
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json", **(headers or {})},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout_s) as response:
+            body = response.read()
+    except urllib.error.HTTPError as e:
+        detail = e.read().decode("utf-8", errors="replace")[:500]
+        raise ProviderError(f"HTTP {e.code} from {url}: {detail}") from e
+    except (urllib.error.URLError, TimeoutError) as e:
+        raise ProviderError(f"request to {url} failed: {e}") from e
+    try:
+        return json.loads(body)
+    except ValueError as e:
+        raise ProviderError(f"response from {url} is not JSON") from e
+
+
+def gemini_function_declaration(tool: type[Tool]) -> dict[str, typing.Any]:
+    """Function declaration for a tool, with its schema inlined and reduced for Gemini."""
+    schema = tool.model_json_schema()
+    definitions = schema.get("$defs", {})
+
+    def _reduce(node: typing.Any) -> typing.Any:
+        if isinstance(node, list):
+            return [_reduce(n) for n in node]
+        if not isinstance(node, dict):
+            return node
+        if "$ref" in node:
+            return _reduce(definitions[node["$ref"].rsplit("/", 1)[-1]])
+        return {
+            # property names are not schema keywords, so they are kept as-is
+            k: {p: _reduce(s) for p, s in v.items()} if k == "properties" else _reduce(v)
+            for k, v in node.items()
+            if k in _GEMINI_SCHEMA_KEYS
+        }
+
+    return {
+        "name": tool.NAME,
+        "description": tool.DESCRIPTION,
+        "parameters": _reduce(schema),
+    }
@@ -0,0 +1,314 @@
+"""Token-aware sizing of assessment requests.
+
+``TokenEstimator`` predicts the input tokens of an assessment request and the
+size of the tool output from the translated text's length and script, so that
+``maxTokens`` can be set per request instead of reserving the same (large)
+amount for every document. Inputs that would not fit in the model's context
+window are refused before they are sent.
+
+Estimates start from per-script priors and are refined from the ``usage`` of
+Bedrock responses, optionally persisted to a JSONL history file so that later
+runs start from what earlier runs learned.
+"""
+
+from __future__ import annotations
+
+import collections
+import json
+import math
+import os
+import pathlib
+import threading
+import typing
+
+import pydantic
+
+from src.lib.logging import get_logger
+from src.lib.stats import fit_line
+
+# Approximate characters per token of each script. These err on the low side,
+# so unknown text is assumed to be token-dense rather than truncated.
+PRIOR_CHARS_PER_TOKEN = {
+    "latin": 3.5,
+    "cyrillic": 2.5,
+    "greek": 2.0,
+    "armenian": 2.0,
+    "georgian": 1.5,
+    "hebrew": 2.0,
+    "arabic": 2.0,
+    "ethiopic": 1.0,
+    "indic": 1.2,
+    "thai": 1.2,
+    "southeast_asian": 1.0,
+    "hangul": 1.0,
+    "kana": 1.0,
+    "han": 0.9,
+    "other": 1.5,
+}
+
+_SCRIPT_RANGES = [
+    (0x0041, 0x024F, "latin"),
+    (0x0370, 0x03FF, "greek"),
+    (0x0400, 0x052F, "cyrillic"),
+    (0x0530, 0x058F, "armenian"),
+    (0x0590, 0x05FF, "hebrew"),
+    (0x0600, 0x06FF, "arabic"),
+    (0x0750, 0x077F, "arabic"),
+    (0x0900, 0x0DFF, "indic"),
+    (0x0E00, 0x0E7F, "thai"),
+    (0x0E80, 0x0EFF, "southeast_asian"),  # Lao
+    (0x1000, 0x109F, "southeast_asian"),  # Myanmar
+    (0x10A0, 0x10FF, "georgian"),
+    (0x1100, 0x11FF, "hangul"),
+    (0x1200, 0x139F, "ethiopic"),
+    (0x1780, 0x17FF, "southeast_asian"),  # Khmer
+    (0x1E00, 0x1EFF, "latin"),
+    (0x3040, 0x30FF, "kana"),
+    (0x3400, 0x4DBF, "han"),
+    (0x4E00, 0x9FFF, "han"),
+    (0xAC00, 0xD7AF, "hangul"),
+    (0xFB50, 0xFDFF, "arabic"),
+    (0xFE70, 0xFEFF, "arabic"),
+]
+
+# The system prompt and tool schema are English.
+_OVERHEAD_CHARS_PER_TOKEN = PRIOR_CHARS_PER_TOKEN["latin"]
+
+
+class InputTooLarge(Exception):
+    """Request input is estimated to exceed the model's token budget"""
+
+    def __init__(self, message: str, estimate: TokenEstimate, max_text_chars: int):
+        super().__init__(message)
+        self.estimate = estimate
+        self.max_text_chars = max_text_chars
+
+
+class TokenEstimate(pydantic.BaseModel):
+    script: str
+    text_chars: int
+    input_tokens: int
+    output_tokens: int
+    max_tokens: int
+    fits: bool
+
+
+class UsageObservation(pydantic.BaseModel):
+    script: str
+    text_chars: int
+    overhead_chars: int
+    input_tokens: int
+    output_tokens: int
+    truncated: bool = False
+
+
+class ScriptTokenStats(pydantic.BaseModel):
+    script: str
+    observations: int
+    truncations: int
+    chars_per_input_token: float
+    learned: bool
+
+
+def detect_script(text: str, sample_chars: int = 2000) -> str:
+    """Returns the most common script among the first letters of ``text``."""
+    counts: collections.Counter[str] = collections.Counter()
+    seen = 0
+    for char in text:
+        if not char.isalpha():
+            continue
+        codepoint = ord(char)
+        counts[
+            next(
+                (name for start, end, name in _SCRIPT_RANGES if start <= codepoint <= end),
+                "other",
+            )
+        ] += 1
+        seen += 1
+        if seen >= sample_chars:
+            break
+    return counts.most_common(1)[0][0] if counts else "latin"
+
+
+class TokenEstimator:
+    """Predicts request sizes from text length and script, learning from observed usage.
+
+    Can be shared by concurrent callers.
+
+    :param context_window: Total tokens (input and output) the model accepts.
+    :param max_input_tokens: Refuse inputs estimated above this many tokens.
+        Defaults to the context window minus ``max_output_tokens``.
+    :param min_output_tokens: Lower bound of ``maxTokens``.
+    :param max_output_tokens: Upper bound of ``maxTokens`` (the model's output limit).
+    :param safety_margin: Factor applied to the predicted output size.
+    :param prior_output_tokens: Output tokens predicted for an empty document
+        before usage is learned.
+    :param prior_output_ratio: Output tokens per input text token predicted
+        before usage is learned.
+    :param min_samples: Observations of a script needed before its learned
+        estimates replace the priors.
+    :param window: Number of recent observations kept per script.
+    :param history_path: JSONL file of past observations, loaded on creation
+        and appended to as usage is recorded.
+    """
+
+    def __init__(
+        self,
+        context_window: int = 200_000,
+        max_input_tokens: typing.Optional[int] = None,
+        min_output_tokens: int = 1024,
+        max_output_tokens: int = 8192,
+        safety_margin: float = 1.3,
+        prior_output_tokens: int = 400,
+        prior_output_ratio: float = 0.6,
+        min_samples: int = 5,
+        window: int = 1000,
+        history_path: typing.Optional[str | os.PathLike] = None,
+    ):
+        if min_output_tokens > max_output_tokens:
+            raise ValueError("min_output_tokens must not exceed max_output_tokens")
+        self.context_window = context_window
+        self.max_input_tokens = (
+            max_input_tokens
+            if max_input_tokens is not None
+            else context_window - max_output_tokens
+        )
+        self.min_output_tokens = min_output_tokens
+        self.max_output_tokens = max_output_tokens
+        self.safety_margin = safety_margin
+        self.prior_output_tokens = prior_output_tokens
+        self.prior_output_ratio = prior_output_ratio
+        self.min_samples = min_samples
+        self.window = window
+        self.history_path = pathlib.Path(history_path) if history_path else None
+        self._lock = threading.Lock()
+        self._observations: dict[str, collections.deque[UsageObservation]] = {}
+        if self.history_path is not None and self.history_path.is_file():
+            self._load_history(self.history_path)
+
+    def _load_history(self, path: pathlib.Path) -> None:
+        loaded = 0
+        with open(path) as fh:
+            for line in fh:
+                if line.strip():
+                    self._add(UsageObservation.model_validate_json(line))
+                    loaded += 1
+        get_logger(history_path=str(path)).debug("loaded token usage history", observations=loaded)
+
+    def _add(self, observation: UsageObservation) -> None:
+        self._observations.setdefault(
+            observation.script, collections.deque(maxlen=self.window)
+        ).append(observation)
+
+    def _tokens_per_char(self, script: str) -> float:
+        observations = self._observations.get(script, ())
+        if len(observations) >= self.min_samples:
+            text_tokens = sum(
+                o.input_tokens - o.overhead_chars / _OVERHEAD_CHARS_PER_TOKEN
+                for o in observations
+            )
+            text_chars = sum(o.text_chars for o in observations)
+            if text_tokens > 0 and text_chars > 0:
+                return text_tokens / text_chars
+        return 1 / PRIOR_CHARS_PER_TOKEN.get(script, PRIOR_CHARS_PER_TOKEN["other"])
+
+    def _predict_output_tokens(self, script: str, text_chars: int, text_tokens: float) -> float:
+        observations = self._observations.get(script, ())
+        if len(observations) >= self.min_samples:
+            fit = fit_line(
+                # Truncated outputs only give a lower bound of the size that was
+                # needed, so they are counted as half again as large.
+                [
+                    (o.text_chars, o.output_tokens * (1.5 if o.truncated else 1))
+                    for o in observations
+                ]
+            )
+            if fit is not None and fit[1] >= 0:
+                return max(fit[0] + fit[1] * text_chars, 0)
+        return self.prior_output_tokens + self.prior_output_ratio * text_tokens
+
+    def estimate(self, text: str, overhead_chars: int = 0) -> TokenEstimate:
+        """Estimates the request for ``text`` plus ``overhead_chars`` of prompt and tool schema."""
+        return self.estimate_chars(len(text), detect_script(text), overhead_chars)
+
+    def estimate_chars(
+        self, text_chars: int, script: str = "latin", overhead_chars: int = 0
+    ) -> TokenEstimate:
+        """Estimates the request for a text of ``text_chars`` characters of ``script``."""
+        with self._lock:
+            text_tokens = text_chars * self._tokens_per_char(script)
+            output_tokens = self._predict_output_tokens(script, text_chars, text_tokens)
+        input_tokens = math.ceil(text_tokens + overhead_chars / _OVERHEAD_CHARS_PER_TOKEN)
+        max_tokens = min(
+            max(math.ceil(output_tokens * self.safety_margin), self.min_output_tokens),
+            self.max_output_tokens,
+        )
+        return TokenEstimate(
+            script=script,
+            text_chars=text_chars,
+            input_tokens=input_tokens,
+            output_tokens=math.ceil(output_tokens),
+            max_tokens=max_tokens,
+            fits=(
+                input_tokens <= self.max_input_tokens
+                and input_tokens + max_tokens <= self.context_window
+            ),
+        )
+
+    def check(self, text: str, overhead_chars: int = 0) -> TokenEstimate:
+        """Returns the estimate for ``text``, raising ``InputTooLarge`` if it does not fit."""
+        estimate = self.estimate(text, overhead_chars)
+        if not estimate.fits:
+            raise InputTooLarge(
+                f"estimated {estimate.input_tokens} input tokens exceeds the budget of "
+                f"{min(self.max_input_tokens, self.context_window - estimate.max_tokens)}",
+                estimate=estimate,
+                max_text_chars=self.max_text_chars(estimate.script, overhead_chars),
+            )
+        return estimate
+
+    def max_text_chars(self, script: str, overhead_chars: int = 0) -> int:
+        """Longest text of ``script`` whose request is estimated to fit."""
+        with self._lock:
+            tokens_per_char = self._tokens_per_char(script)
+        available = min(
+            self.max_input_tokens, self.context_window - self.max_output_tokens
+        ) - overhead_chars / _OVERHEAD_CHARS_PER_TOKEN
+        return max(int(available / tokens_per_char), 0)
+
+    def record_usage(
+        self,
+        text: str,
+        overhead_chars: int,
+        input_tokens: int,
+        output_tokens: int,
+        truncated: bool = False,
+    ) -> None:
+        """Learns from the ``usage`` reported for a request."""
+        observation = UsageObservation(
+            script=detect_script(text),
+            text_chars=len(text),
+            overhead_chars=overhead_chars,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            truncated=truncated,
+        )
+        with self._lock:
+            self._add(observation)
+            if self.history_path is not None:
+                os.makedirs(self.history_path.parent, exist_ok=True)
+                with open(self.history_path, "a") as fh:
+                    fh.write(observation.model_dump_json() + "\n")
+
+    def stats(self) -> list[ScriptTokenStats]:
+        with self._lock:
+            return [
+                ScriptTokenStats(
+                    script=script,
+                    observations=len(observations),
+                    truncations=sum(1 for o in observations if o.truncated),
+                    chars_per_input_token=1 / self._tokens_per_char(script),
+                    learned=len(observations) >= self.min_samples,
+                )
+                for script, observations in sorted(self._observations.items())
+            ]
@@ -0,0 +1,101 @@
+import datetime
+
+from src.lib import artifacts
+from src.lib.llm_tools import TranslationAssessment, TranslationImprovement
+
+
+def make_assessment(*severities):
+    return TranslationAssessment(
+        quality_assessments=["fine"],
+        improvements=[
+            TranslationImprovement(
+                excerpt=f"excerpt {i}",
+                replacement=f"replacement {i}",
+                severity=severity,
+                rationale="because",
+                confidence=4 + i,
+            )
+            for i, severity in enumerate(severities)
+        ],
+    )
+
+
+def make_record(assessment):
+    return artifacts.AssessmentRecord(
+        document="source.txt",
+        source_language="en",
+        target_language="es",
+        created_at=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc),
+        assessment=assessment,
+    )
+
+
+class TestAssessmentFiles:
+    def test_round_trip(self, tmp_path):
+        assessment = make_assessment("MAJOR", "MINOR")
+        path = tmp_path.joinpath(artifacts.ASSESSMENT_FILENAME)
+
+        artifacts.write_assessment(path, assessment)
+
+        assert path.read_text().startswith("{\n  ")
+        assert artifacts.load_assessment(path) == assessment
+
+    def test_ndjson_records_are_appended(self, tmp_path):
+        path = tmp_path.joinpath("assessments.ndjson")
+
+        artifacts.append_assessment_records(path, [make_record(make_assessment("MINOR"))])
+        artifacts.append_assessment_records(path, [make_record(make_assessment())])
+
+        lines = path.read_text().splitlines()
+        assert len(lines) == 2
+        records = list(artifacts.iter_assessment_records(path))
+        assert [len(r.assessment.improvements) for r in records] == [1, 0]
+        assert records[0].created_at.year == 2024
+
+
+class TestScanAssessments:
+    def test_scan_and_summarize(self, tmp_path):
+        """
+        Nested assessment.json files and NDJSON logs should be found; invalid files are reported
+        """
+        for i in range(3):
+            run_dir = tmp_path.joinpath(f"doc-{i}", "es", "assessment-2024")
+            run_dir.mkdir(parents=True)
+            artifacts.write_assessment(
+                run_dir.joinpath(artifacts.ASSESSMENT_FILENAME), make_assessment("MAJOR", "MINOR")
+            )
+        artifacts.append_assessment_records(
+            tmp_path.joinpath("log.ndjson"),
+            [make_record(make_assessment("MINOR")), make_record(make_assessment())],
+        )
+        tmp_path.joinpath("doc-0", "es", artifacts.ASSESSMENT_FILENAME).write_text("{}")
+        tmp_path.joinpath("doc-0", "notes.json").write_text("{}")
+
+        results = list(artifacts.scan_assessments(tmp_path, max_workers=2))
+        summary = artifacts.summarize_assessments(assessment for _, assessment in results)
+
+        assert len(results) == 6
+        assert summary.assessments == 5
+        assert summary.invalid_records == 1
+        assert summary.improvements == 7
+        assert summary.major == 3
+        assert summary.minor == 4
+        assert summary.mean_confidence == 31 / 7
+
+    def test_invalid_ndjson_records_are_skipped(self, tmp_path):
+        """
+        An invalid NDJSON line should be counted on its own, without discarding the rest of the log
+        """
+        path = tmp_path.joinpath("log.ndjson")
+        artifacts.append_assessment_records(path, [make_record(make_assessment("MINOR"))])
+        with open(path, "a") as fh:
+            fh.write('{"document": "truncated\n{}\n')
+        artifacts.append_assessment_records(path, [make_record(make_assessment("MAJOR"))])
+
+        summary = artifacts.summarize_assessments(
+            assessment for _, assessment in artifacts.scan_assessments(tmp_path)
+        )
+
+        assert summary.assessments == 2
+        assert summary.invalid_records == 2
+        assert (summary.major, summary.minor) == (1, 1)
@@ -0,0 +1,9 @@
+from src.lib.llm_tools import TranslationImprovement, type_adapter
+
+
+class TestTypeAdapter:
+    def test_adapters_are_cached(self):
+        adapter = type_adapter(TranslationImprovement)
+
+        assert type_adapter(TranslationImprovement) is adapter
+        assert type_adapter(list[TranslationImprovement]) is not adapter
@@ -0,0 +1,72 @@
+import json
+import pstats
+
+from src.lib.profiling import Profiler
+
+
+def allocate_and_work():
+    data = [str(i) * 10 for i in range(20000)]
+    return inner_work(data)
+
+
+def inner_work(data):
+    return sum(len(d) for d in data)
+
+
+class TestProfiler:
+    def test_disabled_profiler_is_a_no_op(self, tmp_path):
+        profiler = Profiler()
+
+        with profiler.stage("nmt"):
+            allocate_and_work()
+
+        assert profiler.stages == []
+        assert profiler.write_summary() is None
+
+    def test_stage_outputs(self, tmp_path):
+        """
+        Each stage should produce pstats, collapsed stacks and a memory report
+        """
+        profiler = Profiler(tmp_path)
+
+        with profiler.stage("assessment"):
+            allocate_and_work()
+        with profiler.stage("apply improvements"):
+            inner_work(["a"])
+
+        assert [s.name for s in profiler.stages] == ["assessment", "apply improvements"]
+        stage = profiler.stages[0]
+        assert stage.pstats_path.endswith("01-assessment.pstats")
+        assert profiler.stages[1].pstats_path.endswith("02-apply_improvements.pstats")
+        assert stage.peak_memory_bytes > 0
+
+        stats = pstats.Stats(stage.pstats_path)
+        assert any(func[2] == "allocate_and_work" for func in stats.stats)
+
+        collapsed = open(stage.collapsed_path).read().splitlines()
+        assert collapsed
+        stacks = {line.rsplit(" ", 1)[0] for line in collapsed}
+        assert any(
+            "allocate_and_work" in stack and stack.index("allocate_and_work") < stack.index("inner_work")
+            for stack in stacks
+            if "inner_work" in stack
+        )
+        assert all(int(line.rsplit(" ", 1)[1]) > 0 for line in collapsed)
+
+        memory_report = open(stage.memory_path).read()
+        assert "peak traced memory" in memory_report
+        assert "test_profiling.py" in memory_report
+
+        summary = json.load(open(profiler.write_summary()))
+        assert [s["name"] for s in summary] == ["assessment", "apply improvements"]
+
+    def test_stage_records_on_error(self, tmp_path):
+        profiler = Profiler(tmp_path)
+
+        try:
+            with profiler.stage("nmt"):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+
+        assert len(profiler.stages) == 1
@@ -0,0 +1,134 @@
+import pytest
+
+from src.lib.structured_documents import (
+    HTML,
+    MARKDOWN,
+    PLAIN_TEXT,
+    StructuredDocument,
+    UnsupportedMimeType,
+    missing_placeholders,
+    protect_placeholders,
+    restore_placeholders,
+)
+
+HTML_NOTICE = """<html><head><title>Notice</title><style>p { color: red; }</style></head>
+<body>
+<h1>Your benefits &amp; you</h1>
+<p>Hello {{name}}, visit <a href="https://example.gov">our site</a>.</p>
+<table><tr><td>Amount</td><td>{amount}</td></tr></table>
+<footer><p>Call us at 555-0100.</p></footer>
+<p>Call us at 555-0100.</p>
+<script>var html = "<p>not text</p>";</script>
+</body></html>
+"""
+
+MARKDOWN_NOTICE = """# Your benefits
+
+Hello {{name}}, please read
+this notice. See [our site](https://example.gov).
+
+- Bring your `ID card`
+- [ ] Sign the form
+> Call us at 555-0100.
+
+| Label | Value |
+|---|---|
+| Amount | {amount} |
+
+```
+not translated
+```
+---
+Call us at 555-0100.
+"""
+
+
+class TestStructuredDocument:
+    @pytest.mark.parametrize(
+        "content,mime_type",
+        [(HTML_NOTICE, HTML), (MARKDOWN_NOTICE, MARKDOWN), ("One.\n\nTwo.\n", PLAIN_TEXT)],
+    )
+    def test_round_trip(self, content, mime_type):
+        """
+        Rebuilding with untranslated segments should reproduce the document exactly
+        """
+        structured = StructuredDocument.parse(content, mime_type)
+
+        assert structured.map_segments(lambda s: s) == content
+
+    def test_html_segments(self):
+        """
+        Block elements delimit segments; inline markup stays inside; scripts and styles are skipped
+        """
+        structured = StructuredDocument.parse(HTML_NOTICE, HTML)
+
+        assert structured.segments == [
+            "Notice",
+            "Your benefits &amp; you",
+            'Hello {{name}}, visit <a href="https://example.gov">our site</a>.',
+            "Amount",
+            "{amount}",
+            "Call us at 555-0100.",
+            "Call us at 555-0100.",
+        ]
+        assert len(structured.unique_segments()) == 6
+        assert "Your benefits & you" in structured.prose()
+        assert "our site" in structured.prose()
+        assert "<a" not in structured.prose()
+
+    def test_markdown_segments(self):
+        structured = StructuredDocument.parse(MARKDOWN_NOTICE, MARKDOWN)
+
+        assert structured.segments == [
+            "Your benefits",
+            "Hello {{name}}, please read\nthis notice. See [our site](https://example.gov).",
+            "Bring your `ID card`",
+            "Sign the form",
+            "Call us at 555-0100.",
+            "Label",
+            "Value",
+            "Amount",
+            "{amount}",
+            "Call us at 555-0100.",
+        ]
+
+    def test_rebuild_with_translations(self):
+        structured = StructuredDocument.parse("<p>Yes</p><p>No</p><p>Yes</p>", HTML)
+
+        assert structured.rebuild({"Yes": "Sí", "No": "No"}) == "<p>Sí</p><p>No</p><p>Sí</p>"
+
+    def test_unsupported_mime_type(self):
+        with pytest.raises(UnsupportedMimeType):
+            StructuredDocument.parse("{}", "application/json")
+
+
+class TestPlaceholders:
+    def test_protect_markdown(self):
+        """
+        Placeholders should be excluded from translation, and text escaped for HTML
+        """
+        segment = "Hi {{name}} & see [site](https://example.gov) or `code`"
+
+        protected = protect_placeholders(segment, MARKDOWN)
+
+        assert protected == (
+            'Hi <span translate="no">{{name}}</span> &amp; see [site'
+            '<span translate="no">](https://example.gov)</span> or '
+            '<span translate="no">`code`</span>'
+        )
+        assert restore_placeholders(protected, MARKDOWN) == segment
+
+    def test_protect_html_leaves_tags_alone(self):
+        segment = '<a href="https://example.gov">Visit https://example.gov.</a>'
+
+        protected = protect_placeholders(segment, HTML)
+
+        assert protected == (
+            '<a href="https://example.gov">Visit '
+            '<span translate="no">https://example.gov</span>.</a>'
+        )
+        assert restore_placeholders(protected, HTML) == segment
+
+    def test_missing_placeholders(self):
+        assert missing_placeholders("Hi {name}, {name}", "Hola {name}", PLAIN_TEXT) == ["{name}"]
+        assert missing_placeholders("Hi {name}", "Hola {name}", PLAIN_TEXT) == []
@@ -0,0 +1,260 @@
+import json
+import pathlib
+import string
+
+import pytest
+from unittest.mock import MagicMock
+
+from src.tasks.evaluate import (
+    DEFAULT_PROMPT_VARIANT,
+    InvalidPromptTemplate,
+    PromptVariant,
+    ResponseCache,
+    format_comparison_table,
+    load_corpus,
+    prepare_translations,
+    run_evaluation,
+    summarize,
+)
+
+
+def make_converse_response(improvements, input_tokens=100, output_tokens=50):
+    return {
+        "stopReason": "tool_use",
+        "output": {
+            "message": {
+                "role": "assistant",
+                "content": [
+                    {
+                        "toolUse": {
+                            "toolUseId": "tooluse-1",
+                            "name": "translation_assessment",
+                            "input": {
+                                "quality_assessments": ["Looks good"],
+                                "improvements": improvements,
+                            },
+                        }
+                    }
+                ],
+            }
+        },
+        "usage": {"inputTokens": input_tokens, "outputTokens": output_tokens},
+        "metrics": {"latencyMs": 1200},
+    }
+
+
+class MockBedrockClient:
+    def __init__(self, response):
+        self.converse = MagicMock(return_value=response)
+        self.exceptions = MagicMock()
+        self.exceptions.ClientError = Exception
+
+
+@pytest.fixture
+def corpus_dir(tmp_path):
+    first = tmp_path.joinpath("notice-1")
+    first.joinpath("es").mkdir(parents=True)
+    first.joinpath("source.txt").write_text("Submit your claim.")
+    first.joinpath("es", "translation.txt").write_text("Presente su solicitud.")
+    first.joinpath("es", "reference.txt").write_text("Presente su reclamo.")
+    second = tmp_path.joinpath("notice-2")
+    second.mkdir()
+    second.joinpath("source.txt").write_text("Call us.")
+    tmp_path.joinpath("not-an-item").mkdir()
+    return tmp_path
+
+
+@pytest.fixture
+def improvement():
+    return {
+        "excerpt": "solicitud",
+        "replacement": "reclamo",
+        "severity": "MAJOR",
+        "rationale": "claims are not applications",
+        "confidence": 8,
+    }
+
+
+class TestLoadCorpus:
+    def test_load_corpus(self, corpus_dir):
+        """
+        Items need a source.txt; NMT output and references are optional
+        """
+        items = load_corpus(corpus_dir, "en", "es")
+
+        assert [i.name for i in items] == ["notice-1", "notice-2"]
+        assert items[0].nmt_document.content == "Presente su solicitud."
+        assert items[0].nmt_document.translation_source is items[0].source_document
+        assert items[0].reference_text == "Presente su reclamo."
+        assert items[1].nmt_document is None
+        assert items[1].reference_text is None
+
+
+class TestPromptVariant:
+    def test_from_file(self, tmp_path):
+        """
+        Prompt variants are named after their file
+        """
+        path = tmp_path.joinpath("terse.txt")
+        path.write_text("Review this $source_language_name to $target_language_name text.\n")
+
+        variant = PromptVariant.from_file(path)
+
+        assert variant.name == "terse"
+        assert variant.template.substitute(
+            source_language_name="en", target_language_name="es"
+        ) == "Review this en to es text."
+
+    @pytest.mark.parametrize(
+        "text",
+        ["Review this {{text}} for $5.", "Review this $text.", "Review this ${target_language}."],
+    )
+    def test_invalid_placeholders_fail_on_load(self, tmp_path, text):
+        path = tmp_path.joinpath("bad.txt")
+        path.write_text(text)
+
+        with pytest.raises(InvalidPromptTemplate):
+            PromptVariant.from_file(path)
+
+    def test_example_prompt(self):
+        """
+        The prompt file used in the evals README should load
+        """
+        path = pathlib.Path(__file__).parents[2].joinpath("evals", "assessment-prompt.txt")
+
+        variant = PromptVariant.from_file(path)
+
+        assert "es-MX" in variant.template.substitute(
+            source_language_name="en", target_language_name="es-MX"
+        )
+
+
+class TestResponseCache:
+    def test_round_trip(self, tmp_path):
+        cache = ResponseCache(tmp_path)
+        cache.put("converse", {"b": 1, "a": 2}, {"value": 3})
+
+        assert cache.get("converse", {"a": 2, "b": 1}) == {"value": 3}
+        assert cache.get("converse", {"a": 1}) is None
+        assert cache.get("translate", {"a": 2, "b": 1}) is None
+
+    def test_disabled(self):
+        cache = ResponseCache()
+        cache.put("converse", {"a": 1}, {"value": 1})
+
+        assert cache.get("converse", {"a": 1}) is None
+
+
+class TestRunEvaluation:
+    def test_metrics(self, corpus_dir, improvement, tmp_path_factory):
+        """
+        Every item is assessed for every model and prompt, and metrics are computed per variant
+        """
+        items = load_corpus(corpus_dir, "en", "es")
+        translate_client = MagicMock()
+        translate_client.translate_document.return_value = {
+            "TranslatedDocument": {"Content": "Llámenos.".encode("utf-8")}
+        }
+        cache = ResponseCache(tmp_path_factory.mktemp("cache"))
+        prepare_translations(items, translate_client, "es", cache)
+        client = MockBedrockClient(make_converse_response([improvement]))
+        prompts = [
+            DEFAULT_PROMPT_VARIANT,
+            PromptVariant("alt", string.Template("Check $target_language_name.")),
+        ]
+
+        records = run_evaluation(
+            items, client, model_ids=["model-a", "model-b"], prompts=prompts, cache=cache
+        )
+
+        assert len(records) == 8
+        assert client.converse.call_count == 8
+        assert {c.kwargs["modelId"] for c in client.converse.call_args_list} == {
+            "model-a",
+            "model-b",
+        }
+        summaries = summarize(records)
+        assert len(summaries) == 4
+        summary = summaries[0]
+        assert summary.documents == 2
+        assert summary.errors == 0
+        assert summary.improvements_per_document == 1
+        assert summary.major_share == 1
+        # the excerpt only appears in the first notice
+        assert summary.applicable_rate == 0.5
+        # only the first notice is labelled, and its reference contains the replacement
+        assert summary.acceptance_rate == 1
+        assert summary.mean_input_tokens == 100
+        assert "| model-a | default | 2 | 0 |" in format_comparison_table(summaries)
+
+    def test_cached_responses(self, corpus_dir, improvement, tmp_path_factory):
+        """
+        Re-running an evaluation should be served from the response cache
+        """
+        items = load_corpus(corpus_dir, "en", "es")[:1]
+        cache = ResponseCache(tmp_path_factory.mktemp("cache"))
+        client = MockBedrockClient(make_converse_response([improvement]))
+
+        run_evaluation(items, client, ["model-a"], [DEFAULT_PROMPT_VARIANT], cache)
+        records = run_evaluation(items, client, ["model-a"], [DEFAULT_PROMPT_VARIANT], cache)
+
+        assert client.converse.call_count == 1
+        assert records[0].cached is True
+        assert records[0].latency_s == 1.2
+
+    def test_errors_are_recorded(self, corpus_dir):
+        """
+        A failed assessment should not abort the whole evaluation
+        """
+        items = load_corpus(corpus_dir, "en", "es")[:1]
+        response = make_converse_response([])
+        response["stopReason"] = "max_tokens"
+        client = MockBedrockClient(response)
+
+        records = run_evaluation(
+            items, client, ["model-a"], [DEFAULT_PROMPT_VARIANT], ResponseCache()
+        )
+
+        assert records[0].error.startswith("UnexpectedBedrockResponse")
+        assert json.loads(records[0].model_dump_json())["improvements"] == 0
+
+    def test_failed_translations_are_recorded(self, corpus_dir, improvement):
+        """
+        A failed NMT call should only fail the evaluation of that item
+        """
+        items = load_corpus(corpus_dir, "en", "es")
+        translate_client = MagicMock()
+        translate_client.exceptions.ClientError = ValueError
+        translate_client.translate_document.side_effect = RuntimeError("throttled")
+        prepare_translations(items, translate_client, "es", ResponseCache())
+        client = MockBedrockClient(make_converse_response([improvement]))
+
+        records = run_evaluation(
+            items, client, ["model-a"], [DEFAULT_PROMPT_VARIANT], ResponseCache()
+        )
+
+        assert records[0].error is None
+        assert records[1].error == "NMT failed: RuntimeError: throttled"
+
+    def test_acceptance_uses_aligned_reference_paragraph(self, tmp_path, improvement):
+        """
+        A replacement only counts as accepted in the reference paragraph matching its excerpt
+        """
+        item_dir = tmp_path.joinpath("notice")
+        item_dir.joinpath("es").mkdir(parents=True)
+        item_dir.joinpath("source.txt").write_text("Submit your claim.\n\nThe claim is closed.")
+        item_dir.joinpath("es", "translation.txt").write_text(
+            "Presente su solicitud.\n\nEl reclamo está cerrado."
+        )
+        item_dir.joinpath("es", "reference.txt").write_text(
+            "Envíe su solicitud.\n\nEl reclamo está cerrado."
+        )
+        items = load_corpus(tmp_path, "en", "es")
+        client = MockBedrockClient(make_converse_response([improvement]))
+
+        records = run_evaluation(
+            items, client, ["model-a"], [DEFAULT_PROMPT_VARIANT], ResponseCache()
+        )
+
+        assert records[0].reference_aligned is True
+        assert records[0].accepted == 0
@@ -0,0 +1,202 @@
+import re
+
+import pytest
+from unittest.mock import MagicMock
+
+from src.lib.llm_tools import BatchTranslationAssessment, TranslationAssessment
+from src.tasks.packing import (
+    DocumentPacker,
+    pack_for_assessment,
+    pack_for_translation,
+    unpack_assessment,
+    unpack_translation,
+)
+from src.tasks.translate import Document, MissingTranslationSource
+
+
+def upper_case_html(content):
+    """Upper-cases text outside of tags, like a translation that keeps markup intact."""
+    return re.sub(r"(^|>)([^<]*)", lambda m: m.group(1) + m.group(2).upper(), content)
+
+
+@pytest.fixture
+def translate_client():
+    client = MagicMock()
+
+    def translate_document(**kwargs):
+        content = kwargs["Document"]["Content"].decode("utf-8")
+        return {"TranslatedDocument": {"Content": upper_case_html(content).encode("utf-8")}}
+
+    client.translate_document.side_effect = translate_document
+    return client
+
+
+def tool_response(name, tool_input):
+    return {
+        "stopReason": "tool_use",
+        "output": {
+            "message": {
+                "content": [{"toolUse": {"toolUseId": "1", "name": name, "input": tool_input}}]
+            }
+        },
+    }
+
+
+def improvement(excerpt):
+    return {
+        "excerpt": excerpt,
+        "replacement": excerpt.upper(),
+        "severity": "MINOR",
+        "rationale": "because",
+        "confidence": 7,
+    }
+
+
+@pytest.fixture
+def bedrock_client():
+    """Assesses each document with one improvement for its first word."""
+    client = MagicMock()
+
+    def converse(**kwargs):
+        text = kwargs["messages"][0]["content"][0]["text"]
+        tool_name = kwargs["toolConfig"]["tools"][0]["toolSpec"]["name"]
+        if tool_name == TranslationAssessment.NAME:
+            return tool_response(
+                tool_name, {"quality_assessments": ["single"], "improvements": [improvement(text.split()[0])]}
+            )
+        documents = re.findall(r'<document id="(\d+)">\n(.*?)\n</document>', text, re.DOTALL)
+        return tool_response(
+            tool_name,
+            {
+                "assessments": [
+                    {
+                        "document_id": document_id,
+                        "quality_assessments": ["batched"],
+                        "improvements": [improvement(body.split()[0])],
+                    }
+                    for document_id, body in documents
+                ]
+            },
+        )
+
+    client.converse.side_effect = converse
+    return client
+
+
+class TestPackedTranslationFormat:
+    def test_round_trip(self):
+        texts = ["Hi & bye", "two\nlines", "  padded\n"]
+        packed = pack_for_translation(texts)
+
+        assert unpack_translation(packed, texts) == texts
+        assert unpack_translation(upper_case_html(packed), texts) == ["HI & BYE", "TWO\nLINES", "  PADDED\n"]
+
+    def test_invalid_items(self):
+        """
+        Items that are missing, duplicated or lost line breaks should not be split out
+        """
+        texts = ["one", "two", "three\nfour", "five"]
+        translated = (
+            '<div data-item="0">uno</div>'
+            '<div data-item="1">dos</div><div data-item="1">dos</div>'
+            '<div data-item="2">tres cuatro</div>'
+        )
+
+        assert unpack_translation(translated, texts) == ["uno", None, None, None]
+
+
+class TestPackedAssessmentFormat:
+    def test_misattributed_excerpts_are_rejected(self):
+        texts = ["hola amigo", "adios amigo", "buenas noches"]
+        batch = BatchTranslationAssessment.model_validate(
+            {
+                "assessments": [
+                    {"document_id": "0", "quality_assessments": [], "improvements": [improvement("hola")]},
+                    {"document_id": "1", "quality_assessments": [], "improvements": [improvement("hola")]},
+                ]
+            }
+        )
+
+        assert "<document id=\"2\">\nbuenas noches\n</document>" in pack_for_assessment(texts)
+        first, second, third = unpack_assessment(batch, texts)
+        assert first.improvements[0].excerpt == "hola"
+        assert second is None
+        assert third is None
+
+
+class TestDocumentPacker:
+    def test_packs_short_documents(self, translate_client, bedrock_client):
+        """
+        Short messages should share requests, cutting the request count by an order of magnitude
+        """
+        documents = [Document(content=f"reminder {i}: bring your ID", language="en") for i in range(100)]
+        packer = DocumentPacker(max_pack_items=50)
+
+        translated = packer.translate(documents, translate_client, "es")
+        assessments = packer.assess(translated, bedrock_client)
+
+        assert [d.content for d in translated] == [d.content.upper() for d in documents]
+        assert all(d.translation_source is s for d, s in zip(translated, documents))
+        assert translate_client.translate_document.call_count == 2
+        assert bedrock_client.converse.call_count == 2
+        assert all(a.quality_assessments == ["batched"] for a in assessments)
+        assert assessments[7].improvements[0].excerpt == "REMINDER"
+        stats = packer.stats()
+        assert stats.documents == 200
+        assert stats.packed_requests == 4
+        assert stats.requests_saved == 196
+
+    def test_long_and_structured_documents_are_sent_individually(self, translate_client):
+        documents = [
+            Document(content="short", language="en"),
+            Document(content="long " * 200, language="en"),
+            Document(content="<p>markup</p>", language="en", mime_type="text/html"),
+            Document(content="also short", language="en"),
+        ]
+        packer = DocumentPacker(max_item_chars=100)
+
+        translated = packer.translate(documents, translate_client, "es")
+
+        assert [d.content for d in translated][0::3] == ["SHORT", "ALSO SHORT"]
+        assert translated[2].content == "<p>MARKUP</p>"
+        assert translate_client.translate_document.call_count == 3
+        assert packer.stats().individual_requests == 2
+
+    def test_failed_split_falls_back_to_individual_requests(self, translate_client):
+        def drop_first_item(**kwargs):
+            content = kwargs["Document"]["Content"].decode("utf-8")
+            content = re.sub(r'<div data-item="0">.*?</div>', "", content)
+            return {"TranslatedDocument": {"Content": upper_case_html(content).encode("utf-8")}}
+
+        translate_client.translate_document.side_effect = drop_first_item
+        documents = [Document(content=text, language="en") for text in ("one", "two", "three")]
+        packer = DocumentPacker()
+
+        translated = packer.translate(documents, translate_client, "es")
+
+        # the individual request has no data-item element to drop
+        assert [d.content for d in translated] == ["ONE", "TWO", "THREE"]
+        assert packer.stats().fallbacks == 1
+        assert translate_client.translate_document.call_count == 2
+
+    def test_failed_packed_request_falls_back(self, bedrock_client):
+        source = Document(content="x", language="en")
+        documents = [
+            Document(content=text, language="es", translation_source=source) for text in ("uno", "dos")
+        ]
+        calls = bedrock_client.converse.side_effect
+        bedrock_client.converse.side_effect = lambda **kwargs: (
+            {"stopReason": "end_turn", "output": {"message": {"content": [{"text": "no"}]}}}
+            if kwargs["toolConfig"]["tools"][0]["toolSpec"]["name"] == BatchTranslationAssessment.NAME
+            else calls(**kwargs)
+        )
+        packer = DocumentPacker()
+
+        assessments = packer.assess(documents, bedrock_client)
+
+        assert [a.quality_assessments for a in assessments] == [["single"], ["single"]]
+        assert packer.stats().fallbacks == 2
+
+    def test_assess_requires_translation_source(self, bedrock_client):
+        with pytest.raises(MissingTranslationSource):
+            DocumentPacker().assess([Document(content="hola", language="es")], bedrock_client)
@@ -0,0 +1,205 @@
+import datetime
+import time
+
+import pytest
+
+from src.tasks.simulate import (
+    NoTimings,
+    PipelineTiming,
+    SimulationSettings,
+    StageModel,
+    StageTiming,
+    TimingRecorder,
+    append_timings,
+    fit_stage_models,
+    format_simulation_table,
+    load_timings,
+    simulate,
+)
+
+
+def timing(chars, nmt_s, assessment_s):
+    return PipelineTiming(
+        document=f"doc-{chars}",
+        mime_type="text/plain",
+        source_chars=chars,
+        created_at=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc),
+        stages=[
+            StageTiming(name="nmt", wall_s=nmt_s, requests={"translate": 1}),
+            StageTiming(name="assessment", wall_s=assessment_s, requests={"bedrock": 1}),
+            StageTiming(name="apply_improvements", wall_s=0.01),
+        ],
+    )
+
+
+TIMINGS = [
+    timing(1000, 0.6, 5.0),
+    timing(2000, 0.7, 6.1),
+    timing(4000, 0.9, 7.9),
+    timing(8000, 1.3, 12.0),
+]
+
+
+class TestTimingRecorder:
+    def test_records_stages_and_requests(self, tmp_path):
+        requests = {"translate": 1}
+        recorder = TimingRecorder(request_counter=lambda: requests)
+
+        with recorder.stage("nmt"):
+            requests["translate"] += 2
+            time.sleep(0.01)
+        with recorder.stage("verify"):
+            requests["translate"] += 1
+            requests["bedrock"] = 1
+        with recorder.stage("apply_improvements"):
+            pass
+        recorded = recorder.timing("source.txt", "text/plain", 42)
+
+        assert [(s.name, s.requests) for s in recorded.stages] == [
+            ("nmt", {"translate": 2}),
+            ("verify", {"translate": 1, "bedrock": 1}),
+            ("apply_improvements", {}),
+        ]
+        assert recorded.stages[0].wall_s >= 0.01
+
+        path = tmp_path.joinpath("timings.jsonl")
+        append_timings(path, [recorded])
+        append_timings(path, [recorded])
+        assert load_timings(path) == [recorded, recorded]
+
+
+class TestStageModel:
+    def test_latency_grows_with_document_size(self):
+        model = StageModel.fit("assessment", [(t.source_chars, t.stages[1]) for t in TIMINGS])
+
+        assert model.requests == {"bedrock": 1}
+        assert model.slope > 0
+        assert model.intercept == pytest.approx(4.0, abs=0.5)
+
+    def test_constant_sizes_fall_back_to_mean(self):
+        samples = [(1000, StageTiming(name="local", wall_s=s)) for s in (1.0, 2.0, 3.0)]
+
+        model = StageModel.fit("local", samples)
+
+        assert model.requests == {}
+        assert (model.intercept, model.slope) == (2.0, 0.0)
+        assert sorted(model.residuals) == [0.5, 1.0, 1.5]
+
+    def test_stages_are_fitted_in_pipeline_order(self):
+        first = TIMINGS[0].model_copy(update={"stages": TIMINGS[0].stages[1:]})
+
+        models = fit_stage_models([first, *TIMINGS[1:]])
+
+        assert [m.name for m in models] == ["nmt", "assessment", "apply_improvements"]
+
+    def test_requires_timings(self):
+        with pytest.raises(NoTimings):
+            fit_stage_models([])
+
+
+class TestSimulate:
+    def test_light_load(self):
+        """
+        Below capacity, documents should not queue and latency should be the sum of the stages
+        """
+        (result,) = simulate(
+            TIMINGS, [SimulationSettings(arrival_rate_per_min=2, duration_min=30)]
+        )
+
+        assert result.failed == 0
+        assert result.completed == result.arrived
+        assert result.throughput_per_min == pytest.approx(2, rel=0.3)
+        assert result.queue_depth_mean < 0.1
+        assert 5 < result.latency_p50_s < 15
+        assert result.services["bedrock"].throttled == 0
+
+    def test_overload_builds_a_queue(self):
+        light, heavy = simulate(
+            TIMINGS,
+            [
+                SimulationSettings(arrival_rate_per_min=60, duration_min=30, workers=64),
+                SimulationSettings(arrival_rate_per_min=60, duration_min=30, workers=2),
+            ],
+            document_sizes=[(1000, 3), (8000, 1)],
+        )
+
+        assert heavy.throughput_per_min < light.throughput_per_min
+        assert heavy.queue_depth_mean > 10 * max(light.queue_depth_mean, 1)
+        assert heavy.backlog_at_end > light.backlog_at_end
+        assert heavy.latency_p95_s > 10 * light.latency_p95_s
+
+    def test_quotas_throttle(self):
+        unlimited, limited = simulate(
+            TIMINGS,
+            [
+                SimulationSettings(arrival_rate_per_min=60, duration_min=10, workers=64),
+                SimulationSettings(
+                    arrival_rate_per_min=60, duration_min=10, workers=64, bedrock_rpm=20
+                ),
+            ],
+        )
+
+        assert unlimited.services["bedrock"].throttled == 0
+        assert limited.services["bedrock"].throttle_rate > 0.5
+        assert limited.failed > 0
+        assert limited.services["translate"].throttled == 0
+
+    def test_cache_hits_skip_stages(self):
+        (result,) = simulate(
+            TIMINGS,
+            [
+                SimulationSettings(
+                    arrival_rate_per_min=30,
+                    duration_min=10,
+                    cache_hit_rates={"nmt": 1.0, "assessment": 0.5},
+                )
+            ],
+        )
+
+        assert result.services["translate"].requests == 0
+        assert result.services["bedrock"].requests == pytest.approx(result.arrived / 2, rel=0.2)
+
+    def test_requests_count_against_each_service(self):
+        """
+        A stage that calls both services, e.g. verification with re-assessment, should load both
+        """
+        timings = [
+            t.model_copy(
+                update={
+                    "stages": [
+                        *t.stages,
+                        StageTiming(name="verify", wall_s=2.0, requests={"translate": 2, "bedrock": 1}),
+                    ]
+                }
+            )
+            for t in TIMINGS
+        ]
+
+        (result,) = simulate(
+            timings,
+            [SimulationSettings(arrival_rate_per_min=10, duration_min=10, cache_hit_rates={"nmt": 1.0})],
+        )
+
+        assert result.failed == 0
+        assert result.services["translate"].requests == 2 * result.completed
+        assert result.services["bedrock"].requests == 2 * result.completed
+
+    def test_is_deterministic(self):
+        settings = [SimulationSettings(arrival_rate_per_min=20, duration_min=10, seed=7)]
+
+        assert simulate(TIMINGS, settings) == simulate(TIMINGS, settings)
+
+    def test_format_table(self):
+        results = simulate(
+            TIMINGS,
+            [
+                SimulationSettings(arrival_rate_per_min=10, duration_min=5, bedrock_tpm=100_000),
+                SimulationSettings(arrival_rate_per_min=10, duration_min=5, workers=2),
+            ],
+        )
+
+        lines = format_simulation_table(results).splitlines()
+
+        assert len(lines) == 4
+        assert "p95 latency (s)" in lines[0]
+        assert "| 100000 |" in lines[2]
@@ -0,0 +1,346 @@
+import tracemalloc
+
+import pytest
+from unittest.mock import MagicMock
+
+from src.lib.llm_tools import TranslationAssessment, TranslationImprovement
+from src.lib.structured_documents import HTML, MARKDOWN
+from src.tasks.translate import (
+    Document,
+    FileDocument,
+    MissingContent,
+    MissingTranslationSource,
+    apply_assessment_improvements,
+    iter_text_chunks,
+)
+from src.translation_services.token_budget import TokenEstimator
+
+
+def make_assessment(*pairs):
+    return TranslationAssessment(
+        quality_assessments=[],
+        improvements=[
+            TranslationImprovement(
+                excerpt=excerpt,
+                replacement=replacement,
+                severity="MINOR",
+                rationale="because",
+                confidence=7,
+            )
+            for excerpt, replacement in pairs
+        ],
+    )
+
+
+@pytest.fixture
+def translate_client():
+    """A stub Translate client that upper-cases text outside of no-translate spans."""
+    client = MagicMock()
+
+    def translate_document(**kwargs):
+        content = kwargs["Document"]["Content"].decode("utf-8")
+        translated = []
+        for i, chunk in enumerate(content.split('<span translate="no">')):
+            if i:
+                kept, _, rest = chunk.partition("</span>")
+                translated.append(f'<span translate="no">{kept}</span>{rest.upper()}')
+            else:
+                translated.append(chunk.upper())
+        return {"TranslatedDocument": {"Content": "".join(translated).encode("utf-8")}}
+
+    client.translate_document.side_effect = translate_document
+    return client
+
+
+class TestDocument:
+    def test_translate_plain_text(self, translate_client):
+        document = Document(content="hello", language="en")
+
+        translated = document.translate(translate_client, "es")
+
+        assert translated.content == "HELLO"
+        assert translated.translation_source is document
+        assert translated.mime_type == document.mime_type
+
+    def test_translate_blank(self, translate_client):
+        with pytest.raises(MissingContent):
+            Document(content="  ", language="en").translate(translate_client, "es")
+
+    def test_assess_without_source(self):
+        with pytest.raises(MissingTranslationSource):
+            Document(content="hola", language="es").get_assessment(MagicMock())
+
+    def test_translate_markdown(self, translate_client):
+        """
+        Markup and placeholders should be kept, and unique segments translated once, in one request
+        """
+        document = Document(
+            content="# notice\n\nhi {{name}}\n\n| call us | call us |\n|---|---|\n",
+            language="en",
+            mime_type=MARKDOWN,
+        )
+
+        translated = document.translate(translate_client, "es")
+
+        assert translated.content == "# NOTICE\n\nHI {{name}}\n\n| CALL US | CALL US |\n|---|---|\n"
+        assert translate_client.translate_document.call_count == 1
+        assert translated.mime_type == MARKDOWN
+
+    def test_assessment_uses_prose_only(self):
+        """
+        Structured documents should be assessed without their markup
+        """
+        client = MagicMock()
+        client.converse.return_value = {
+            "stopReason": "tool_use",
+            "output": {
+                "message": {
+                    "content": [
+                        {
+                            "toolUse": {
+                                "toolUseId": "1",
+                                "name": TranslationAssessment.NAME,
+                                "input": {"quality_assessments": [], "improvements": []},
+                            }
+                        }
+                    ]
+                }
+            },
+        }
+        source = Document(content="<p>Hi</p>", language="en", mime_type=HTML)
+        document = Document(
+            content="<p>Hola &amp; <b>adiós</b></p><p>Hola &amp; <b>adiós</b></p>",
+            language="es",
+            translation_source=source,
+            mime_type=HTML,
+        )
+
+        document.get_assessment(client)
+
+        user_text = client.converse.call_args[1]["messages"][0]["content"][0]["text"]
+        assert user_text == "Hola & adiós"
+
+
+class TestApplyAssessmentImprovements:
+    def test_plain_text(self):
+        result = apply_assessment_improvements("a b a", make_assessment(("a", "c")))
+
+        assert result == "c b c"
+
+    def test_html_does_not_touch_markup(self):
+        """
+        Improvements should only be applied to segments, with HTML escaping respected
+        """
+        result = apply_assessment_improvements(
+            '<p class="p">Tom & Jerry</p><p>p</p>',
+            make_assessment(("Tom & Jerry", "Tom y Jerry"), ("p", "q")),
+            mime_type=HTML,
+        )
+
+        assert result == '<p class="p">Tom y Jerry</p><p>q</p>'
+
+    def test_html_improvements_are_applied_once(self):
+        result = apply_assessment_improvements(
+            "<p>Presente su solicitud hoy</p>",
+            make_assessment(("su solicitud", "su solicitud de UI")),
+            mime_type=HTML,
+        )
+
+        assert result == "<p>Presente su solicitud de UI hoy</p>"
+
+    def test_html_replacements_are_escaped(self):
+        result = apply_assessment_improvements(
+            "<p>Tom y Jerry</p>",
+            make_assessment(("Tom y Jerry", "Tom & Jerry <3")),
+            mime_type=HTML,
+        )
+
+        assert result == "<p>Tom &amp; Jerry &lt;3</p>"
+
+
+class UpperCaseTranslateClient:
+    """A Translate client stub that keeps no references to requests."""
+
+    class exceptions:
+        ClientError = Exception
+
+    def __init__(self):
+        self.calls = 0
+
+    def translate_document(self, **kwargs):
+        self.calls += 1
+        content = kwargs["Document"]["Content"].decode("utf-8")
+        return {"TranslatedDocument": {"Content": content.upper().encode("utf-8")}}
+
+
+class TestIterTextChunks:
+    @pytest.mark.parametrize("read_size", [3, 7, 1000])
+    def test_chunks_reproduce_file(self, tmp_path, read_size):
+        """
+        Chunks should respect the size limit, prefer paragraph breaks, and join back exactly
+        """
+        text = "first paragraph here\n\nsecond one\nwith lines\r\n\nx" + "y" * 30
+        path = tmp_path.joinpath("doc.txt")
+        path.write_text(text, newline="")
+
+        with open(path, newline="") as fh:
+            chunks = list(iter_text_chunks(fh, max_chars=25, read_size=read_size))
+
+        assert "".join(chunks) == text
+        assert all(len(c) <= 25 for c in chunks)
+        assert chunks[0] == "first paragraph here\n\n"
+
+    def test_invalid_size(self, tmp_path):
+        with pytest.raises(ValueError):
+            list(iter_text_chunks(open(tmp_path.joinpath("x.txt"), "w+"), max_chars=0))
+
+
+class TestFileDocument:
+    def test_streamed_pipeline(self, tmp_path):
+        source_path = tmp_path.joinpath("source.txt")
+        source_path.write_text("hola amigo\n\nadios amigo\n")
+        source = FileDocument(source_path, language="en", chunk_chars=12)
+        client = UpperCaseTranslateClient()
+
+        translated = source.translate_to_file(client, "es", tmp_path.joinpath("es", "translation.txt"))
+
+        assert translated.content == "HOLA AMIGO\n\nADIOS AMIGO\n"
+        assert translated.translation_source is source
+        assert client.calls == 2
+
+        applied = translated.apply_improvements_to_file(
+            make_assessment(("AMIGO", "AMIGA")), tmp_path.joinpath("applied.txt")
+        )
+        assert applied.content == "HOLA AMIGA\n\nADIOS AMIGA\n"
+
+    def test_chunk_whitespace_is_kept(self, tmp_path):
+        """
+        Paragraph breaks at chunk boundaries should survive a translator that trims whitespace
+        """
+        source_path = tmp_path.joinpath("source.txt")
+        source_path.write_text("\nhola amigo\n\nadios amigo\n")
+        client = MagicMock()
+        client.translate_document.side_effect = lambda **kwargs: {
+            "TranslatedDocument": {"Content": kwargs["Document"]["Content"].decode("utf-8").strip().upper().encode("utf-8")}
+        }
+
+        translated = FileDocument(source_path, language="en", chunk_chars=12).translate_to_file(
+            client, "es", tmp_path.joinpath("translation.txt")
+        )
+
+        assert translated.content == "\nHOLA AMIGO\n\nADIOS AMIGO\n"
+        sent = [c.kwargs["Document"]["Content"].decode("utf-8") for c in client.translate_document.call_args_list]
+        assert len(sent) > 1
+        assert all(text == text.strip() for text in sent)
+
+    def test_chunked_assessment(self, tmp_path):
+        """
+        Large documents should be assessed chunk by chunk, and the results merged
+        """
+        path = tmp_path.joinpath("translation.txt")
+        path.write_text("uno\n\ndos\n")
+        document = FileDocument(
+            path,
+            language="es",
+            translation_source=Document(content="x", language="en"),
+            chunk_chars=5,
+        )
+        client = MagicMock()
+        client.converse.side_effect = lambda **kwargs: {
+            "stopReason": "tool_use",
+            "output": {
+                "message": {
+                    "content": [
+                        {
+                            "toolUse": {
+                                "toolUseId": "1",
+                                "name": TranslationAssessment.NAME,
+                                "input": {
+                                    "quality_assessments": ["ok"],
+                                    "improvements": [
+                                        {
+                                            "excerpt": kwargs["messages"][0]["content"][0]["text"].strip(),
+                                            "replacement": "X",
+                                            "severity": "MINOR",
+                                            "rationale": "r",
+                                            "confidence": 5,
+                                        }
+                                    ],
+                                },
+                            }
+                        }
+                    ]
+                }
+            },
+        }
+
+        assessment = document.get_assessment(client)
+
+        assert client.converse.call_count == 2
+        assert assessment.quality_assessments == ["ok"]
+        assert [i.excerpt for i in assessment.improvements] == ["uno", "dos"]
+
+    def test_peak_memory_is_bounded(self, tmp_path):
+        """
+        Peak memory of a streamed translation should not grow with document size
+        """
+        paragraph = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 20) + "\n\n"
+        source_path = tmp_path.joinpath("source.txt")
+        with open(source_path, "w") as fh:
+            for _ in range(8 * 1024 * 1024 // len(paragraph)):  # ~8 MiB
+                fh.write(paragraph)
+        source = FileDocument(source_path, language="en")
+        output_path = tmp_path.joinpath("translation.txt")
+
+        tracemalloc.start()
+        try:
+            translated = source.translate_to_file(UpperCaseTranslateClient(), "es", output_path)
+            translated.apply_improvements_to_file(
+                make_assessment(("LOREM", "lorem")), tmp_path.joinpath("applied.txt")
+            )
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert source_path.stat().st_size > 8_000_000
+        assert output_path.stat().st_size == source_path.stat().st_size
+        assert peak < 2 * 1024 * 1024
+
+
+class TestTokenBudgetRouting:
+    def test_oversize_document_is_assessed_in_chunks(self):
+        """
+        Documents estimated to exceed the input budget should be split instead of sent whole
+        """
+        client = MagicMock()
+        client.converse.side_effect = lambda **kwargs: {
+            "stopReason": "tool_use",
+            "output": {
+                "message": {
+                    "content": [
+                        {
+                            "toolUse": {
+                                "toolUseId": "1",
+                                "name": TranslationAssessment.NAME,
+                                "input": {"quality_assessments": ["ok"], "improvements": []},
+                            }
+                        }
+                    ]
+                }
+            },
+        }
+        paragraph = "Presente su solicitud antes de la fecha límite. " * 40
+        document = Document(
+            content="\n\n".join([paragraph] * 6),
+            language="es",
+            translation_source=Document(content="x", language="en"),
+        )
+
+        assessment = document.get_assessment(
+            client, token_estimator=TokenEstimator(context_window=4000, max_output_tokens=1024)
+        )
+
+        assert client.converse.call_count > 1
+        assert assessment.quality_assessments == ["ok"]
+        for call in client.converse.call_args_list:
+            assert len(call[1]["messages"][0]["content"][0]["text"]) < len(document.content)
@@ -0,0 +1,267 @@
+import threading
+
+import pytest
+from unittest.mock import MagicMock
+
+from src.lib import structured_documents
+from src.lib.llm_tools import TranslationAssessment, TranslationImprovement
+from src.tasks.translate import Document, FileDocument, MissingTranslationSource
+from src.tasks.verify import BackTranslator, chrf, verify_translation
+from src.translation_services.providers import TranslationProvider
+
+SOURCE = "Submit your claim before Friday.\n\nIt is a piece of cake."
+NMT = "Presente su reclamo antes del viernes.\n\nEs pan comido."
+
+BACK_TRANSLATIONS = {
+    "Presente su reclamo antes del viernes.": "Submit your claim before Friday.",
+    "Presente su solicitud antes del viernes.": "Submit your application before Friday.",
+    "Presente su queja el lunes.": "File your complaint on Monday.",
+    "Presente su reclamo antes del viernes, por favor.": "Submit your claim before Friday, please.",
+    "Es pan comido.": "It is a piece of cake.",
+    "Es pastel.": "It is cake.",
+}
+
+
+def improvement(excerpt, replacement):
+    return TranslationImprovement(
+        excerpt=excerpt, replacement=replacement, severity="MINOR", rationale="because", confidence=7
+    )
+
+
+@pytest.fixture
+def translate_client():
+    client = MagicMock()
+
+    def translate_document(**kwargs):
+        text = kwargs["Document"]["Content"].decode("utf-8")
+        return {"TranslatedDocument": {"Content": BACK_TRANSLATIONS[text].encode("utf-8")}}
+
+    client.translate_document.side_effect = translate_document
+    return client
+
+
+def documents(improved_content, mime_type=structured_documents.PLAIN_TEXT, source=SOURCE, nmt=NMT):
+    source_document = Document(content=source, language="en", mime_type=mime_type)
+    nmt_document = Document(
+        content=nmt, language="es", translation_source=source_document, mime_type=mime_type
+    )
+    improved = Document(
+        content=improved_content,
+        language="es",
+        translation_source=source_document,
+        mime_type=mime_type,
+    )
+    return nmt_document, improved
+
+
+class StubAssessor(TranslationProvider):
+    def __init__(self, assessment, barrier=None):
+        super().__init__("stub")
+        self.assessment = assessment
+        self.barrier = barrier
+        self.assessed = []
+
+    def _translate(self, text, source_language, target_language, mime_type):
+        return text
+
+    def _assess(self, translated_text, source_language, target_language, content_type):
+        if self.barrier is not None:
+            self.barrier.wait()
+        self.assessed.append(translated_text)
+        if isinstance(self.assessment, Exception):
+            raise self.assessment
+        return self.assessment
+
+
+class TestChrf:
+    def test_scores(self):
+        assert chrf("Submit your claim", "submit  your claim") == 1.0
+        assert chrf("", "") == 1.0
+        assert chrf("xyz", "abc") == 0.0
+        close = chrf("Submit your claim before Friday, please.", SOURCE.split("\n")[0])
+        far = chrf("File your complaint on Monday.", SOURCE.split("\n")[0])
+        assert 0.8 < close < 1
+        assert far < 0.35
+
+
+class TestVerifyTranslation:
+    def test_only_changed_segments_are_verified(self, translate_client):
+        nmt, improved = documents("Presente su queja el lunes.\n\nEs pan comido.")
+
+        verified, report = verify_translation(nmt, improved, translate_client)
+
+        assert verified is improved
+        assert report.aligned
+        assert (report.segments, report.unchanged, report.verified, report.flagged) == (2, 1, 1, 1)
+        assert report.results[0].back_translation == "File your complaint on Monday."
+        assert translate_client.translate_document.call_count == 1
+        call = translate_client.translate_document.call_args[1]
+        assert (call["SourceLanguageCode"], call["TargetLanguageCode"]) == ("es", "en")
+
+    def test_good_changes_are_not_flagged(self, translate_client):
+        nmt, improved = documents("Presente su reclamo antes del viernes, por favor.\n\nEs pan comido.")
+
+        _, report = verify_translation(nmt, improved, translate_client)
+
+        assert report.flagged == 0
+        assert report.results[0].score > 0.8
+
+    def test_flagged_segments_are_reassessed(self, translate_client):
+        """
+        A flagged segment should be replaced when its re-assessed version scores higher
+        """
+        # each re-assessment waits for the other, so they only complete if they overlap
+        barrier = threading.Barrier(2, timeout=5)
+        assessor = StubAssessor(
+            TranslationAssessment(
+                quality_assessments=[],
+                improvements=[improvement("viernes.", "viernes, por favor.")],
+            ),
+            barrier=barrier,
+        )
+        nmt, improved = documents("Presente su queja el lunes.\n\nEs pastel.")
+
+        verified, report = verify_translation(nmt, improved, translate_client, assessor=assessor)
+
+        assert not barrier.broken
+        assert report.errors == 0
+        assert report.flagged == 2
+        assert report.reassessed == 2
+        assert report.replaced == 2
+        assert sorted(assessor.assessed) == sorted(NMT.split("\n\n"))
+        # the re-assessment suggested nothing for the second segment, so the bad replacement is reverted
+        assert verified.content == "Presente su reclamo antes del viernes, por favor.\n\nEs pan comido."
+        assert report.results[1].reassessed_translation == "Es pan comido."
+
+    def test_failures_keep_segments_unverified(self, translate_client):
+        """
+        A failed back-translation or re-assessment should be reported without failing the whole verification
+        """
+        back_translate = translate_client.translate_document.side_effect
+
+        def translate_document(**kwargs):
+            if kwargs["Document"]["Content"] == "Es pastel.".encode("utf-8"):
+                raise RuntimeError("throttled")
+            return back_translate(**kwargs)
+
+        translate_client.translate_document.side_effect = translate_document
+        translate_client.exceptions.ClientError = RuntimeError
+        assessor = StubAssessor(RuntimeError("model unavailable"))
+        improved_content = "Presente su queja el lunes.\n\nEs pastel."
+        nmt, improved = documents(improved_content)
+
+        verified, report = verify_translation(nmt, improved, translate_client, assessor=assessor)
+
+        assert verified.content == improved_content
+        assert (report.verified, report.flagged, report.replaced, report.errors) == (1, 1, 0, 2)
+        assert report.results[0].error == "re-assessment failed: model unavailable"
+        assert report.results[1].score is None
+        assert report.results[1].error == "back-translation failed: throttled"
+
+    def test_structured_documents(self, translate_client):
+        nmt, improved = documents(
+            "<p>Presente su reclamo antes del viernes.</p><p><b>Es pastel.</b></p>",
+            mime_type=structured_documents.HTML,
+            source="<p>Submit your claim before Friday.</p><p><b>It is a piece of cake.</b></p>",
+            nmt="<p>Presente su reclamo antes del viernes.</p><p><b>Es pan comido.</b></p>",
+        )
+
+        _, report = verify_translation(nmt, improved, translate_client)
+
+        assert report.verified == 1
+        assert report.results[0].translation == "Es pastel."
+        assert report.results[0].source == "It is a piece of cake."
+
+    def test_unaligned_documents_are_compared_whole(self, translate_client):
+        translate_client.translate_document.side_effect = lambda **kwargs: {
+            "TranslatedDocument": {"Content": SOURCE.encode("utf-8")}
+        }
+        nmt, improved = documents(NMT, source=SOURCE.replace("\n\n", " "))
+
+        _, report = verify_translation(nmt, improved, translate_client)
+
+        assert not report.aligned
+        assert report.verified == 1
+        assert report.flagged == 0
+
+    def test_requires_translation_source(self, translate_client):
+        document = Document(content=NMT, language="es")
+
+        with pytest.raises(MissingTranslationSource):
+            verify_translation(document, document, translate_client)
+
+
+class ChunkAssessor(TranslationProvider):
+    """Assesses chunks with the assessment for the first key found in them."""
+
+    def __init__(self, assessments, wait_for=None):
+        super().__init__("chunks")
+        self.assessments = assessments
+        self.wait_for = wait_for
+
+    def _translate(self, text, source_language, target_language, mime_type):
+        return text
+
+    def _assess(self, translated_text, source_language, target_language, content_type):
+        for key, assessment in self.assessments.items():
+            if key in translated_text:
+                if self.wait_for is not None and key in self.wait_for:
+                    assert self.wait_for[key].wait(timeout=5)
+                return assessment
+        return TranslationAssessment(quality_assessments=[], improvements=[])
+
+
+class TestBackTranslator:
+    def test_back_translation_overlaps_assessment(self, tmp_path, translate_client):
+        """
+        Segments changed by one chunk should be back-translated while the next chunk is assessed
+        """
+        back_translated = threading.Event()
+        back_translate = translate_client.translate_document.side_effect
+
+        def translate_document(**kwargs):
+            result = back_translate(**kwargs)
+            back_translated.set()
+            return result
+
+        translate_client.translate_document.side_effect = translate_document
+        path = tmp_path.joinpath("translation.txt")
+        path.write_text(NMT)
+        nmt = FileDocument(
+            path,
+            language="es",
+            translation_source=Document(content=SOURCE, language="en"),
+            chunk_chars=45,
+        )
+        assessor = ChunkAssessor(
+            {
+                "reclamo": TranslationAssessment(
+                    quality_assessments=[],
+                    improvements=[improvement("reclamo antes del viernes.", "queja el lunes.")],
+                ),
+                # the second chunk is only assessed once the first chunk's change is back-translated
+                "pan comido": TranslationAssessment(
+                    quality_assessments=[], improvements=[improvement("pan comido", "pastel")]
+                ),
+            },
+            wait_for={"pan comido": back_translated},
+        )
+        back_translator = BackTranslator(translate_client, nmt)
+        try:
+            assessment = nmt.get_assessment(assessor, on_assessed=back_translator.submit_changes)
+            improved = Document(
+                content=nmt.get_improved_content_from_assessment(assessment),
+                language="es",
+                translation_source=nmt.translation_source,
+            )
+
+            _, report = verify_translation(
+                nmt, improved, translate_client, back_translator=back_translator
+            )
+        finally:
+            back_translator.shutdown()
+
+        assert improved.content == "Presente su queja el lunes.\n\nEs pastel."
+        assert (report.verified, report.flagged) == (2, 2)
+        # both segments were back-translated during assessment, and not again when verifying
+        assert translate_client.translate_document.call_count == 2
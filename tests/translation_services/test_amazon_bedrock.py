@@ -0,0 +1,284 @@
+import string
+import time
+
+import pydantic
+import pytest
+from unittest.mock import MagicMock
+
+from src.lib.llm_tools import TranslationAssessment
+from src.translation_services.amazon_bedrock import (
+    DEFAULT_MODEL_ID,
+    PartialToolResponse,
+    UnexpectedBedrockResponse,
+    _parse_conversation_response_with_tool,
+    format_prompt,
+    suggest_translation_refinements,
+)
+from src.translation_services.hedging import HedgingPolicy
+
+
+def make_tool_response(tool_input, stop_reason="tool_use"):
+    return {
+        "stopReason": stop_reason,
+        "output": {
+            "message": {
+                "role": "assistant",
+                "content": [
+                    {
+                        "toolUse": {
+                            "toolUseId": "tooluse-1",
+                            "name": TranslationAssessment.NAME,
+                            "input": tool_input,
+                        }
+                    }
+                ],
+            }
+        },
+        "usage": {"inputTokens": 100, "outputTokens": 50, "totalTokens": 150},
+    }
+
+
+class MockBedrockClient:
+    def __init__(self):
+        self.converse = MagicMock()
+        self.exceptions = MagicMock()
+        self.exceptions.ClientError = Exception
+
+
+@pytest.fixture
+def valid_input():
+    return {
+        "quality_assessments": ["Clear and accurate"],
+        "improvements": [
+            {
+                "excerpt": "solicitud",
+                "replacement": "reclamo",
+                "severity": "MINOR",
+                "rationale": "claims are not applications",
+                "confidence": 7,
+            }
+        ],
+    }
+
+
+@pytest.fixture
+def client():
+    return MockBedrockClient()
+
+
+def assess(client, **kwargs):
+    return suggest_translation_refinements(
+        client,
+        translated_text="Presente su solicitud.",
+        source_language="en",
+        target_language="es",
+        with_tool=TranslationAssessment,
+        **kwargs,
+    )
+
+
+class TestFormatPrompt:
+    def test_custom_template(self):
+        """
+        Custom templates should be substituted and followed by the tool instruction
+        """
+        prompt = format_prompt(
+            "en",
+            "es",
+            with_tool_name="my_tool",
+            prompt_template=string.Template("From $source_language_name to $target_language_name."),
+        )
+
+        assert prompt.startswith("From en to es. Use the my_tool tool")
+
+
+class TestSuggestTranslationRefinements:
+    def test_with_tool(self, client, valid_input):
+        """
+        Tool input should be parsed into the tool model using the default model
+        """
+        client.converse.return_value = make_tool_response(valid_input)
+
+        result = assess(client)
+
+        assert isinstance(result, TranslationAssessment)
+        assert result.improvements[0].replacement == "reclamo"
+        call_args = client.converse.call_args[1]
+        assert call_args["modelId"] == DEFAULT_MODEL_ID
+        assert call_args["inferenceConfig"]["temperature"] == 0.5
+        assert call_args["toolConfig"]["toolChoice"] == {
+            "tool": {"name": TranslationAssessment.NAME}
+        }
+
+    def test_without_tool(self, client):
+        client.converse.return_value = {
+            "stopReason": "end_turn",
+            "output": {"message": {"role": "assistant", "content": [{"text": "Looks fine"}]}},
+        }
+
+        result = suggest_translation_refinements(
+            client, "Hola", "en", "es", with_tool=None, model_id="other-model", temperature=0.9
+        )
+
+        assert result == "Looks fine"
+        assert client.converse.call_args[1]["modelId"] == "other-model"
+        assert client.converse.call_args[1]["inferenceConfig"]["temperature"] == 0.9
+
+    def test_invalid_stop_reason(self, client, valid_input):
+        client.converse.return_value = make_tool_response(valid_input, stop_reason="end_turn")
+
+        with pytest.raises(UnexpectedBedrockResponse):
+            assess(client)
+
+    def test_malformed_tool_input(self, client):
+        client.converse.return_value = make_tool_response({"improvements": "nope"})
+
+        with pytest.raises(pydantic.ValidationError):
+            assess(client)
+
+    def test_hedging_uses_first_valid_response(self, client, valid_input):
+        """
+        With hedging, a slow primary request should lose to a fast duplicate
+        """
+        responses = iter([make_tool_response(valid_input) for _ in range(4)])
+
+        def converse(**kwargs):
+            if client.converse.call_count == 4:
+                time.sleep(0.5)
+            return next(responses)
+
+        client.converse.side_effect = converse
+        hedging = HedgingPolicy(percentile=50, budget=1.0, min_samples=3)
+        for _ in range(3):
+            assess(client, hedging=hedging)
+
+        start = time.perf_counter()
+        result = assess(client, hedging=hedging)
+
+        assert isinstance(result, TranslationAssessment)
+        assert time.perf_counter() - start < 0.4
+        assert hedging.stats().hedge_wins == 1
+        hedging.shutdown()
+
+
+def make_improvement(excerpt, **overrides):
+    improvement = {
+        "excerpt": excerpt,
+        "replacement": excerpt.upper(),
+        "severity": "MINOR",
+        "rationale": "because",
+        "confidence": 7,
+    }
+    improvement.update(overrides)
+    return improvement
+
+
+class TestPartialResponses:
+    def test_salvage_invalid_items(self):
+        """
+        Individually valid improvements should be kept when another one is invalid
+        """
+        improvements = [make_improvement("uno"), make_improvement("dos"), make_improvement("tres")]
+        del improvements[1]["confidence"]
+        response = make_tool_response(
+            {"quality_assessments": ["ok"], "improvements": improvements}
+        )
+
+        with pytest.raises(PartialToolResponse) as exc_info:
+            _parse_conversation_response_with_tool(response, TranslationAssessment)
+
+        partial = exc_info.value.partial
+        assert [i.excerpt for i in partial.improvements] == ["uno", "tres"]
+        assert partial.quality_assessments == ["ok"]
+        assert exc_info.value.invalid_items[0]["item"]["excerpt"] == "dos"
+        assert exc_info.value.truncated is False
+
+    def test_salvage_truncated_input(self):
+        """
+        Truncated tool input missing whole fields should still be salvaged
+        """
+        response = make_tool_response(
+            {"improvements": [make_improvement("uno")]}, stop_reason="max_tokens"
+        )
+
+        with pytest.raises(PartialToolResponse) as exc_info:
+            _parse_conversation_response_with_tool(response, TranslationAssessment)
+
+        assert exc_info.value.truncated is True
+        assert exc_info.value.partial.quality_assessments == []
+
+    def test_truncated_without_tool_use(self):
+        response = make_tool_response({})
+        response["stopReason"] = "max_tokens"
+        response["output"]["message"]["content"] = [{"text": "I think"}]
+
+        with pytest.raises(UnexpectedBedrockResponse):
+            _parse_conversation_response_with_tool(response, TranslationAssessment)
+
+    def test_repair_requests_only_missing_items(self, client):
+        """
+        A truncated response should be completed with a follow-up request, and
+        the results merged
+        """
+        client.converse.side_effect = [
+            make_tool_response(
+                {"improvements": [make_improvement("uno")]}, stop_reason="max_tokens"
+            ),
+            make_tool_response(
+                {
+                    "quality_assessments": ["ok"],
+                    "improvements": [make_improvement("uno"), make_improvement("dos")],
+                }
+            ),
+        ]
+
+        result = assess(client)
+
+        assert [i.excerpt for i in result.improvements] == ["uno", "dos"]
+        assert result.quality_assessments == ["ok"]
+        repair_messages = client.converse.call_args_list[1][1]["messages"]
+        assert [m["role"] for m in repair_messages] == ["user", "assistant", "user"]
+        assert repair_messages[1]["content"][0]["toolUse"]["input"]["improvements"][0]["excerpt"] == "uno"
+        tool_result = repair_messages[2]["content"][0]["toolResult"]
+        assert tool_result["status"] == "error"
+        assert "cut off" in tool_result["content"][0]["text"]
+
+    def test_repair_failure_returns_salvaged_result(self, client):
+        improvements = [make_improvement("uno"), make_improvement("dos", severity="BAD")]
+        client.converse.side_effect = [
+            make_tool_response({"quality_assessments": [], "improvements": improvements}),
+            Exception("boom"),
+        ]
+
+        result = assess(client)
+
+        assert [i.excerpt for i in result.improvements] == ["uno"]
+        assert "dos" in client.converse.call_args_list[1][1]["messages"][2]["content"][0]["toolResult"]["content"][0]["text"]
+
+    def test_without_repair(self, client):
+        improvements = [make_improvement("uno"), make_improvement("dos", severity="BAD")]
+        client.converse.return_value = make_tool_response(
+            {"quality_assessments": [], "improvements": improvements}
+        )
+
+        result = assess(client, repair=False)
+
+        assert [i.excerpt for i in result.improvements] == ["uno"]
+        assert client.converse.call_count == 1
+
+    def test_without_salvage(self, client):
+        """
+        Truncated or partially invalid responses should raise when salvaging is disabled
+        """
+        client.converse.return_value = make_tool_response(
+            {"improvements": [make_improvement("uno")]}, stop_reason="max_tokens"
+        )
+        with pytest.raises(UnexpectedBedrockResponse):
+            assess(client, salvage=False)
+
+        client.converse.return_value = make_tool_response(
+            {"quality_assessments": [], "improvements": [make_improvement("dos", severity="BAD")]}
+        )
+        with pytest.raises(pydantic.ValidationError):
+            assess(client, salvage=False)
+        assert client.converse.call_count == 2
@@ -123,6 +123,21 @@ class TestTranslate:
         call_args = self.client.translate_document.call_args[1]
         assert call_args["Settings"]["Brevity"] == "ON"
 
+    def test_translate_with_content_type(self):
+        """
+        Content type should be passed through to the document
+        """
+        translate(
+            client=self.client,
+            source_text="<p>Hello world!</p>",
+            source_language="en",
+            target_language="es",
+            content_type="text/html",
+        )
+
+        call_args = self.client.translate_document.call_args[1]
+        assert call_args["Document"]["ContentType"] == "text/html"
+
     def test_translate_client_error(self):
         """
         Error should be raised if client errors.
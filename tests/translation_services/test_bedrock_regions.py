@@ -0,0 +1,174 @@
+import concurrent.futures
+import random
+import time
+from unittest.mock import MagicMock
+
+import botocore.exceptions
+import pytest
+
+from src.translation_services.bedrock_regions import (
+    BedrockRegionRouter,
+    NoAvailableRegion,
+    RegionEndpoint,
+    is_retryable_error,
+)
+
+
+def client_error(code, status=400):
+    return botocore.exceptions.ClientError(
+        {"Error": {"Code": code, "Message": code}, "ResponseMetadata": {"HTTPStatusCode": status}},
+        "Converse",
+    )
+
+
+class StubBedrockClient:
+    """Simulates a regional endpoint with a fixed latency and failure rate."""
+
+    class exceptions:
+        ClientError = botocore.exceptions.ClientError
+
+    def __init__(self, latency_s=0.0, failure_rate=0.0, error=None, seed=0):
+        self.latency_s = latency_s
+        self.failure_rate = failure_rate
+        self.error = error or client_error("ThrottlingException", 400)
+        self.random = random.Random(seed)
+        self.requests = []
+
+    def converse(self, **kwargs):
+        self.requests.append(kwargs)
+        time.sleep(self.latency_s)
+        if self.random.random() < self.failure_rate:
+            raise self.error
+        return {"stopReason": "end_turn", "modelId": kwargs["modelId"]}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestIsRetryableError:
+    def test_errors(self):
+        assert is_retryable_error(client_error("ThrottlingException"))
+        assert is_retryable_error(client_error("SomethingElse", 503))
+        assert not is_retryable_error(client_error("ValidationException", 400))
+        assert not is_retryable_error(ValueError("nope"))
+
+
+class TestBedrockRegionRouter:
+    def test_fails_over_and_drains_throttled_region(self):
+        """
+        A throttled region should be drained and the call retried elsewhere
+        """
+        clock = FakeClock()
+        throttled = StubBedrockClient(failure_rate=1.0)
+        healthy = StubBedrockClient()
+        router = BedrockRegionRouter(
+            [RegionEndpoint("us-east-1", throttled), RegionEndpoint("us-west-2", healthy)],
+            drain_s=10,
+            clock=clock,
+        )
+
+        # with no observations yet, the first endpoint is tried first
+        assert router.converse(modelId="m")["stopReason"] == "end_turn"
+        assert len(throttled.requests) == 1
+        assert len(healthy.requests) == 1
+        stats = {s.name: s for s in router.stats()}
+        assert stats["us-east-1"].retryable_errors == 1
+        assert stats["us-east-1"].drained_for_s == 10
+        assert router.requests == 2
+
+        calls_before = len(throttled.requests)
+        for _ in range(5):
+            router.converse(modelId="m")
+        assert len(throttled.requests) == calls_before
+
+        clock.now += 60
+        throttled.failure_rate = 0.0
+        router.endpoints[1].latency_ewma_s = 10.0
+        router.converse(modelId="m")
+        assert len(throttled.requests) == calls_before + 1
+
+    def test_non_retryable_errors_are_raised(self):
+        client = StubBedrockClient(failure_rate=1.0, error=client_error("ValidationException"))
+        other = StubBedrockClient()
+        router = BedrockRegionRouter(
+            [RegionEndpoint("a", client), RegionEndpoint("b", other, max_concurrency=1)]
+        )
+        router.endpoints[1].in_flight = 10
+
+        with pytest.raises(botocore.exceptions.ClientError):
+            router.converse(modelId="m")
+        assert other.requests == []
+
+    def test_all_regions_failing(self):
+        router = BedrockRegionRouter(
+            [
+                RegionEndpoint("a", StubBedrockClient(failure_rate=1.0)),
+                RegionEndpoint("b", StubBedrockClient(failure_rate=1.0)),
+            ]
+        )
+
+        with pytest.raises(NoAvailableRegion):
+            router.converse(modelId="m")
+
+    def test_inference_profile_override(self):
+        """
+        Only requests for the profile's model should be sent to the profile
+        """
+        client = StubBedrockClient()
+        router = BedrockRegionRouter(
+            [
+                RegionEndpoint(
+                    "us-east-1", client, model_ids={"anthropic.model": "us.anthropic.model"}
+                )
+            ]
+        )
+
+        assert router.converse(modelId="anthropic.model")["modelId"] == "us.anthropic.model"
+        assert router.converse(modelId="anthropic.stronger")["modelId"] == "anthropic.stronger"
+
+    def test_from_specs(self):
+        session = MagicMock()
+
+        router = BedrockRegionRouter.from_specs(
+            ["us-east-1", "eu-west-1=eu.anthropic.a-v1:0, eu.anthropic.b-v2:0"], session=session
+        )
+
+        assert [e.model_ids for e in router.endpoints] == [
+            {},
+            {"anthropic.a-v1:0": "eu.anthropic.a-v1:0", "anthropic.b-v2:0": "eu.anthropic.b-v2:0"},
+        ]
+        session.client.assert_called_with("bedrock-runtime", region_name="eu-west-1")
+
+    def test_prefers_faster_region_under_load(self):
+        """
+        Concurrent traffic should favour the lower latency region and spread load
+        by capacity, with utilisation reported per region
+        """
+        fast = StubBedrockClient(latency_s=0.005)
+        slow = StubBedrockClient(latency_s=0.05)
+        flaky = StubBedrockClient(latency_s=0.005, failure_rate=0.5, seed=1)
+        router = BedrockRegionRouter(
+            [
+                RegionEndpoint("fast", fast, max_concurrency=4),
+                RegionEndpoint("slow", slow, max_concurrency=4),
+                RegionEndpoint("flaky", flaky, max_concurrency=4),
+            ],
+            drain_s=5,
+        )
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: router.converse(modelId="m"), range(80)))
+
+        assert len(results) == 80
+        stats = {s.name: s for s in router.stats()}
+        assert stats["fast"].successes > stats["slow"].successes
+        assert stats["flaky"].retryable_errors >= 1
+        assert sum(s.successes for s in stats.values()) == 80
+        assert sum(s.request_share for s in stats.values()) == pytest.approx(1.0)
+        assert all(0 <= s.utilisation <= 1 for s in stats.values())
+        assert all(s.in_flight == 0 for s in stats.values())
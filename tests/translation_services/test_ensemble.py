@@ -0,0 +1,170 @@
+import time
+
+import pytest
+
+from src.lib.llm_tools import TranslationAssessment, TranslationImprovement
+from src.tasks.translate import Document
+from src.translation_services.ensemble import EnsembleProvider, vote_improvements
+from src.translation_services.providers import ProviderError, TranslationProvider
+
+TEXT = "Presente su solicitud antes del viernes. El pedazo de pastel es fácil."
+
+
+def improvement(excerpt, replacement, confidence=6, severity="MINOR"):
+    return TranslationImprovement(
+        excerpt=excerpt,
+        replacement=replacement,
+        severity=severity,
+        rationale="because",
+        confidence=confidence,
+    )
+
+
+def assessment(*improvements):
+    return TranslationAssessment(quality_assessments=["ok"], improvements=list(improvements))
+
+
+class StubProvider(TranslationProvider):
+    def __init__(self, name, result, delay_s=0.0):
+        super().__init__(name)
+        self.result = result
+        self.delay_s = delay_s
+
+    def _translate(self, text, source_language, target_language, mime_type):
+        return f"{self.name}: {text}"
+
+    def _assess(self, translated_text, source_language, target_language, content_type):
+        time.sleep(self.delay_s)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class TestVoteImprovements:
+    def test_overlapping_excerpts_are_merged(self):
+        """
+        Excerpts covering the same span should count as one suggestion with averaged confidence
+        """
+        runs = [
+            assessment(
+                improvement("pedazo de pastel", "pan comido", 8, "MAJOR"),
+                improvement("viernes", "el viernes", 3),
+            ),
+            assessment(improvement("El pedazo de pastel", "El pan comido", 6)),
+            assessment(
+                improvement("pedazo de pastel", "pan comido", 9, "MAJOR"),
+                improvement("solicitud", "reclamo", 7),
+            ),
+        ]
+
+        merged = vote_improvements(TEXT, runs, min_votes=2)
+
+        assert len(merged) == 1
+        assert merged[0].excerpt == "pedazo de pastel"
+        assert merged[0].replacement == "pan comido"
+        assert merged[0].severity == "MAJOR"
+        assert merged[0].confidence == 8
+
+    def test_each_run_votes_once(self):
+        runs = [
+            assessment(improvement("solicitud", "reclamo"), improvement("su solicitud", "su reclamo")),
+            assessment(),
+        ]
+
+        assert vote_improvements(TEXT, runs, min_votes=2) == []
+        assert [i.excerpt for i in vote_improvements(TEXT, runs, min_votes=1)] == [
+            "su solicitud",
+            "solicitud",
+        ]
+
+    def test_kept_in_text_order(self):
+        runs = [
+            assessment(improvement("viernes", "lunes"), improvement("Presente", "Envíe")),
+            assessment(improvement("Presente", "Envíe"), improvement("viernes", "lunes")),
+        ]
+
+        merged = vote_improvements(TEXT, runs, min_votes=2)
+
+        assert [i.excerpt for i in merged] == ["Presente", "viernes"]
+
+
+class TestEnsembleProvider:
+    def test_runs_concurrently_and_votes(self):
+        """
+        Assessing with several members should take about as long as the slowest member
+        """
+        agreed = improvement("solicitud", "reclamo", 8)
+        members = [
+            StubProvider("a", assessment(agreed), delay_s=0.3),
+            StubProvider("b", assessment(agreed, improvement("viernes", "lunes")), delay_s=0.3),
+            StubProvider("c", assessment(improvement("solicitud", "reclamo", 6)), delay_s=0.3),
+        ]
+        ensemble = EnsembleProvider(members)
+        source = Document(content="Submit your claim", language="en")
+        document = Document(content=TEXT, language="es", translation_source=source)
+
+        start = time.perf_counter()
+        result = document.get_assessment(ensemble)
+        elapsed = time.perf_counter() - start
+        ensemble.shutdown()
+
+        assert elapsed < 0.6
+        assert [i.excerpt for i in result.improvements] == ["solicitud"]
+        assert result.improvements[0].confidence == 7
+        assert result.quality_assessments == ["ok"]
+        stats = ensemble.ensemble_stats()
+        assert stats.runs == 3
+        assert stats.candidate_improvements == 4
+        assert stats.kept_improvements == 1
+        assert all(m.stats().requests == 1 for m in members)
+
+    def test_failed_and_late_runs_are_left_out(self):
+        members = [
+            StubProvider("ok", assessment(improvement("solicitud", "reclamo"))),
+            StubProvider("broken", ProviderError("boom")),
+            StubProvider("slow", assessment(), delay_s=1),
+        ]
+        ensemble = EnsembleProvider(members, deadline_s=0.2)
+
+        result = ensemble.assess(TEXT, "en", "es")
+        ensemble.shutdown()
+
+        # one run left, so it is the majority
+        assert [i.excerpt for i in result.improvements] == ["solicitud"]
+        stats = ensemble.ensemble_stats()
+        assert stats.failed_runs == 1
+        assert stats.late_runs == 1
+
+    def test_too_few_runs_for_min_votes_raises(self):
+        """
+        An explicit vote threshold should not be lowered when runs fail
+        """
+        ensemble = EnsembleProvider(
+            [
+                StubProvider("ok", assessment(improvement("solicitud", "reclamo"))),
+                StubProvider("broken", ProviderError("boom")),
+                StubProvider("also broken", ProviderError("bang")),
+            ],
+            min_votes=2,
+        )
+
+        with pytest.raises(ProviderError, match="fewer than the 2 votes required"):
+            ensemble.assess(TEXT, "en", "es")
+        ensemble.shutdown()
+
+    def test_every_run_failing_raises(self):
+        ensemble = EnsembleProvider(
+            [StubProvider("a", ProviderError("boom")), StubProvider("b", ProviderError("bang"))]
+        )
+
+        with pytest.raises(ProviderError, match="boom"):
+            ensemble.assess(TEXT, "en", "es")
+        ensemble.shutdown()
+
+    def test_translation_is_delegated(self):
+        translator = StubProvider("translator", None)
+        ensemble = EnsembleProvider([StubProvider("a", assessment())], translator=translator)
+
+        assert ensemble.translate("hello", "en", "es") == "translator: hello"
+        with pytest.raises(ValueError):
+            EnsembleProvider([StubProvider("a", assessment())], min_votes=2)
@@ -0,0 +1,144 @@
+import threading
+import time
+
+import pytest
+
+from src.translation_services.hedging import HedgingPolicy
+
+
+@pytest.fixture
+def policy():
+    policy = HedgingPolicy(percentile=50, budget=1.0, min_samples=3)
+    yield policy
+    policy.shutdown()
+
+
+def warm_up(policy, n=3):
+    for _ in range(n):
+        policy.call(lambda: "fast")
+
+
+class TestHedgingPolicy:
+    def test_no_hedging_while_warming_up(self, policy):
+        """
+        Hedging should not start until enough latencies have been observed
+        """
+        assert policy.hedge_delay() is None
+        warm_up(policy)
+        assert policy.hedge_delay() is not None
+        assert policy.stats().hedges_sent == 0
+
+    def test_hedge_wins_when_primary_is_slow(self, policy):
+        """
+        A duplicate request should be sent after the hedge delay, and its result used
+        """
+        warm_up(policy)
+        calls = []
+        lock = threading.Lock()
+
+        def fn():
+            with lock:
+                calls.append(None)
+                attempt = len(calls)
+            if attempt == 1:
+                time.sleep(0.5)
+                return "slow"
+            return "fast"
+
+        start = time.perf_counter()
+        assert policy.call(fn) == "fast"
+        assert time.perf_counter() - start < 0.4
+
+        stats = policy.stats()
+        assert stats.hedges_sent == 1
+        assert stats.hedge_wins == 1
+        assert stats.extra_request_ratio == 0.25
+
+    def test_invalid_result_is_ignored(self, policy):
+        """
+        The first *valid* result should win, even when another attempt fails first
+        """
+        warm_up(policy)
+        calls = []
+        lock = threading.Lock()
+
+        def fn():
+            with lock:
+                calls.append(None)
+                attempt = len(calls)
+            if attempt == 1:
+                time.sleep(0.1)
+                return "valid"
+            raise ValueError("invalid")
+
+        assert policy.call(fn) == "valid"
+
+    def test_all_attempts_fail(self, policy):
+        warm_up(policy)
+
+        def fn():
+            time.sleep(0.05)
+            raise ValueError("invalid")
+
+        with pytest.raises(ValueError):
+            policy.call(fn)
+
+    def test_failed_attempts_are_not_timed(self, policy):
+        """
+        Fast errors should not lower the hedge delay
+        """
+
+        def fail():
+            raise ValueError("invalid")
+
+        for _ in range(5):
+            with pytest.raises(ValueError):
+                policy.call(fail)
+        assert policy.hedge_delay() is None
+
+        def slow():
+            time.sleep(0.05)
+            return "slow"
+
+        for _ in range(3):
+            policy.call(slow)
+        assert policy.hedge_delay() >= 0.05
+
+    def test_budget_cap(self):
+        """
+        No more hedges than the budget allows should be sent
+        """
+        policy = HedgingPolicy(percentile=50, budget=0.0, min_samples=1)
+        warm_up(policy, 1)
+
+        def fn():
+            time.sleep(0.05)
+            return "slow"
+
+        assert policy.call(fn) == "slow"
+        assert policy.stats().hedges_sent == 0
+        policy.shutdown()
+
+    def test_stats_report_p99_improvement(self, policy):
+        warm_up(policy)
+        calls = []
+        lock = threading.Lock()
+
+        def fn():
+            with lock:
+                calls.append(None)
+                attempt = len(calls)
+            time.sleep(0.3 if attempt == 1 else 0)
+            return attempt
+
+        policy.call(fn)
+        time.sleep(0.4)  # let the abandoned primary finish
+        stats = policy.stats()
+
+        assert stats.primary_p99_s >= 0.3
+        assert stats.effective_p99_s < 0.3
+        assert stats.p99_improvement_s > 0
+
+    def test_invalid_percentile(self):
+        with pytest.raises(ValueError):
+            HedgingPolicy(percentile=100)
@@ -0,0 +1,176 @@
+import pytest
+from unittest.mock import MagicMock
+
+from src.lib.llm_tools import TranslationAssessment
+from src.translation_services.amazon_bedrock import CountingClient
+from src.translation_services.model_tiers import (
+    TieredModelPolicy,
+    suggest_translation_refinements_tiered,
+)
+
+
+def make_tool_response(improvements, stop_reason="tool_use"):
+    return {
+        "stopReason": stop_reason,
+        "output": {
+            "message": {
+                "role": "assistant",
+                "content": [
+                    {
+                        "toolUse": {
+                            "toolUseId": "tooluse-1",
+                            "name": TranslationAssessment.NAME,
+                            "input": {
+                                "quality_assessments": ["ok"],
+                                "improvements": improvements,
+                            },
+                        }
+                    }
+                ],
+            }
+        },
+    }
+
+
+def make_improvement(severity="MINOR", confidence=8):
+    return {
+        "excerpt": "solicitud",
+        "replacement": "reclamo",
+        "severity": severity,
+        "rationale": "claims are not applications",
+        "confidence": confidence,
+    }
+
+
+class MockBedrockClient:
+    def __init__(self, *responses):
+        self.converse = MagicMock(side_effect=list(responses))
+        self.exceptions = MagicMock()
+        self.exceptions.ClientError = Exception
+
+    @property
+    def model_ids(self):
+        return [c.kwargs["modelId"] for c in self.converse.call_args_list]
+
+
+@pytest.fixture
+def policy():
+    return TieredModelPolicy(
+        first_pass_model_id="cheap",
+        escalation_model_id="strong",
+        min_confidence=6,
+        max_first_pass_chars=100,
+        escalate_content_types=["Legal Notice"],
+    )
+
+
+def assess(client, policy, text="Presente su solicitud.", content_type=None):
+    return suggest_translation_refinements_tiered(
+        client,
+        translated_text=text,
+        source_language="en",
+        target_language="es",
+        policy=policy,
+        content_type=content_type,
+    )
+
+
+class TestTieredModelRouting:
+    def test_first_pass_is_enough(self, policy):
+        client = MockBedrockClient(make_tool_response([make_improvement()]))
+
+        assessment = assess(client, policy)
+
+        assert assessment.improvements[0].confidence == 8
+        assert client.model_ids == ["cheap"]
+        assert policy.stats().first_pass_only == 1
+
+    @pytest.mark.parametrize(
+        "first_pass,reason",
+        [
+            (make_tool_response([make_improvement(severity="MAJOR")]), "major_severity"),
+            (make_tool_response([make_improvement(confidence=3)]), "low_confidence"),
+            (make_tool_response([], stop_reason="max_tokens"), "unexpected_response"),
+            (make_tool_response([{"excerpt": "x"}]), "validation_failure"),
+        ],
+    )
+    def test_escalation(self, policy, first_pass, reason):
+        """
+        Warning signs in the first pass should trigger re-assessment with the stronger model
+        """
+        client = MockBedrockClient(first_pass, make_tool_response([]))
+
+        assessment = assess(client, policy)
+
+        assert assessment.improvements == []
+        assert client.model_ids == ["cheap", "strong"]
+        assert policy.stats().escalation_reasons == {reason: 1}
+
+    @pytest.mark.parametrize(
+        "text,content_type,reason",
+        [
+            ("x" * 101, None, "document_length"),
+            ("short", "legal notice", "content_type"),
+        ],
+    )
+    def test_upfront_escalation(self, policy, text, content_type, reason):
+        """
+        Long or high-risk documents should skip the first pass entirely
+        """
+        client = MockBedrockClient(make_tool_response([]))
+
+        assess(client, policy, text=text, content_type=content_type)
+
+        assert client.model_ids == ["strong"]
+        stats = policy.stats()
+        assert stats.direct_to_escalation_model == 1
+        assert stats.escalation_reasons == {reason: 1}
+
+    def test_missing_tool_use_escalates(self, policy):
+        first_pass = make_tool_response([])
+        first_pass["output"]["message"]["content"] = [{"text": "Looks good to me."}]
+        client = MockBedrockClient(first_pass, make_tool_response([]))
+
+        assess(client, policy)
+
+        assert client.model_ids == ["cheap", "strong"]
+        assert policy.stats().escalation_reasons == {"unexpected_response": 1}
+
+    def test_escalation_requests_are_counted(self, policy):
+        """
+        An escalated assessment should count both of its Bedrock requests
+        """
+        client = CountingClient(
+            MockBedrockClient(
+                make_tool_response([make_improvement(severity="MAJOR")]), make_tool_response([])
+            )
+        )
+
+        assess(client, policy)
+
+        assert client.requests == 2
+
+    def test_tier_usage(self, policy):
+        """
+        Latency and token usage should be reported per tier, including failed first passes
+        """
+        first_pass = make_tool_response([make_improvement(severity="MAJOR")])
+        first_pass["usage"] = {"inputTokens": 100, "outputTokens": 20}
+        truncated = make_tool_response([], stop_reason="max_tokens")
+        truncated["usage"] = {"inputTokens": 100, "outputTokens": 5000}
+        escalation = make_tool_response([])
+        escalation["usage"] = {"inputTokens": 120, "outputTokens": 40}
+        client = MockBedrockClient(first_pass, escalation, truncated, escalation)
+
+        assess(client, policy)
+        assess(client, policy)
+
+        tiers = policy.stats().tiers
+        assert tiers["first_pass"].model_id == "cheap"
+        assert tiers["first_pass"].assessments == 2
+        assert tiers["first_pass"].errors == 1
+        assert (tiers["first_pass"].input_tokens, tiers["first_pass"].output_tokens) == (200, 5020)
+        assert tiers["escalation"].assessments == 2
+        assert tiers["escalation"].errors == 0
+        assert (tiers["escalation"].input_tokens, tiers["escalation"].output_tokens) == (240, 80)
+        assert tiers["escalation"].latency_mean_s is not None
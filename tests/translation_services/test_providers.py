@@ -0,0 +1,356 @@
+import http.server
+import json
+import re
+import threading
+import time
+
+import pytest
+from unittest.mock import MagicMock
+
+from src.lib.llm_tools import TranslationAssessment
+from src.tasks.translate import Document
+from src.translation_services.providers import (
+    AmazonProvider,
+    AzureOpenAIProvider,
+    GeminiProvider,
+    NoProviderResult,
+    ProviderError,
+    ProviderNotConfigured,
+    RacingProvider,
+    TranslationProvider,
+    gemini_function_declaration,
+)
+from src.translation_services.token_budget import InputTooLarge, TokenEstimate
+
+ASSESSMENT = {
+    "quality_assessments": ["good"],
+    "improvements": [
+        {
+            "excerpt": "hola",
+            "replacement": "buenas",
+            "severity": "MINOR",
+            "rationale": "more natural",
+            "confidence": 8,
+        }
+    ],
+}
+
+
+class StubServer:
+    """A local HTTP server that records JSON requests and replies with ``respond(path, payload)``."""
+
+    def __init__(self, respond, delay_s=0.0):
+        self.respond = respond
+        self.delay_s = delay_s
+        self.requests = []
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.requests.append((self.path, self.headers, payload))
+                time.sleep(stub.delay_s)
+                status, body = stub.respond(self.path, payload)
+                data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SizeLimitedProvider(TranslationProvider):
+    """Assesses text of up to ``max_text_chars`` characters, like a token-budgeted Bedrock provider."""
+
+    def __init__(self, name, max_text_chars):
+        super().__init__(name)
+        self.max_text_chars = max_text_chars
+        self.assessed = []
+
+    def _translate(self, text, source_language, target_language, mime_type):
+        return text
+
+    def _assess(self, translated_text, source_language, target_language, content_type):
+        if len(translated_text) > self.max_text_chars:
+            estimate = TokenEstimate(
+                script="latin",
+                text_chars=len(translated_text),
+                input_tokens=len(translated_text),
+                output_tokens=0,
+                max_tokens=0,
+                fits=False,
+            )
+            raise InputTooLarge("too large", estimate, self.max_text_chars)
+        self.assessed.append(translated_text)
+        return TranslationAssessment.model_validate(ASSESSMENT)
+
+
+def azure_respond(path, payload):
+    if "tools" in payload:
+        message = {
+            "role": "assistant",
+            "tool_calls": [
+                {
+                    "type": "function",
+                    "function": {
+                        "name": TranslationAssessment.NAME,
+                        "arguments": json.dumps(ASSESSMENT),
+                    },
+                }
+            ],
+        }
+    else:
+        message = {"role": "assistant", "content": f" azure: {payload['messages'][1]['content']} "}
+    return 200, {"choices": [{"message": message}]}
+
+
+def gemini_respond(path, payload):
+    if "tools" in payload:
+        part = {"functionCall": {"name": TranslationAssessment.NAME, "args": ASSESSMENT}}
+    else:
+        part = {"text": f"gemini: {payload['contents'][0]['parts'][0]['text']}"}
+    return 200, {"candidates": [{"content": {"parts": [part]}}]}
+
+
+class TestAzureOpenAIProvider:
+    def test_translate_and_assess(self):
+        with StubServer(azure_respond) as server:
+            provider = AzureOpenAIProvider(server.url, "gpt-4o", api_key="secret", api_version="v1")
+
+            translated = provider.translate("hello", "en", "es")
+            assessment = provider.assess("hola", "en", "es")
+
+        assert translated == "azure: hello"
+        assert assessment == TranslationAssessment.model_validate(ASSESSMENT)
+        path, headers, payload = server.requests[0]
+        assert path == "/openai/deployments/gpt-4o/chat/completions?api-version=v1"
+        assert headers["api-key"] == "secret"
+        assert '"en"' in payload["messages"][0]["content"]
+        tool_payload = server.requests[1][2]
+        assert tool_payload["tool_choice"]["function"]["name"] == TranslationAssessment.NAME
+
+        stats = provider.stats()
+        assert stats.requests == 2
+        assert stats.errors == 0
+        assert stats.latency_p50_s is not None
+
+    def test_http_error(self):
+        with StubServer(lambda path, payload: (429, {"error": "throttled"})) as server:
+            provider = AzureOpenAIProvider(server.url, "gpt-4o", api_key="secret")
+            with pytest.raises(ProviderError, match="HTTP 429"):
+                provider.translate("hello", "en", "es")
+
+        assert provider.stats().errors == 1
+
+    def test_invalid_assessment(self):
+        """
+        Assessments that do not match the tool schema should not be returned
+        """
+
+        def respond(path, payload):
+            call = {"function": {"name": TranslationAssessment.NAME, "arguments": "{}"}}
+            return 200, {"choices": [{"message": {"tool_calls": [call]}}]}
+
+        with StubServer(respond) as server:
+            provider = AzureOpenAIProvider(server.url, "gpt-4o", api_key="secret")
+            with pytest.raises(Exception):
+                provider.assess("hola", "en", "es")
+
+    def test_from_env(self):
+        provider = AzureOpenAIProvider.from_env(
+            {
+                "AZURE_API_KEY": "secret",
+                "AZURE_RESOURCE_NAME": "res",
+                "AZURE_DEPLOYMENT_NAME": "dep",
+                "AZURE_API_VERSION": "v1",
+            }
+        )
+        assert provider.url == "https://res.openai.azure.com/openai/deployments/dep/chat/completions?api-version=v1"
+
+        with pytest.raises(ProviderNotConfigured, match="AZURE_API_KEY"):
+            AzureOpenAIProvider.from_env({})
+
+
+class TestGeminiProvider:
+    def test_translate_and_assess(self):
+        with StubServer(gemini_respond) as server:
+            provider = GeminiProvider("gemini-2.0-flash", api_key="secret", endpoint=server.url)
+
+            translated = provider.translate("<p>hello</p>", "en", "es", mime_type="text/html")
+            assessment = provider.assess("hola", "en", "es")
+
+        assert translated == "gemini: <p>hello</p>"
+        assert assessment == TranslationAssessment.model_validate(ASSESSMENT)
+        path, headers, payload = server.requests[0]
+        assert path == "/v1beta/models/gemini-2.0-flash:generateContent"
+        assert headers["x-goog-api-key"] == "secret"
+        assert "HTML" in payload["systemInstruction"]["parts"][0]["text"]
+
+    def test_function_declaration_has_no_references(self):
+        declaration = json.dumps(gemini_function_declaration(TranslationAssessment))
+        assert "$ref" not in declaration
+        assert "$defs" not in declaration
+        assert "examples" not in declaration
+        assert '"excerpt"' in declaration
+
+
+class TestAmazonProvider:
+    def test_translate_and_assess(self):
+        translate_client = MagicMock()
+        translate_client.translate_document.return_value = {
+            "TranslatedDocument": {"Content": "hola".encode("utf-8")}
+        }
+        bedrock_client = MagicMock()
+        bedrock_client.converse.return_value = {
+            "stopReason": "tool_use",
+            "output": {
+                "message": {
+                    "content": [
+                        {
+                            "toolUse": {
+                                "toolUseId": "1",
+                                "name": TranslationAssessment.NAME,
+                                "input": ASSESSMENT,
+                            }
+                        }
+                    ]
+                }
+            },
+        }
+        provider = AmazonProvider(translate_client=translate_client, bedrock_client=bedrock_client)
+
+        assert provider.translate("hello", "en", "es", mime_type="text/html") == "hola"
+        assert provider.assess("hola", "en", "es").improvements[0].replacement == "buenas"
+        assert translate_client.translate_document.call_args[1]["Document"]["ContentType"] == "text/html"
+        assert provider.stats().requests_by_service == {"translate": 1, "bedrock": 1}
+
+    def test_missing_client(self):
+        with pytest.raises(ProviderError):
+            AmazonProvider().translate("hello", "en", "es")
+
+
+class TestRacingProvider:
+    def test_fastest_valid_result_wins(self):
+        with (
+            StubServer(azure_respond, delay_s=0.5) as slow,
+            StubServer(gemini_respond) as fast,
+        ):
+            azure = AzureOpenAIProvider(slow.url, "gpt-4o", api_key="secret")
+            gemini = GeminiProvider("gemini", api_key="secret", endpoint=fast.url)
+            race = RacingProvider([azure, gemini], deadline_s=5)
+
+            start = time.perf_counter()
+            translated = race.translate("hello", "en", "es")
+            elapsed = time.perf_counter() - start
+            race.shutdown()
+
+        assert translated == "gemini: hello"
+        assert elapsed < 0.5
+        assert race.race_stats().wins == {"gemini": 1}
+
+    def test_failed_provider_is_skipped(self):
+        with (
+            StubServer(lambda path, payload: (500, {"error": "boom"})) as broken,
+            StubServer(gemini_respond, delay_s=0.1) as working,
+        ):
+            race = RacingProvider(
+                [
+                    AzureOpenAIProvider(broken.url, "gpt-4o", api_key="secret"),
+                    GeminiProvider("gemini", api_key="secret", endpoint=working.url),
+                ]
+            )
+            assessment = race.assess("hola", "en", "es")
+
+        assert assessment.improvements[0].excerpt == "hola"
+        stats = race.race_stats()
+        assert stats.wins == {"gemini": 1}
+        assert stats.failures == {"azure": 1}
+
+    def test_deadline(self):
+        with StubServer(gemini_respond, delay_s=1) as slow:
+            race = RacingProvider(
+                [GeminiProvider("gemini", api_key="secret", endpoint=slow.url)], deadline_s=0.1
+            )
+            with pytest.raises(NoProviderResult, match="within"):
+                race.translate("hello", "en", "es")
+            race.shutdown()
+
+        assert race.race_stats().deadline_exceeded == 1
+        assert race.stats().errors == 1
+
+    def test_all_failed(self):
+        with StubServer(lambda path, payload: (200, b"not json")) as broken:
+            race = RacingProvider([GeminiProvider("gemini", api_key="secret", endpoint=broken.url)])
+            with pytest.raises(NoProviderResult, match="every raced provider failed"):
+                race.translate("hello", "en", "es")
+
+
+    def test_input_too_large_is_raised(self):
+        """
+        Oversize input should reach the caller when every provider rejects it, so it can be split
+        """
+        small = SizeLimitedProvider("small", 8)
+        race = RacingProvider([SizeLimitedProvider("large", 12), small])
+        document = Document(
+            content="uno dos\n\ntres cuatro\n",
+            language="es",
+            translation_source=Document(content="x", language="en"),
+        )
+
+        with pytest.raises(InputTooLarge) as exc_info:
+            race.assess(document.content, "en", "es")
+        assessment = document.get_assessment(race)
+        race.shutdown()
+
+        assert exc_info.value.max_text_chars == 8
+        assert assessment.quality_assessments == ["good"]
+        assert len(small.assessed) > 1
+        assert "".join(small.assessed).split() == document.content.split()
+
+
+class TestDocumentProviders:
+    def test_document_dispatches_through_provider(self):
+        """
+        Documents should translate and assess with any provider, segment by segment for structured content
+        """
+
+        def respond(path, payload):
+            if "tools" in payload:
+                return gemini_respond(path, payload)
+            # unique segments are translated in one batched request
+            text = re.sub(r'(<div data-item="\d+">)', r"\1gemini: ", payload["contents"][0]["parts"][0]["text"])
+            return 200, {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+        with StubServer(respond) as server:
+            provider = GeminiProvider("gemini", api_key="secret", endpoint=server.url)
+            source = Document(content="# Hello\n\nWorld\n", language="en", mime_type="text/markdown")
+
+            translated = source.translate(provider, "es")
+            assessment = translated.get_assessment(provider)
+
+        assert translated.content == "# gemini: Hello\n\ngemini: World\n"
+        assert assessment.quality_assessments == ["good"]
+        assert provider.stats().requests == 2
+
+    def test_bedrock_options_require_bedrock_client(self):
+        document = Document(
+            content="hola", language="es", translation_source=Document(content="hi", language="en")
+        )
+        with pytest.raises(ValueError):
+            document.get_assessment(AmazonProvider(), model_policy=MagicMock())
@@ -0,0 +1,171 @@
+import pytest
+from unittest.mock import MagicMock
+
+from src.lib.llm_tools import TranslationAssessment
+from src.translation_services.amazon_bedrock import suggest_translation_refinements
+from src.translation_services.token_budget import (
+    InputTooLarge,
+    TokenEstimator,
+    detect_script,
+)
+
+
+def make_tool_response(stop_reason="tool_use", input_tokens=1000, output_tokens=300):
+    return {
+        "stopReason": stop_reason,
+        "output": {
+            "message": {
+                "role": "assistant",
+                "content": [
+                    {
+                        "toolUse": {
+                            "toolUseId": "tooluse-1",
+                            "name": TranslationAssessment.NAME,
+                            "input": {"quality_assessments": ["ok"], "improvements": []},
+                        }
+                    }
+                ],
+            }
+        },
+        "usage": {"inputTokens": input_tokens, "outputTokens": output_tokens},
+    }
+
+
+class MockBedrockClient:
+    def __init__(self):
+        self.converse = MagicMock()
+        self.exceptions = MagicMock()
+        self.exceptions.ClientError = Exception
+
+
+class TestDetectScript:
+    @pytest.mark.parametrize(
+        "text,expected",
+        [
+            ("Solicite sus beneficios en línea.", "latin"),
+            ("Подайте заявку на пособие.", "cyrillic"),
+            ("通过网上申请福利。", "han"),
+            ("قدم طلبك عبر الإنترنت", "arabic"),
+            ("온라인으로 신청하세요", "hangul"),
+            ("12345 !!", "latin"),
+        ],
+    )
+    def test_scripts(self, text, expected):
+        assert detect_script(text) == expected
+
+
+class TestTokenEstimator:
+    def test_max_tokens_scales_with_document(self):
+        """
+        Short documents should reserve few output tokens, long ones more, up to the model limit
+        """
+        estimator = TokenEstimator(min_output_tokens=1024, max_output_tokens=8192)
+
+        short = estimator.estimate("Hola mundo. " * 10)
+        medium = estimator.estimate("Hola mundo. " * 2000)
+        huge = estimator.estimate("Hola mundo. " * 20000)
+
+        assert short.max_tokens == 1024
+        assert 1024 < medium.max_tokens < 8192
+        assert huge.max_tokens == 8192
+        assert short.fits and medium.fits and huge.fits
+
+    def test_dense_scripts_use_more_tokens(self):
+        estimator = TokenEstimator()
+        assert estimator.estimate("福" * 1000).input_tokens > estimator.estimate("a" * 1000).input_tokens
+
+    def test_learns_from_usage(self):
+        estimator = TokenEstimator(min_samples=3, safety_margin=1.0, min_output_tokens=1)
+        for chars in (1000, 2000, 3000, 4000):
+            estimator.record_usage(
+                "a" * chars,
+                overhead_chars=350,
+                input_tokens=100 + chars // 5,
+                output_tokens=200 + chars // 10,
+            )
+
+        estimate = estimator.estimate("a" * 5000, overhead_chars=350)
+
+        assert estimate.input_tokens == pytest.approx(1100, abs=2)
+        assert estimate.output_tokens == pytest.approx(700, abs=2)
+        assert estimate.max_tokens == estimate.output_tokens
+        [stats] = estimator.stats()
+        assert stats.learned
+        assert stats.chars_per_input_token == pytest.approx(5)
+
+    def test_truncations_raise_estimates(self):
+        text = "a" * 1000
+        learned = TokenEstimator(min_samples=2)
+        truncated = TokenEstimator(min_samples=2)
+        for chars in (1000, 2000):
+            learned.record_usage("a" * chars, 0, 300, 1000)
+            truncated.record_usage("a" * chars, 0, 300, 1000, truncated=True)
+
+        assert truncated.estimate(text).output_tokens > learned.estimate(text).output_tokens
+        assert truncated.stats()[0].truncations == 2
+
+    def test_truncations_leave_with_the_window(self, tmp_path):
+        """
+        Truncations should only be counted while their observations are in the sliding window
+        """
+        history_path = tmp_path.joinpath("usage.jsonl")
+        estimator = TokenEstimator(window=3, history_path=history_path)
+        for truncated in (True, True, False, False):
+            estimator.record_usage("a" * 1000, 0, 300, 1000, truncated=truncated)
+
+        [stats] = estimator.stats()
+        assert (stats.observations, stats.truncations) == (3, 1)
+        [reloaded] = TokenEstimator(window=3, history_path=history_path).stats()
+        assert (reloaded.observations, reloaded.truncations) == (3, 1)
+
+    def test_oversize_input_is_refused(self):
+        estimator = TokenEstimator(context_window=3000, max_output_tokens=1024)
+
+        with pytest.raises(InputTooLarge) as exc_info:
+            estimator.check("a" * 20000, overhead_chars=350)
+
+        max_chars = exc_info.value.max_text_chars
+        assert 0 < max_chars < 20000
+        assert estimator.check("a" * max_chars, overhead_chars=350).fits
+
+    def test_history_is_persisted(self, tmp_path):
+        history = tmp_path.joinpath("usage.jsonl")
+        estimator = TokenEstimator(history_path=history)
+        for _ in range(5):
+            estimator.record_usage("Привет " * 100, 0, 350, 100)
+
+        reloaded = TokenEstimator(history_path=history)
+
+        assert [s.model_dump() for s in reloaded.stats()] == [s.model_dump() for s in estimator.stats()]
+        assert reloaded.stats()[0].script == "cyrillic"
+
+
+class TestAdaptiveRequests:
+    def test_max_tokens_set_and_usage_recorded(self):
+        client = MockBedrockClient()
+        client.converse.return_value = make_tool_response()
+        estimator = TokenEstimator()
+
+        suggest_translation_refinements(
+            client, "Hola mundo.", "en", "es", with_tool=TranslationAssessment, token_estimator=estimator
+        )
+
+        inference_config = client.converse.call_args[1]["inferenceConfig"]
+        assert inference_config["maxTokens"] == estimator.min_output_tokens
+        [stats] = estimator.stats()
+        assert stats.observations == 1
+
+    def test_oversize_request_is_not_sent(self):
+        client = MockBedrockClient()
+
+        with pytest.raises(InputTooLarge):
+            suggest_translation_refinements(
+                client,
+                "Hola mundo. " * 5000,
+                "en",
+                "es",
+                with_tool=TranslationAssessment,
+                token_estimator=TokenEstimator(context_window=4000, max_output_tokens=1024),
+            )
+
+        client.converse.assert_not_called()